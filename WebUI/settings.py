@@ -104,6 +104,90 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Where collectstatic puts
 MEDIA_URL = '/user-files/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'user_data')
 
+# === RESUMABLE UPLOADS ===
+# Chunked upload protocol (core.uploads): create, PATCH chunks at an offset,
+# HEAD for the offset; the file is registered when the last byte lands.
+UPLOADS = {
+    'MAX_SIZE': 200 * 1024 ** 3,  # bytes per file
+    'MAX_CHUNK_BYTES': 256 * 1024 ** 2,  # largest body a single PATCH may carry
+    'BLOCK_BYTES': 1024 * 1024,  # read / write / hash granularity
+    'EXPIRE_HOURS': 24,  # idle unfinished uploads are dropped after this
+    'CLEANUP_MINUTES': 60,
+}
+
+# === DEDUPLICATED STORAGE ===
+# core.blobs keeps one copy of each uploaded file's content under
+# MEDIA_ROOT/<DIR>; user paths are hardlinks, so MEDIA_ROOT must be one filesystem.
+BLOB_STORE = {
+    'ENABLED': True,
+    'DIR': 'blobs',
+    'MIN_SIZE': 1024 * 1024,  # smaller files are not worth a lookup
+}
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'core.blobs.HashingUploadHandler',  # hashes while writing the temp file
+]
+# Same filesystem as the blob store, so a stored upload is renamed, not copied
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'upload_tmp')
+
+# === DOWNLOADS ===
+# core.downloads serves user files with Range / conditional GET support.
+# Behind nginx, MODE 'x-accel' hands the transfer to nginx, which needs
+#   location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+DOWNLOADS = {
+    'MODE': 'stream',  # stream | x-accel | x-sendfile
+    'ACCEL_PREFIX': '/protected-media/',
+    'BLOCK_BYTES': 512 * 1024,
+    'MAX_RANGES': 16,  # more pieces than this and the whole file is sent
+}
+
+# === ARCHIVE DOWNLOADS ===
+# Folders and selections are zipped / tarred on the fly by core.archives
+ARCHIVES = {
+    'ZIP_COMPRESSION': 'stored',  # stored | deflated; datasets and checkpoints rarely shrink
+    'COMPRESS_LEVEL': 1,  # deflate level for deflated zips and tar.gz
+    'BLOCK_BYTES': 1024 * 1024,
+}
+
+# === ARCHIVE EXTRACTION ===
+# Uploaded .zip / .tar.* archives unpacked into the workspace by core.extraction
+EXTRACTION = {
+    'WORKERS': 2,  # extraction threads per web process
+    'DEST_DIR': 'data',  # workspace folder archives are unpacked into
+    'MAX_RATIO': 200,  # unpacked bytes per archive byte before it is treated as a zip bomb
+    'MAX_BYTES': 500 * 1024 ** 3,  # unpacked bytes per archive, on top of the user's quota
+    'MAX_FILES': 200_000,
+    'BLOCK_BYTES': 1024 * 1024,
+    'PROGRESS_SECONDS': 1.0,  # progress pushes, quota and cancel checks
+    'STALE_MINUTES': 15,  # running jobs silent this long are failed; queued ones are picked up
+}
+
+# === FILE TRANSFERS ===
+# Copy / move / paste of workspace paths as background jobs (core.transfers)
+FILE_TRANSFERS = {
+    'WORKERS': 2,  # transfer threads per web process
+    'MAX_ITEMS': 1000,  # paths per clipboard / job
+    'BLOCK_BYTES': 64 * 1024 * 1024,  # per copy_file_range call; progress granularity
+    'PROGRESS_SECONDS': 1.0,
+    'STALE_MINUTES': 15,
+}
+
+# === DISK USAGE ===
+# core.disk_usage walks MEDIA_ROOT/user_* in the scheduler and stores per-user totals
+DISK_USAGE = {
+    'WORKERS': 8,  # directories listed in parallel
+    'INTERVAL_SECONDS': 300,
+    'RESTAT_HOURS': 24,  # full relisting, for files rewritten in place
+}
+
+# === WORKSPACE FILE BROWSER ===
+# core.file_index caches scandir listings per directory, keyed by its mtime
+FILE_BROWSER = {
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 1000,
+    'CACHED_DIRS': 512,  # per process, least recently used dropped first
+}
+
 # === CRISPY FORMS ===
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -118,12 +202,152 @@ CHANNEL_LAYERS = {
     },
 }
 
+# === DOCKER HOSTS ===
+# Engines user containers can be placed on. A blank base_url is the local
+# engine from the environment. Workspaces are bind-mounted from MEDIA_ROOT,
+# so remote hosts need it mounted at the same path (e.g. over NFS).
+DOCKER_HOSTS = [
+    {'name': 'local', 'base_url': '', 'public_address': SERVER_IP},
+    # {'name': 'gpu2', 'base_url': 'tcp://192.168.0.101:2376', 'public_address': '192.168.0.101'},
+]
+# Placement policy class: core.hosts.BinPackPolicy or core.hosts.SpreadPolicy
+DOCKER_PLACEMENT_POLICY = 'core.hosts.BinPackPolicy'
+# Seconds between capacity/free-resource refreshes of each host
+DOCKER_HOST_STATS_INTERVAL = 30
+
+# === GPU ALLOCATION ===
+# Give each GPU container specific cards instead of all of them.
+GPU_ALLOCATION = {
+    'ENABLED': True,
+    'DEVICES_PER_CONTAINER': 1,
+    # Cards below this free memory / above this utilization are used last,
+    # and trigger a move to other cards when the container is restarted.
+    'MIN_FREE_MB': 2048,
+    'MAX_UTILIZATION': 90,
+}
+
+# === CPU PINNING ===
+# Pin local containers to ceil(cpu_limit) CPUs on as few NUMA nodes as possible.
+CPU_PINNING = {
+    'ENABLED': True,
+    'MODE': 'exclusive',  # 'exclusive': no two containers share a CPU while room is left; 'shared'
+    'SYSFS_ROOT': '/sys/devices/system',
+    'RESERVED_CPUS': [0],  # left for the host and Docker daemon
+    'DEFRAG_INTERVAL': 300,  # seconds
+}
+
+# === BOOKINGS ===
+BOOKINGS = {
+    'INDEX_TTL': 30,  # seconds before the in-memory booking index is rebuilt
+    'SLOT_ALIGN_MINUTES': 15,  # free slots start on these boundaries
+    'SEARCH_DAYS': 60,  # how far ahead free slots are searched
+    'MAX_SLOTS': 50,
+    'MAX_CALENDAR_DAYS': 62,  # widest range the calendar endpoint serves
+}
+
+# === SCHEDULER SERVICE ===
+# The scheduler runs in one leader process (`manage.py run_scheduler`);
+# other candidates wait as standbys and take over when the lease lapses.
+SCHEDULER_SERVICE = {
+    'LOCK': 'db',  # db (lease row, any number of hosts) | file (flock, one host)
+    'LOCK_FILE': os.path.join(BASE_DIR, 'scheduler.lock'),
+    'LEASE_SECONDS': 30,
+    'RENEW_SECONDS': 10,
+    'CHANNEL': 'scheduler-control',  # web workers send schedule changes here
+    'MISFIRE_GRACE_SECONDS': 300,  # jobs due during a takeover still run
+    'EMBEDDED_IN_RUNSERVER': True,  # runserver joins the election itself
+}
+
+# === SCHEDULER TELEMETRY ===
+JOB_TELEMETRY = {
+    # Jobs whose id starts with one of these are always recorded; others
+    # (the frequent service jobs) only when they fail or are missed
+    'ALWAYS_RECORD': ('exclusive_', 'recurring_', 'fair_share_queue'),
+    'RETENTION_DAYS': 30,
+    'MAX_ROWS': 20000,
+    'SUMMARY_DAYS': 7,  # window of the superuser dashboard metrics
+    'PRUNE_HOURS': 6,
+}
+
+# === FAIR SHARE ===
+# Queue for GPU-time requests on top of exclusive windows (core.fairshare).
+# Priority is the role weight divided by (1 + decayed hours used recently).
+FAIR_SHARE = {
+    'ENABLED': False,
+    'POLICY': 'fair_share',  # fifo | fair_share | fair_share_preempt
+    'ROLE_WEIGHTS': {'doctoral': 2, 'teacher': 3},  # other roles weigh 1
+    'USAGE_HALF_LIFE_DAYS': 7,
+    'USAGE_WINDOW_DAYS': 30,
+    'LOOKAHEAD_HOURS': 2,  # only slots starting this soon are granted; the rest wait in priority order
+    'MAX_REQUEST_HOURS': 8,
+    'PREEMPT_AFTER_MINUTES': 60,  # a request must wait this long before preempting
+    'PREEMPT_RATIO': 2.0,  # waiter priority needed, relative to the holder's
+    'NOTICE_MINUTES': 15,  # time a preempted holder keeps to save work
+    'INTERVAL': 60,  # seconds between queue passes
+}
+
+# === JUPYTER IMAGES ===
+# Framework name -> image (without tag) used for user notebook containers
+JUPYTER_IMAGES = {
+    'tensorflow': 'my-tf',
+    'pytorch': 'my-torch',
+}
+
+# Host ports handed out to Jupyter containers (inclusive range)
+JUPYTER_PORT_RANGE = (40000, 40999)
+
+# Readiness probing of freshly started notebooks
+JUPYTER_READINESS = {
+    'HOST': '127.0.0.1',       # where the prober reaches published Jupyter ports
+    'TIMEOUT': 120,            # seconds before giving up
+    'INITIAL_DELAY': 0.25,     # first backoff step in seconds
+    'MAX_DELAY': 2.0,          # backoff cap in seconds
+}
+
+# === CONTAINER LOGS ===
+CONTAINER_LOGS = {
+    'BUFFER_BYTES': 256 * 1024,    # ring buffer size per followed container
+    'MAX_BUFFERS': 200,            # buffers kept in memory per process
+    'MAX_TAIL_LINES': 1000,        # upper bound for ?lines=
+    'FOLLOW_BACKLOG': 200,         # lines loaded when a follower starts
+}
+
+# === RECONCILIATION (database <-> Docker daemon) ===
+RECONCILE = {
+    'INTERVAL': 15,            # seconds between reconciliation passes
+    'ORPHAN_GRACE': 300,       # seconds before an unknown container counts as orphan
+    'REMOVE_ORPHANS': False,   # remove orphans instead of only logging them
+}
+
+# === BULK CONTAINER ACTIONS (superuser dashboard) ===
+BULK_ACTIONS = {
+    'MAX_PARALLEL': 16,        # containers acted on at the same time
+    'ITEM_TIMEOUT': 30,        # seconds per Docker API call
+    'STOP_GRACE': 10,          # seconds before a stopping container is killed
+}
+
+# === WARM POOL (pre-started Jupyter containers) ===
+# Idle containers per framework, claimed by users on "Launch Notebook".
+# The whole pool must fit inside MAX_MEM_MB / MAX_CPUS.
+WARM_POOL = {
+    'ENABLED': os.getenv('WARM_POOL_ENABLED', '0') == '1',
+    'SIZES': {'tensorflow': 1, 'pytorch': 1},
+    'MEM_LIMIT_MB': 1024,      # per idle container
+    'CPU_LIMIT': 0.5,          # per idle container
+    'MAX_MEM_MB': 4096,        # budget for the whole pool
+    'MAX_CPUS': 2,             # budget for the whole pool
+    'GPU': True,               # pool containers use the nvidia runtime
+    'REFILL_INTERVAL': 60,     # seconds between scheduled refills
+}
+
 # === CUSTOM DIRECTORIES FOR WORKSPACE ===
 # Ensure folders exist at runtime for container mounting
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 os.makedirs(os.path.join(MEDIA_ROOT, 'jupyter_notebooks'), exist_ok=True)
 os.makedirs(os.path.join(MEDIA_ROOT, 'docker_volumes'), exist_ok=True)
 os.makedirs(os.path.join(MEDIA_ROOT, 'ai_models'), exist_ok=True)
+os.makedirs(os.path.join(MEDIA_ROOT, 'warm_pool'), exist_ok=True)
+os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
 
 
 LOGGING = {
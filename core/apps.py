@@ -5,5 +5,4 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        # your code here (ถ้ามี)
-        pass
+        from . import signals  # noqa: F401
@@ -0,0 +1,188 @@
+import logging
+import os
+import tarfile
+import threading
+import zipfile
+import zlib
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'zip': ('application/zip', '.zip'),
+    'tar.gz': ('application/gzip', '.tar.gz'),
+}
+
+Member = Tuple[str, str, bool]  # path on disk, name in the archive, is a directory
+
+
+def walk(path: str, arcname: str) -> Iterator[Member]:
+    """Members for ``path`` under ``arcname``, depth first and lazily.
+
+    Symlinks are skipped, so an archive never reaches outside the tree
+    it was asked for.
+    """
+    if os.path.islink(path):
+        return
+    if os.path.isdir(path):
+        yield path, arcname, True
+        try:
+            with os.scandir(path) as scan:
+                names = sorted(entry.name for entry in scan)
+        except OSError as e:
+            logger.warning(f"[Archives] Skipping unreadable directory {path}: {e}")
+            return
+        for name in names:
+            yield from walk(os.path.join(path, name), f"{arcname}/{name}")
+    elif os.path.isfile(path):
+        yield path, arcname, False
+
+
+class _Sink:
+    """Write-only, unseekable target for ``zipfile``; drained after each block."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class ArchiveStream:
+    """A zip or tar.gz of ``members`` produced block by block.
+
+    Nothing is buffered beyond one block, so memory stays flat for any
+    archive size. When the client goes away the iterator is closed (WSGI)
+    or cancelled (ASGI) and reading stops at the next block.
+    """
+
+    def __init__(self, members: Iterable[Member], fmt: str = 'zip', label: str = ''):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown archive format: {fmt}")
+        self.members = members
+        self.fmt = fmt
+        self.label = label
+        self.sent = 0
+        self.files = 0
+        self.cancelled = threading.Event()
+        self._block = settings.ARCHIVES['BLOCK_BYTES']
+
+    def _read(self, path: str) -> Iterator[bytes]:
+        with open(path, 'rb') as source:
+            while not self.cancelled.is_set():
+                data = source.read(self._block)
+                if not data:
+                    return
+                yield data
+
+    def _zip(self) -> Iterator[bytes]:
+        sink = _Sink()
+        compression = zipfile.ZIP_DEFLATED if settings.ARCHIVES['ZIP_COMPRESSION'] == 'deflated' else zipfile.ZIP_STORED
+        with zipfile.ZipFile(sink, 'w', compression=compression, allowZip64=True, strict_timestamps=False,
+                             compresslevel=settings.ARCHIVES['COMPRESS_LEVEL']) as archive:
+            for path, arcname, is_dir in self.members:
+                if self.cancelled.is_set():
+                    return
+                try:
+                    info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                except OSError:
+                    continue  # removed since it was listed
+                if is_dir:
+                    archive.writestr(info, b'')
+                else:
+                    # the stat size lets zipfile pick ZIP64 headers up front
+                    info.compress_type = compression
+                    with archive.open(info, 'w') as entry:
+                        for data in self._read(path):
+                            entry.write(data)
+                            yield sink.drain()
+                    self.files += 1
+                yield sink.drain()
+        yield sink.drain()  # central directory
+
+    def _tar(self) -> Iterator[bytes]:
+        gzip = zlib.compressobj(settings.ARCHIVES['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        written = 0
+        for path, arcname, is_dir in self.members:
+            if self.cancelled.is_set():
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            info = tarfile.TarInfo(arcname)
+            info.mtime = int(stat.st_mtime)
+            info.mode = stat.st_mode & 0o7777
+            info.type = tarfile.DIRTYPE if is_dir else tarfile.REGTYPE
+            info.size = 0 if is_dir else stat.st_size
+            # PAX headers carry long names and sizes past 8 GB
+            header = info.tobuf(tarfile.PAX_FORMAT)
+            written += len(header)
+            yield gzip.compress(header)
+            if is_dir:
+                continue
+            remaining = info.size
+            for data in self._read(path):
+                data = data[:remaining]  # the file grew after the header was written
+                remaining -= len(data)
+                yield gzip.compress(data)
+                if not remaining:
+                    break
+            if self.cancelled.is_set():
+                return
+            padding = remaining + (-info.size % tarfile.BLOCKSIZE)  # zero-fill if it shrank
+            written += info.size + -info.size % tarfile.BLOCKSIZE
+            yield gzip.compress(b'\0' * padding)
+            self.files += 1
+        end = b'\0' * (2 * tarfile.BLOCKSIZE)
+        written += len(end)
+        end += b'\0' * (-written % tarfile.RECORDSIZE)
+        yield gzip.compress(end) + gzip.flush()
+
+    def __iter__(self) -> Iterator[bytes]:
+        chunks = self._zip() if self.fmt == 'zip' else self._tar()
+        finished = False
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.sent += len(chunk)
+                    yield chunk
+            finished = not self.cancelled.is_set()
+        finally:
+            chunks.close()
+            if finished:
+                logger.info(f"[Archives] {self.label}: {self.files} files, {self.sent} bytes")
+            else:
+                logger.info(f"[Archives] {self.label}: cancelled after {self.files} files, {self.sent} bytes")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        chunks = iter(self)
+        step = sync_to_async(next, thread_sensitive=False)
+        done = object()
+        try:
+            while True:
+                chunk = await step(chunks, done)
+                if chunk is done:
+                    return
+                yield chunk
+        finally:
+            # a cancelled step may still be running in its thread; the flag
+            # stops it at the next block and that thread closes the files
+            self.cancelled.set()
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import shutil
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import AIModel, Blob, UserFile
+
+logger = logging.getLogger(__name__)
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Disk-backed upload handler that also SHA-256s the data as it arrives,
+    so storing the file in the blob store needs no second read."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+def blob_root() -> str:
+    return os.path.join(settings.MEDIA_ROOT, settings.BLOB_STORE['DIR'])
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(blob_root(), digest[:2], digest[2:4], digest)
+
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def adopt(path: str, digest: Optional[str] = None) -> Optional[Blob]:
+    """Make ``path`` a hardlink of the blob holding its content.
+
+    Known content replaces the file with a link to the existing blob; new
+    content becomes a blob itself. Blobs are read-only, so an in-place
+    write cannot change the data under another user's path. Returns None
+    when the file is left as it was (too small, or no hardlinks here).
+
+    Call it inside the transaction that saves the referencing row: the
+    blob's row lock then lasts until that row exists, so a concurrent
+    :func:`release` cannot delete the blob in between.
+    """
+    cfg = settings.BLOB_STORE
+    size = os.path.getsize(path)
+    if not cfg['ENABLED'] or size < cfg['MIN_SIZE']:
+        return None
+    digest = digest or hash_file(path)
+    target = blob_path(digest)
+
+    try:
+        with transaction.atomic():
+            blob, _ = Blob.objects.select_for_update().get_or_create(sha256=digest, defaults={'size': size})
+            if os.path.exists(target):
+                if not os.path.samefile(path, target):
+                    swap = f"{path}.dedup"
+                    os.link(target, swap)
+                    os.replace(swap, path)
+                    logger.info(f"[Blobs] {path} deduplicated against {digest[:12]} ({size} bytes)")
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.link(path, target)
+                os.chmod(target, 0o444)
+    except OSError as e:
+        # e.g. MEDIA_ROOT spread over filesystems; keep the plain copy
+        logger.warning(f"[Blobs] Could not link {path} into the blob store: {e}")
+        return None
+    return blob
+
+
+def store(instance, field_name: str, uploaded, save: bool = True):
+    """Save ``uploaded`` into ``instance.<field_name>`` and share its data
+    with identical files already stored. With ``save=False`` the caller
+    saves ``instance`` inside its own transaction, see :func:`adopt`."""
+    field_file = getattr(instance, field_name)
+    field_file.save(uploaded.name, uploaded, save=False)
+    with transaction.atomic():
+        instance.blob = adopt(field_file.path, getattr(uploaded, 'sha256', None))
+        if save:
+            instance.save()
+    return instance
+
+
+def release(digest: Optional[str]):
+    """Drop the blob once no user file or model refers to it any more."""
+    if not digest:
+        return
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(sha256=digest).first()
+        if blob is None or blob.user_files.exists() or blob.ai_models.exists():
+            return
+        try:
+            os.remove(blob_path(digest))
+        except FileNotFoundError:
+            pass
+        blob.delete()
+    logger.info(f"[Blobs] Released {digest[:12]} ({blob.size} bytes)")
+
+
+def dedup_report(top: int = 10) -> Dict:
+    """Logical bytes (every reference counted) against bytes actually on disk."""
+    blobs = Blob.objects.annotate(
+        refs=Count('user_files', distinct=True) + Count('ai_models', distinct=True)
+    ).filter(refs__gt=0)
+    physical = blobs.aggregate(total=Sum('size'))['total'] or 0
+    logical = sum(size * refs for size, refs in blobs.values_list('size', 'refs'))
+    unshared = UserFile.objects.filter(blob__isnull=True).count() + AIModel.objects.filter(blob__isnull=True).count()
+    return {
+        'blobs': blobs.count(),
+        'references': sum(blobs.values_list('refs', flat=True)),
+        'logical_bytes': logical,
+        'physical_bytes': physical,
+        'saved_bytes': logical - physical,
+        'saved_percent': round((logical - physical) / logical * 100, 1) if logical else 0.0,
+        'unlinked_files': unshared,
+        'top': [
+            {'sha256': blob.sha256, 'size': blob.size, 'refs': blob.refs, 'saved_bytes': blob.size * (blob.refs - 1)}
+            for blob in blobs.filter(refs__gt=1).order_by('-size')[:top]
+        ],
+    }
+
+
+def copy_writable(source: str, destination: str):
+    """Copy data and mtime but not the mode: a copy of a read-only blob
+    link is meant to be edited."""
+    shutil.copyfile(source, destination)
+    stat = os.stat(source)
+    os.utime(destination, ns=(stat.st_atime_ns, stat.st_mtime_ns))
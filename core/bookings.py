@@ -0,0 +1,329 @@
+import copy
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ContainerSchedule, DockerContainer, RecurringSchedule, SchedulerLease
+from .recurrence import day_start, expand, occurrences
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'bookings'
+# Two open-ended rules are compared over their combined period; longer
+# periods are refused rather than expanded
+MAX_PERIOD_DAYS = 3660
+
+
+class BookingConflict(ValueError):
+    def __init__(self, conflicts: List[ContainerSchedule]):
+        self.conflicts = conflicts
+        super().__init__(f"Overlaps {len(conflicts)} existing booking(s)")
+
+
+class IntervalTree:
+    """Static interval tree over half-open ``[start, end)`` intervals.
+
+    Built once from a list (a balanced BST over interval starts, each node
+    holding the max end of its subtree), then queried in O(log n + k).
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[Any, Any, Any]]):
+        self.intervals = sorted(intervals, key=lambda i: (i[0], i[1]))
+        self._max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def _build(self, lo: int, hi: int):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        ends = [self.intervals[mid][1]]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None:
+                ends.append(child)
+        self._max_end[mid] = max(ends)
+        return self._max_end[mid]
+
+    def overlapping(self, start, end) -> List[Any]:
+        """Payloads of intervals overlapping ``[start, end)``, by start."""
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                continue  # nothing in this subtree ends after start
+            i_start, i_end, payload = self.intervals[mid]
+            stack.append((lo, mid))
+            if i_start < end:
+                if i_end > start:
+                    found.append((i_start, payload))
+                stack.append((mid + 1, hi))
+        return [payload for _, payload in sorted(found, key=lambda f: f[0])]
+
+
+class BookingIndex:
+    """Interval tree of active, not yet finished bookings, plus the active
+    recurring rules (expanded per query, only inside the queried window).
+
+    Rebuilt on the next lookup after a booking changes in this process
+    (see ``core.signals``), and at least every ``INDEX_TTL`` seconds so
+    edits made by other workers are picked up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree: Optional[IntervalTree] = None
+        self._rules: List[RecurringSchedule] = []
+        self._built_at = 0.0
+
+    def invalidate(self):
+        self._tree = None
+
+    def _refresh(self):
+        with self._lock:
+            if self._tree is None or time.monotonic() - self._built_at > settings.BOOKINGS['INDEX_TTL']:
+                rows = (ContainerSchedule.objects.filter(active=True, end_datetime__gt=timezone.now())
+                        .select_related('container__user'))
+                self._tree = IntervalTree((row.start_datetime, row.end_datetime, row) for row in rows)
+                self._rules = list(RecurringSchedule.objects.filter(active=True).select_related('container__user'))
+                self._built_at = time.monotonic()
+            return self._tree, self._rules
+
+    def tree(self) -> IntervalTree:
+        return self._refresh()[0]
+
+    def rules(self) -> List[RecurringSchedule]:
+        return self._refresh()[1]
+
+    def busy(self, start: datetime, end: datetime) -> List[ContainerSchedule]:
+        """Bookings and rule occurrences overlapping ``[start, end)``, by start."""
+        tree, rules = self._refresh()
+        return sorted(tree.overlapping(start, end) + expand(rules, start, end), key=lambda row: row.start_datetime)
+
+    def conflicts(self, start: datetime, end: datetime, exclude_id: Optional[int] = None,
+                  exclude_rule_id: Optional[int] = None) -> List[ContainerSchedule]:
+        return [
+            row for row in self.busy(start, end)
+            if (row.id is None or row.id != exclude_id)
+            and (not hasattr(row, 'recurring') or row.recurring.id != exclude_rule_id)
+        ]
+
+
+booking_index = BookingIndex()
+
+
+def _overlapping_rows(start: datetime, end: datetime, exclude_id: Optional[int] = None):
+    rows = ContainerSchedule.objects.filter(active=True, start_datetime__lt=end, end_datetime__gt=start)
+    return rows.exclude(id=exclude_id) if exclude_id else rows
+
+
+def _busy_tree(start: datetime, end: datetime, exclude_id: Optional[int] = None,
+               exclude_rule_id: Optional[int] = None) -> IntervalTree:
+    """Fresh from the database: bookings and rule occurrences in ``[start, end)``."""
+    rows = list(_overlapping_rows(start, end, exclude_id).select_related('container__user'))
+    rules = RecurringSchedule.objects.filter(active=True).select_related('container__user')
+    if exclude_rule_id:
+        rules = rules.exclude(id=exclude_rule_id)
+    rows += expand(rules, start, end)
+    return IntervalTree((row.start_datetime, row.end_datetime, row) for row in rows)
+
+
+def _lock_bookings():
+    """Serialize check-then-write across processes until the transaction ends.
+
+    Any active booking conflicts with any other, so the lock is one row for
+    the whole calendar. An UPDATE rather than ``select_for_update``: it
+    row-locks on PostgreSQL and takes the write lock on SQLite, which
+    ignores ``FOR UPDATE``.
+    """
+    if not SchedulerLease.objects.filter(name=LOCK_NAME).update(expires_at=timezone.now()):
+        SchedulerLease.objects.get_or_create(name=LOCK_NAME, defaults={'expires_at': timezone.now()})
+        SchedulerLease.objects.filter(name=LOCK_NAME).update(expires_at=timezone.now())
+
+
+def _period_days(rule: RecurringSchedule) -> int:
+    return rule.interval * (7 if rule.frequency == 'weekly' else 1)
+
+
+def _pattern(rule: RecurringSchedule) -> RecurringSchedule:
+    """``rule`` without its exceptions: a day skipped once still clashes in later periods."""
+    pattern = copy.copy(rule)
+    pattern.exceptions = []
+    return pattern
+
+
+def _open_ended_clashes(rule: RecurringSchedule, others: Iterable[RecurringSchedule]) -> List[ContainerSchedule]:
+    """Occurrences of other open-ended rules that ever overlap open-ended ``rule``.
+
+    Once the later of two rules has started, both repeat every LCM of their
+    periods, so that one combined period covers every future overlap.
+    """
+    clashes = []
+    for other in others:
+        if other.until is not None or other.pk == rule.pk:
+            continue
+        period = math.lcm(_period_days(rule), _period_days(other))
+        if period > MAX_PERIOD_DAYS:
+            raise ValueError(f"Repeats with {other} only every {period} days; give one rule an end date")
+        # Any whole number of periods after the later first date works;
+        # take the one running now so reported clashes are current
+        first = max(rule.first_date, other.first_date)
+        first += timedelta(days=max(0, (timezone.now().date() - first).days) // period * period)
+        start = day_start(first)
+        end = start + timedelta(days=period) + max(rule.duration, other.duration)
+        tree = IntervalTree((row.start_datetime, row.end_datetime, row) for row in expand([_pattern(other)], start, end))
+        clashes += [row for s, e in occurrences(_pattern(rule), start, end) for row in tree.overlapping(s, e)]
+    return clashes
+
+
+def _open_ended_span_end(span_start: datetime) -> datetime:
+    """How far an open-ended rule is checked against bookings and bounded rules:
+    ``SEARCH_DAYS``, or up to the last of them if that is later."""
+    last_booking = ContainerSchedule.objects.filter(active=True).aggregate(end=Max('end_datetime'))['end']
+    last_until = RecurringSchedule.objects.filter(active=True).aggregate(until=Max('until'))['until']
+    ends = [span_start + timedelta(days=settings.BOOKINGS['SEARCH_DAYS'])]
+    if last_booking:
+        ends.append(last_booking)
+    if last_until:
+        ends.append(day_start(last_until + timedelta(days=1)))
+    return max(ends)
+
+
+def book(container: DockerContainer, start: datetime, end: datetime, active: bool = True,
+         schedule: Optional[ContainerSchedule] = None) -> ContainerSchedule:
+    """Create a booking, or move ``schedule``, unless it overlaps another active one.
+
+    The in-memory index answers the common case; the final check runs
+    against the database inside the write transaction, under the booking lock.
+    """
+    if end <= start:
+        raise ValueError("Booking must end after it starts")
+    exclude_id = schedule.id if schedule else None
+    if active:
+        clashes = booking_index.conflicts(start, end, exclude_id)
+        if clashes:
+            raise BookingConflict(clashes)
+
+    with transaction.atomic():
+        if active:
+            _lock_bookings()
+            clashes = _busy_tree(start, end, exclude_id).overlapping(start, end)
+            if clashes:
+                raise BookingConflict(clashes)
+        if schedule is None:
+            schedule = ContainerSchedule(container=container)
+        schedule.start_datetime, schedule.end_datetime, schedule.active = start, end, active
+        schedule.save()
+    return schedule
+
+
+def book_recurring(rule: RecurringSchedule) -> RecurringSchedule:
+    """Save ``rule`` unless one of its occurrences overlaps another booking.
+
+    Occurrences are checked up to ``until``; open-ended rules up to the last
+    booking or bounded rule (at least ``SEARCH_DAYS``), and against other
+    open-ended rules over their combined period. Each check only expands
+    other rules inside its span.
+    """
+    if rule.duration <= timedelta(0):
+        raise ValueError("Recurring window must end after it starts")
+    if rule.until and rule.until < rule.first_date:
+        raise ValueError("Recurrence must end on or after its first date")
+
+    if rule.active:
+        span_start = max(day_start(rule.first_date), timezone.now())
+        span_end = (day_start(rule.until + timedelta(days=1)) if rule.until
+                    else _open_ended_span_end(span_start))
+        own = list(occurrences(rule, span_start, span_end))
+        clashes = [row for s, e in own for row in booking_index.conflicts(s, e, exclude_rule_id=rule.pk)]
+        if rule.until is None:
+            clashes += _open_ended_clashes(rule, booking_index.rules())
+        if clashes:
+            raise BookingConflict(clashes)
+
+    with transaction.atomic():
+        if rule.active:
+            _lock_bookings()
+            clashes = []
+            if own:
+                tree = _busy_tree(own[0][0], own[-1][1], exclude_rule_id=rule.pk)
+                clashes = [row for s, e in own for row in tree.overlapping(s, e)]
+            if rule.until is None:
+                open_ended = RecurringSchedule.objects.filter(active=True, until__isnull=True)
+                clashes += _open_ended_clashes(rule, open_ended.select_related('container__user'))
+            if clashes:
+                raise BookingConflict(clashes)
+        rule.save()
+    return rule
+
+
+def _align(moment: datetime, minutes: int) -> datetime:
+    moment = moment.replace(second=0, microsecond=0)
+    overshoot = (moment.hour * 60 + moment.minute) % minutes
+    return moment + timedelta(minutes=minutes - overshoot) if overshoot else moment
+
+
+def free_slots(length: timedelta, count: int = 5, after: Optional[datetime] = None,
+               horizon: Optional[timedelta] = None) -> List[Tuple[datetime, datetime]]:
+    """The next ``count`` free ``[start, end)`` slots of ``length``.
+
+    Slots start on ``SLOT_ALIGN_MINUTES`` boundaries and may sit back to back
+    inside one long gap. Only bookings within ``horizon`` are considered.
+    """
+    cfg = settings.BOOKINGS
+    align = cfg['SLOT_ALIGN_MINUTES']
+    cursor = _align(max(after or timezone.now(), timezone.now()), align)
+    limit = cursor + (horizon or timedelta(days=cfg['SEARCH_DAYS']))
+
+    busy = booking_index.busy(cursor, limit)
+    slots = []
+    for row in busy + [None]:
+        gap_end = row.start_datetime if row is not None else limit
+        while len(slots) < count and cursor + length <= gap_end:
+            slots.append((cursor, cursor + length))
+            cursor += length
+        if len(slots) >= count:
+            break
+        if row is not None:
+            cursor = max(cursor, _align(row.end_datetime, align))
+    return slots
+
+
+def calendar(start: datetime, end: datetime, show_users: bool = True) -> List[dict]:
+    """Bookings and recurring occurrences overlapping ``[start, end)``, for a week or month view."""
+    rows = (ContainerSchedule.objects.filter(start_datetime__lt=end, end_datetime__gt=start)
+            .order_by('start_datetime')
+            .values('id', 'start_datetime', 'end_datetime', 'active', 'container_id', 'container__user__username'))
+    events = [{
+        'id': row['id'],
+        'recurring': None,
+        'start': row['start_datetime'].isoformat(),
+        'end': row['end_datetime'].isoformat(),
+        'active': row['active'],
+        'container': row['container_id'],
+        'user': row['container__user__username'] if show_users else None,
+    } for row in rows]
+    for row in expand(RecurringSchedule.objects.select_related('container__user'), start, end):
+        events.append({
+            'id': None,
+            'recurring': row.recurring.id,
+            'start': row.start_datetime.isoformat(),
+            'end': row.end_datetime.isoformat(),
+            'active': row.active,
+            'container': row.container_id,
+            'user': row.container.user.username if show_users else None,
+        })
+    return sorted(events, key=lambda event: event['start'])
@@ -0,0 +1,137 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterable, Iterator, List
+
+import docker
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.exceptions import Timeout
+
+from .cpus import cpu_pinner
+from .docker_utils import docker_manager
+from .hosts import group_by_host
+from .models import DockerContainer
+
+logger = logging.getLogger(__name__)
+
+# action -> (container method, DB status afterwards)
+ACTIONS = {
+    'start': ('start', 'running'),
+    'stop': ('stop', 'stopped'),
+    'pause': ('pause', 'paused'),
+    'unpause': ('unpause', 'running'),
+}
+
+
+def _client(host=None):
+    # A client of its own: the HTTP timeout is what bounds each item.
+    timeout = settings.BULK_ACTIONS['ITEM_TIMEOUT']
+    if host is not None:
+        return docker.DockerClient(base_url=host.base_url, timeout=timeout)
+    return docker.from_env(timeout=timeout)
+
+
+def _apply(row: DockerContainer, container, action: str):
+    method, _ = ACTIONS[action]
+    if action == 'start':
+        container = docker_manager.adopt_pool_container(row, container)
+    if action == 'stop':
+        container.stop(timeout=settings.BULK_ACTIONS['STOP_GRACE'])
+    else:
+        getattr(container, method)()
+
+
+def run_bulk_action(rows: Iterable[DockerContainer], action: str, by_admin: bool = True, client=None) -> Iterator[Dict]:
+    """Apply ``action`` to many containers concurrently.
+
+    Yields one progress dict per container as it finishes, then a summary.
+    Rows of the containers that succeeded are updated in a single
+    ``bulk_update`` once all items are done.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Invalid action: {action}")
+
+    rows = [row for row in rows if row.container_id]
+    groups = group_by_host(rows)
+    clients = {}
+    try:
+        for host in groups:
+            clients[host] = client or _client(host)
+        yield from _run(clients, groups, action, by_admin)
+    finally:
+        if client is None:
+            for own in clients.values():
+                own.close()
+
+
+async def arun_bulk_action(rows: Iterable[DockerContainer], action: str, by_admin: bool = True) -> AsyncIterator[Dict]:
+    """Async twin of :func:`run_bulk_action` for ASGI responses: Django would
+    otherwise drain a sync iterator completely before sending the first event."""
+    events = run_bulk_action(rows, action, by_admin)
+    # thread-sensitive: every step, ORM calls included, runs on the one sync thread
+    step = sync_to_async(next)
+    done = object()
+    try:
+        while True:
+            event = await step(events, done)
+            if event is done:
+                return
+            yield event
+    finally:
+        await sync_to_async(events.close)()
+
+
+def _run(clients: Dict, groups: Dict, action: str, by_admin: bool) -> Iterator[Dict]:
+    # One list call per host
+    engine = {}
+    unreachable = {}
+    for host, host_rows in groups.items():
+        ids = [row.container_id for row in host_rows]
+        try:
+            engine.update({c.id: c for c in clients[host].containers.list(all=True, sparse=True, filters={'id': ids})})
+        except Exception as e:
+            logger.error(f"[Bulk] Could not list containers on {host or 'local'}: {e}")
+            unreachable.update({cid: host or 'local' for cid in ids})
+    rows = [row for host_rows in groups.values() for row in host_rows]
+
+    def work(row):
+        started = time.monotonic()
+        if row.container_id in unreachable:
+            raise ConnectionError(f"host {unreachable[row.container_id]} unreachable")
+        container = engine.get(row.container_id)
+        if container is None:
+            raise docker.errors.NotFound(f"container {row.container_id[:12]} not found")
+        _apply(row, container, action)
+        return time.monotonic() - started
+
+    _, new_status = ACTIONS[action]
+    done: List[DockerContainer] = []
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=settings.BULK_ACTIONS['MAX_PARALLEL']) as pool:
+        futures = {pool.submit(work, row): row for row in rows}
+        for future in as_completed(futures):
+            row = futures[future]
+            event = {'container': row.id, 'user': row.user.username, 'action': action}
+            try:
+                event['elapsed'] = round(future.result(), 2)
+                event['ok'] = True
+                event['status'] = new_status
+                row.status = new_status
+                if action in ('start', 'stop'):
+                    row.can_user_start = action == 'start' or not by_admin
+                done.append(row)
+            except Exception as e:
+                failed += 1
+                event['ok'] = False
+                event['error'] = 'timeout' if isinstance(e, Timeout) else str(e)
+                logger.error(f"[Bulk] {action} failed for {row.user.username}: {e}")
+            yield event
+
+    if done:
+        DockerContainer.objects.bulk_update(done, ['status', 'can_user_start'])
+        if action == 'stop':
+            cpu_pinner.defragment_async()
+
+    yield {'done': True, 'ok': len(done), 'failed': failed}
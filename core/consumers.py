@@ -2,12 +2,28 @@ import json
 import psutil
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-import docker
+from asgiref.sync import sync_to_async
 import asyncio
+from .docker_utils import docker_manager
+from .hosts import is_remote
 from .models import DockerContainer
+from .readiness import notification_group
+from .logs import log_group, log_service
 import os
 import pynvml
 
+
+def count_containers() -> int:
+    """Running containers across every engine; an unreachable one counts as none."""
+    total = 0
+    for host in docker_manager.hosts.engine_hosts():
+        try:
+            total += len(docker_manager.hosts.client(host).containers.list())
+        except Exception as e:
+            print(f"Error listing containers on {host.name if host else 'local'}: {e}")
+    return total
+
+
 class MonitoringConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         await self.accept()
@@ -35,8 +51,6 @@ class MonitoringConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def get_system_stats(self):
-        client = docker.from_env()
-
         gpu_data = {
             'utilization': 0,
             'memory_percent': 0,
@@ -61,7 +75,7 @@ class MonitoringConsumer(AsyncWebsocketConsumer):
         stats = {
             'cpu': psutil.cpu_percent(),
             'memory': psutil.virtual_memory().percent,
-            'containers': len(client.containers.list()),
+            'containers': count_containers(),
             'active_users': DockerContainer.objects.filter(status='running').count(),
             'gpu': gpu_data,
         }
@@ -94,7 +108,10 @@ class ContainerConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_container_stats(self):
         try:
-            client = docker.from_env()
+            row = DockerContainer.objects.select_related('host').filter(container_id=self.container_id).first()
+            client = docker_manager.hosts.client_for(row)
+            if not client:
+                return None
             container = client.containers.get(self.container_id)
             stats = container.stats(stream=False)
 
@@ -116,32 +133,33 @@ class ContainerConsumer(AsyncWebsocketConsumer):
                     rx += iface.get('rx_bytes', 0)
                     tx += iface.get('tx_bytes', 0)
 
-            # GPU usage
+            # GPU usage (NVML and /proc only see containers on this machine)
             gpu_memory_mb = 0
-            try:
-                pid_host = container.attrs['State']['Pid']
-                pids = [pid_host]
+            if not is_remote(row.host if row else None):
+                try:
+                    pid_host = container.attrs['State']['Pid']
+                    pids = [pid_host]
 
-                children_output = os.popen(f"cat /proc/{pid_host}/task/{pid_host}/children").read()
-                pids += [int(pid) for pid in children_output.strip().split()] if children_output.strip() else []
+                    children_output = os.popen(f"cat /proc/{pid_host}/task/{pid_host}/children").read()
+                    pids += [int(pid) for pid in children_output.strip().split()] if children_output.strip() else []
 
-                pynvml.nvmlInit()
-                handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+                    pynvml.nvmlInit()
+                    handle = pynvml.nvmlDeviceGetHandleByIndex(0)
 
-                try:
-                    processes = pynvml.nvmlDeviceGetComputeRunningProcesses(handle)
-                except pynvml.NVMLError_NotSupported:
-                    processes = []
+                    try:
+                        processes = pynvml.nvmlDeviceGetComputeRunningProcesses(handle)
+                    except pynvml.NVMLError_NotSupported:
+                        processes = []
 
-                for proc in processes:
-                    if proc.pid in pids:
-                        used_memory = getattr(proc, 'usedGpuMemory', 0)
-                        gpu_memory_mb += used_memory // (1024 * 1024)
+                    for proc in processes:
+                        if proc.pid in pids:
+                            used_memory = getattr(proc, 'usedGpuMemory', 0)
+                            gpu_memory_mb += used_memory // (1024 * 1024)
 
-                pynvml.nvmlShutdown()
-            except Exception as e:
-                print(f"[GPU] Error: {e}")
-                gpu_memory_mb = 0  # fallback
+                    pynvml.nvmlShutdown()
+                except Exception as e:
+                    print(f"[GPU] Error: {e}")
+                    gpu_memory_mb = 0  # fallback
 
             return {
                 'cpu': round(cpu_percent, 2),
@@ -157,3 +175,57 @@ class ContainerConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             print(f"Container stats error: {str(e)}")
             return None
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Per-user push channel (e.g. "your notebook is ready")."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close()
+            return
+        self.group_name = notification_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notify(self, event):
+        await self.send(text_data=json.dumps(event['payload']))
+
+
+class LogConsumer(AsyncWebsocketConsumer):
+    """Follow a container's logs; all viewers share one follower."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        self.container_id = await self.get_container_id(user, self.scope['url_route']['kwargs']['container_pk'])
+        if not self.container_id:
+            await self.close()
+            return
+
+        self.group_name = log_group(self.container_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        buffer = await sync_to_async(log_service.attach)(self.container_id)
+        await self.send(text_data=json.dumps({'lines': buffer.tail()}))
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'group_name', None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await sync_to_async(log_service.detach)(self.container_id)
+
+    async def log_lines(self, event):
+        await self.send(text_data=json.dumps({'lines': event['lines']}))
+
+    @database_sync_to_async
+    def get_container_id(self, user, container_pk):
+        if not user or not user.is_authenticated:
+            return None
+        container = DockerContainer.objects.filter(id=container_pk).first()
+        if not container or (container.user_id != user.id and not user.is_superuser):
+            return None
+        return container.container_id or None
@@ -0,0 +1,243 @@
+import glob
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from .hosts import is_remote
+from .models import CustomUser, DockerContainer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """``"0-3,8,10-11"`` -> ``[0, 1, 2, 3, 8, 10, 11]``"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpulist(cpus: Iterable[int]) -> str:
+    """``[0, 1, 2, 3, 8]`` -> ``"0-3,8"``"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@dataclass
+class Topology:
+    # NUMA node -> physical cores, each a tuple of its hyperthread siblings
+    nodes: Dict[int, List[Tuple[int, ...]]]
+
+    def node_of(self, cpu: int) -> Optional[int]:
+        for node, cores in self.nodes.items():
+            if any(cpu in core for core in cores):
+                return node
+        return None
+
+    def cpus(self, node: int) -> List[int]:
+        return [cpu for core in self.nodes[node] for cpu in core]
+
+
+def read_topology(root: str = '/sys/devices/system', reserved: Iterable[int] = ()) -> Topology:
+    """Read NUMA nodes and hyperthread siblings from sysfs.
+
+    Machines without ``node/`` (no NUMA) are treated as a single node 0.
+    ``reserved`` CPUs are left out, e.g. to keep one core for the host.
+    """
+    reserved = set(reserved)
+    cpu_root = os.path.join(root, 'cpu')
+    online = [c for c in parse_cpulist(_read(os.path.join(cpu_root, 'online')) or '') if c not in reserved]
+    if not online:
+        online = [c for c in range(os.cpu_count() or 1) if c not in reserved]
+
+    node_of = {}
+    for path in glob.glob(os.path.join(root, 'node', 'node[0-9]*')):
+        node = int(os.path.basename(path)[4:])
+        for cpu in parse_cpulist(_read(os.path.join(path, 'cpulist')) or ''):
+            node_of[cpu] = node
+
+    nodes: Dict[int, set] = {}
+    for cpu in online:
+        siblings_text = _read(os.path.join(cpu_root, f'cpu{cpu}', 'topology', 'thread_siblings_list'))
+        siblings = tuple(c for c in parse_cpulist(siblings_text or '') if c in online) or (cpu,)
+        nodes.setdefault(node_of.get(cpu, 0), set()).add(siblings)
+    return Topology({node: sorted(cores) for node, cores in sorted(nodes.items())})
+
+
+def choose_cpus(topology: Topology, used: Counter, count: int, exclusive: bool = True,
+                single_node: bool = False) -> Optional[List[int]]:
+    """Pick ``count`` CPUs, or ``None`` when they can't be found.
+
+    Exclusive picks take CPUs nobody else uses, from the fullest NUMA node
+    that still fits (whole physical cores first). Shared picks take the
+    least used CPUs of the least loaded node.
+    """
+    if exclusive:
+        free = {node: [core for core in cores if not any(used[c] for c in core)]
+                for node, cores in topology.nodes.items()}
+        partial = {node: [c for core in cores for c in core if not used[c]]
+                   for node, cores in topology.nodes.items()}
+        fitting = [node for node in topology.nodes if len(partial[node]) >= count]
+        if fitting:
+            node = min(fitting, key=lambda n: (len(partial[n]), n))
+            whole = [c for core in free[node] for c in core]
+            rest = [c for c in partial[node] if c not in whole]
+            return sorted((whole + rest)[:count])
+        if single_node:
+            return None
+        spill = [c for node in sorted(topology.nodes, key=lambda n: -len(partial[n])) for c in partial[node]]
+        return sorted(spill[:count]) if len(spill) >= count else None
+
+    def load(node):
+        return sum(used[c] for c in topology.cpus(node)) / len(topology.cpus(node))
+
+    ordered = [c for node in sorted(topology.nodes, key=lambda n: (load(n), n))
+               for c in sorted(topology.cpus(node), key=lambda c: used[c])]
+    if not ordered:
+        return None
+    # Stay on the least loaded node when it is big enough
+    node = topology.node_of(ordered[0])
+    same_node = [c for c in ordered if topology.node_of(c) == node]
+    picked = same_node[:count] if len(same_node) >= count else ordered[:count]
+    return sorted(picked)
+
+
+class CpuPinner:
+    """Pins local containers to a cpuset sized by the user's ``cpu_limit``.
+
+    The cpuset is kept on the ``DockerContainer`` row and reused when the
+    container is started again, as long as nobody took those CPUs meanwhile.
+    Pins are applied with ``container.update()``, so nothing is recreated.
+    """
+
+    def __init__(self, topology: Optional[Topology] = None):
+        self._topology = topology
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.CPU_PINNING
+
+    def enabled(self) -> bool:
+        return bool(self.config.get('ENABLED'))
+
+    @property
+    def topology(self) -> Topology:
+        if self._topology is None:
+            self._topology = read_topology(self.config['SYSFS_ROOT'], self.config.get('RESERVED_CPUS', ()))
+        return self._topology
+
+    def _pinned_rows(self):
+        return (DockerContainer.objects.filter(status='running').exclude(cpuset_cpus='')
+                .select_related('host'))
+
+    def _used(self, exclude: Optional[DockerContainer] = None) -> Counter:
+        used = Counter()
+        for row in self._pinned_rows():
+            if (exclude is None or row.id != exclude.id) and not is_remote(row.host):
+                used.update(parse_cpulist(row.cpuset_cpus))
+        return used
+
+    def _mems(self, cpus: List[int]) -> str:
+        return format_cpulist({self.topology.node_of(c) for c in cpus})
+
+    def _apply(self, row: DockerContainer, container, cpus: List[int]):
+        cpuset_cpus, cpuset_mems = format_cpulist(cpus), self._mems(cpus)
+        container.update(cpuset_cpus=cpuset_cpus, cpuset_mems=cpuset_mems)
+        row.cpuset_cpus, row.cpuset_mems = cpuset_cpus, cpuset_mems
+        row.save(update_fields=['cpuset_cpus', 'cpuset_mems'])
+
+    def pin(self, row: DockerContainer, container, user: CustomUser) -> Optional[str]:
+        """Give ``container`` its cpuset, reusing the saved one when still free."""
+        if not self.enabled() or is_remote(row.host):
+            return None
+        count = min(max(1, math.ceil(user.cpu_limit)), sum(len(self.topology.cpus(n)) for n in self.topology.nodes))
+        exclusive = self.config.get('MODE', 'exclusive') == 'exclusive'
+        with self._lock:
+            used = self._used(exclude=row)
+            current = parse_cpulist(row.cpuset_cpus)
+            if len(current) == count and all(self.topology.node_of(c) is not None for c in current) \
+                    and (not exclusive or not any(used[c] for c in current)):
+                cpus = current
+            else:
+                cpus = choose_cpus(self.topology, used, count, exclusive)
+                if cpus is None:
+                    logger.warning(f"[CPU] No exclusive room for {user.username}; sharing cores")
+                    cpus = choose_cpus(self.topology, used, count, exclusive=False)
+            if cpus != current or not row.cpuset_mems:
+                self._apply(row, container, cpus)
+        return row.cpuset_cpus
+
+    def defragment(self, client=None) -> int:
+        """Re-pin running containers that span NUMA nodes or overlap others.
+
+        Called after containers stop, when freed CPUs may let a split
+        container fit on one node. Returns the number of containers moved.
+        """
+        if not self.enabled():
+            return 0
+        if client is None:
+            from .docker_utils import docker_manager
+            client = docker_manager.client
+        if not client:
+            return 0
+        exclusive = self.config.get('MODE', 'exclusive') == 'exclusive'
+        moved = 0
+        with self._lock:
+            rows = [row for row in self._pinned_rows() if not is_remote(row.host)]
+            rows.sort(key=lambda row: -len(parse_cpulist(row.cpuset_cpus)))
+            for row in rows:
+                current = parse_cpulist(row.cpuset_cpus)
+                used = self._used(exclude=row)
+                overlapping = exclusive and any(used[c] for c in current)
+                spanning = len({self.topology.node_of(c) for c in current}) > 1
+                if not (overlapping or spanning):
+                    continue
+                cpus = choose_cpus(self.topology, used, len(current), exclusive, single_node=True)
+                if cpus is None or cpus == current:
+                    continue
+                try:
+                    self._apply(row, client.containers.get(row.container_id), cpus)
+                    moved += 1
+                except Exception as e:
+                    logger.error(f"[CPU] Could not re-pin container {row.id}: {e}")
+        if moved:
+            logger.info(f"[CPU] Defragmented {moved} container cpusets")
+        return moved
+
+    def defragment_async(self):
+        if self.enabled():
+            threading.Thread(target=self.defragment, name='cpuset-defrag', daemon=True).start()
+
+
+cpu_pinner = CpuPinner()
+
+
+def defragment_cpusets():
+    """Scheduler entry point."""
+    cpu_pinner.defragment()
@@ -0,0 +1,179 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CustomUser, DiskUsage
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_DIR = re.compile(r'^user_(\d+)_')  # user_<id>_<username> and the older user_<id>_(<username>)
+
+
+@dataclass(frozen=True)
+class _Dir:
+    """What a directory holds directly; subdirectories are entries of their own."""
+    mtime_ns: int
+    size: int  # files with a single link
+    files: int
+    linked: Tuple[Tuple[int, int, int], ...]  # (device, inode, size) of files with several links
+    subdirs: Tuple[str, ...]
+
+
+@dataclass
+class Usage:
+    bytes: int = 0
+    files: int = 0
+    directories: int = 0
+    breakdown: Dict[str, int] = field(default_factory=dict)
+
+
+class DiskUsageScanner:
+    """Sizes of the ``MEDIA_ROOT/user_*`` trees.
+
+    Directories are walked in parallel with ``os.scandir``; each one's
+    direct contents are kept with its mtime, so a rescan only lists and
+    stats directories where an entry was added, removed or renamed. Files
+    rewritten in place do not move their directory's mtime; every
+    ``RESTAT_HOURS`` all directories are listed again to catch those.
+    Files with several links (deduplicated uploads) count once per user.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, _Dir] = {}
+        self._last_restat = None
+        self.listed = 0
+        self.reused = 0
+
+    def _visit(self, path: str, restat: bool) -> Optional[_Dir]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns  # before listing: a change during the scan shows next time
+        except OSError:
+            return None
+        cached = self._dirs.get(path)
+        if cached is not None and cached.mtime_ns == mtime_ns and not restat:
+            return cached
+
+        size = files = 0
+        linked, subdirs = [], []
+        try:
+            with os.scandir(path) as scan:
+                for entry in scan:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue  # symlinks, sockets, fifos
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue  # removed while listing
+                    files += 1
+                    if st.st_nlink > 1:
+                        linked.append((st.st_dev, st.st_ino, st.st_size))
+                    else:
+                        size += st.st_size
+        except OSError:
+            return None
+        return _Dir(mtime_ns, size, files, tuple(linked), tuple(subdirs))
+
+    def _walk(self, roots, restat: bool) -> Dict[str, _Dir]:
+        found = {}
+        workers = self._workers or settings.DISK_USAGE['WORKERS']
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='disk-usage') as pool:
+            pending = {pool.submit(self._visit, root, restat): root for root in roots}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    directory = future.result()
+                    if directory is None:
+                        continue
+                    found[path] = directory
+                    if directory is self._dirs.get(path):
+                        self.reused += 1
+                    else:
+                        self.listed += 1
+                    for name in directory.subdirs:
+                        child = os.path.join(path, name)
+                        pending[pool.submit(self._visit, child, restat)] = child
+        return found
+
+    def scan(self, media_root: Optional[str] = None) -> Dict[int, Usage]:
+        """Usage per user id, from a fresh walk that reuses unchanged directories."""
+        media_root = media_root or settings.MEDIA_ROOT
+        try:
+            with os.scandir(media_root) as scan:
+                roots = [entry.path for entry in scan
+                         if entry.is_dir(follow_symlinks=False) and WORKSPACE_DIR.match(entry.name)]
+        except FileNotFoundError:
+            roots = []
+
+        with self._lock:  # one scan at a time per scanner
+            restat_after = settings.DISK_USAGE['RESTAT_HOURS'] * 3600
+            restat = self._last_restat is None or time.monotonic() - self._last_restat >= restat_after
+            self.listed = self.reused = 0
+            found = self._walk(roots, restat)
+            self._dirs = found  # directories that are gone drop out here
+            if restat:
+                self._last_restat = time.monotonic()
+        return self._totals(media_root, found)
+
+    @staticmethod
+    def _totals(media_root: str, found: Dict[str, _Dir]) -> Dict[int, Usage]:
+        usages: Dict[int, Usage] = defaultdict(Usage)
+        seen: Dict[int, Set[Tuple[int, int]]] = defaultdict(set)
+        seen_in_folder: Dict[Tuple[int, str], Set[Tuple[int, int]]] = defaultdict(set)
+        for path, directory in found.items():
+            parts = os.path.relpath(path, media_root).split(os.sep)
+            user_id = int(WORKSPACE_DIR.match(parts[0]).group(1))
+            folder = parts[1] if len(parts) > 1 else '.'
+            usage = usages[user_id]
+            usage.directories += 1
+            usage.files += directory.files
+            usage.bytes += directory.size
+            in_folder = directory.size
+            for dev, ino, size in directory.linked:
+                if (dev, ino) not in seen[user_id]:
+                    seen[user_id].add((dev, ino))
+                    usage.bytes += size
+                if (dev, ino) not in seen_in_folder[user_id, folder]:
+                    seen_in_folder[user_id, folder].add((dev, ino))
+                    in_folder += size
+            usage.breakdown[folder] = usage.breakdown.get(folder, 0) + in_folder
+        return dict(usages)
+
+
+disk_usage = DiskUsageScanner()
+
+
+def scan_disk_usage() -> int:
+    """Scheduler entry point: rescan and store every user's ``DiskUsage``."""
+    started = time.monotonic()
+    usages = disk_usage.scan()
+    now = timezone.now()
+    users = CustomUser.objects.in_bulk(list(usages))
+    rows = {row.user_id: row for row in DiskUsage.objects.filter(user_id__in=users)}
+    for user_id, usage in usages.items():
+        if user_id not in users:
+            continue  # workspace of a deleted account
+        row = rows.get(user_id) or DiskUsage(user_id=user_id)
+        row.bytes, row.files, row.directories = usage.bytes, usage.files, usage.directories
+        row.breakdown = dict(sorted(usage.breakdown.items(), key=lambda item: -item[1]))
+        row.scanned_at = now
+        row.save()
+    # workspaces that disappeared
+    DiskUsage.objects.exclude(user_id__in=list(usages)).update(bytes=0, files=0, directories=0, breakdown={}, scanned_at=now)
+    logger.info(f"[DiskUsage] {len(usages)} workspaces: listed {disk_usage.listed} directories, "
+                f"reused {disk_usage.reused} in {time.monotonic() - started:.2f}s")
+    return len(usages)
@@ -3,16 +3,36 @@ from docker.errors import DockerException
 import os
 import random
 import shutil
-import socket
 import string
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from django.conf import settings
+from .blobs import copy_writable
+from .cpus import cpu_pinner
+from .gpus import device_requests, gpu_allocator
+from .hosts import HostRegistry, is_remote
 from .models import DockerContainer, CustomUser
+from .ports import port_allocator
+from .readiness import readiness_prober
 import logging
 import subprocess
+from functools import cached_property
 
 logger = logging.getLogger(__name__)
 
+# Labels set on every container we create, so the daemon can be queried
+# for "our" containers without per-name lookups.
+LABEL_MANAGED = 'webui.managed'
+LABEL_USER = 'webui.user'
+LABEL_POOL = 'webui.pool'
+
+
+def container_labels(container) -> Dict:
+    """Labels of a full or a ``sparse=True`` listed container."""
+    attrs = container.attrs
+    return attrs.get('Labels') or (attrs.get('Config') or {}).get('Labels') or {}
+
+CPU_PERIOD = 100000
+
 
 class DockerManager:
     def __init__(self):
@@ -22,15 +42,140 @@ class DockerManager:
         except DockerException as e:
             logger.error(f"Docker connection failed: {e}")
             self.client = None
+        self.hosts = HostRegistry(self.client)
+
+    @cached_property
+    def warm_pool(self):
+        from .warm_pool import WarmPool
+        return WarmPool(self)
 
-    def _get_available_port(self) -> int:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind(('', 0))
-            return s.getsockname()[1]
+    def _get_available_port(self, holder: str = '') -> Optional[int]:
+        return port_allocator.allocate(holder)
 
     def _generate_jupyter_token(self) -> str:
         return ''.join(random.choices(string.ascii_letters + string.digits, k=32))
 
+    def _limits(self, mem_limit: int, memswap_limit: int, cpu_limit: float) -> Dict:
+        # CFS period/quota rather than nano_cpus so limits can later be
+        # changed with container.update() (the engine rejects mixing both).
+        return {
+            'mem_limit': f"{mem_limit}m",
+            'memswap_limit': f"{memswap_limit}m",
+            'cpu_period': CPU_PERIOD,
+            'cpu_quota': int(cpu_limit * CPU_PERIOD),
+        }
+
+    def _user_limits(self, user: CustomUser) -> Dict:
+        return self._limits(user.mem_limit, user.memswap_limit, user.cpu_limit)
+
+    def _gpu_options(self, user: CustomUser, host=None) -> Tuple[Dict, List[str]]:
+        """Run kwargs exposing the user's GPUs, and the device UUIDs picked.
+
+        Falls back to the nvidia runtime (every card) when allocation is off,
+        NVML sees no devices, or the container goes to a remote host.
+        """
+        if not user.gpu_access:
+            return {}, []
+        if gpu_allocator.enabled() and not is_remote(host):
+            uuids = gpu_allocator.pick()
+            if uuids:
+                return {'device_requests': device_requests(uuids)}, uuids
+        return {'runtime': 'nvidia'}, []
+
+    def _jupyter_run_kwargs(self, user: CustomUser, image: str, name: str, dirs: Dict[str, str],
+                            port: int, token: str, gpu_options: Dict) -> Dict:
+        return dict(
+            image=image,
+            name=name,
+            volumes=self._volume_binds(dirs),
+            ports={'8888/tcp': port},
+            environment={
+                'JUPYTER_TOKEN': token,
+                'GRANT_SUDO': 'yes'
+            },
+            labels={LABEL_MANAGED: '1', LABEL_USER: str(user.id)},
+            **gpu_options,
+            **self._user_limits(user)
+        )
+
+    def _rebalance_gpus(self, user: CustomUser, db_container: DockerContainer, container):
+        """Move a stopped container to other GPUs when its cards are gone or overloaded.
+
+        Device requests can't be changed in place, so the container is
+        recreated (not started) with the same name, port and token; the
+        workspace is bind-mounted and carries over.
+        """
+        if container.status == 'running' or not gpu_allocator.enabled() or is_remote(db_container.host):
+            return container
+        if not gpu_allocator.needs_rebalance(db_container):
+            return container
+        uuids = gpu_allocator.pick(exclude=db_container)
+        try:
+            if not uuids or set(uuids) == set(db_container.gpu_devices):
+                return container
+            client = self.hosts.client_for(db_container)
+            container.remove(force=True)
+            container = client.containers.create(**self._jupyter_run_kwargs(
+                user, db_container.image_name, container.name, self._prepare_user_directories(user),
+                db_container.jupyter_port, db_container.jupyter_token,
+                {'device_requests': device_requests(uuids)}
+            ))
+            logger.info(f"[GPU] Moved {user.username} from {db_container.gpu_devices} to {uuids}")
+            db_container.container_id = container.id
+            db_container.gpu_devices = uuids
+            db_container.save(update_fields=['container_id', 'gpu_devices'])
+            return container
+        finally:
+            gpu_allocator.settle(uuids)
+
+    def adopt_pool_container(self, db_container: DockerContainer, container):
+        """Give a stopped, claimed warm pool container the user's mounts and labels.
+
+        Claiming renamed the pool slot's directories into the workspace, so
+        the container's bind sources no longer exist and docker would create
+        them empty on the next start. Like ``_rebalance_gpus`` it is recreated
+        (not started) with the same name, port and token.
+        """
+        if container.status == 'running' or LABEL_POOL not in container_labels(container):
+            return container
+        user = db_container.user
+        client = self.hosts.client_for(db_container)
+        full = client.containers.get(container.id)
+        runtime = full.attrs['HostConfig'].get('Runtime')
+        full.remove(force=True)
+        container = client.containers.create(**self._jupyter_run_kwargs(
+            user, db_container.image_name, full.name, self._prepare_user_directories(user),
+            db_container.jupyter_port, db_container.jupyter_token,
+            {'runtime': runtime} if runtime == 'nvidia' else {}
+        ))
+        logger.info(f"[WarmPool] Recreated claimed container {full.name} with {user.username}'s mounts")
+        db_container.container_id = container.id
+        db_container.save(update_fields=['container_id'])
+        return container
+
+    def _pin_cpus(self, user: CustomUser, db_container: DockerContainer, container):
+        # Pinning is an optimisation; never fail a start over it
+        try:
+            cpu_pinner.pin(db_container, container, user)
+        except Exception as e:
+            logger.error(f"[CPU] Pinning failed for {user.username}: {e}")
+
+    def _volume_binds(self, dirs: Dict[str, str]) -> Dict:
+        return {
+            dirs['jupyter']: {'bind': '/home/user/work', 'mode': 'rw'},
+            dirs['models']: {'bind': '/home/user/models', 'mode': 'rw'},
+            dirs['data']: {'bind': '/home/user/data', 'mode': 'rw'}
+        }
+
+    def jupyter_url(self, db_container: DockerContainer) -> str:
+        address = self.hosts.public_address(db_container.host)
+        return f"http://{address}:{db_container.jupyter_port}/?token={db_container.jupyter_token}"
+
+    def _watch_readiness(self, db_container: DockerContainer, url: str):
+        # Remote engines are probed on their public address
+        host = db_container.host.public_address if is_remote(db_container.host) else None
+        readiness_prober.watch(db_container, url, host=host)
+
     def _get_user_workspace(self, user: CustomUser) -> str:
         path = os.path.join(settings.MEDIA_ROOT, f'user_{user.id}_{user.username}')
         os.makedirs(path, exist_ok=True)
@@ -60,7 +205,7 @@ class DockerManager:
                     rel_path = os.path.relpath(src_file, src_data_dir)
                     dst_file = os.path.join(dirs['data'], rel_path)
                     os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-                    shutil.copy2(src_file, dst_file)
+                    copy_writable(src_file, dst_file)
 
         # Copy user_model -> models/
         if os.path.exists(src_model_dir):
@@ -70,16 +215,19 @@ class DockerManager:
                     rel_path = os.path.relpath(src_file, src_model_dir)
                     dst_file = os.path.join(dirs['models'], rel_path)
                     os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-                    shutil.copy2(src_file, dst_file)
+                    copy_writable(src_file, dst_file)
 
     def build_from_dockerfile(self, user: CustomUser, dockerfile_path: str) -> Tuple[Optional[str], Optional[str]]:
-        if not self.client:
+        # The image has to exist on the engine the user's container runs on
+        row = DockerContainer.objects.select_related('host').filter(user=user).first()
+        client = self.hosts.client_for(row)
+        if not client:
             return None, "Docker not available"
         try:
             container_name = f"user_{user.id}_{user.username}"
             build_logs = []
             workspace_dir = self._get_user_workspace(user)
-            image, logs = self.client.images.build(
+            image, logs = client.images.build(
                 path=workspace_dir,
                 dockerfile=os.path.relpath(dockerfile_path, workspace_dir),
                 tag=f"{container_name}:latest",
@@ -110,8 +258,8 @@ class DockerManager:
             shutil.rmtree(user_dir, ignore_errors=True)
 
     def create_container(self, user: CustomUser, image_name: str, container_type: str = 'default') -> Tuple[Optional[str], Optional[str]]:
-        if not self.client:
-            return None, None
+        port = None
+        gpu_ids = []
         try:
             dirs = self._prepare_user_directories(user)
             self._copy_user_uploaded_files(user, dirs)
@@ -119,69 +267,86 @@ class DockerManager:
             container_name = f"{container_type}_{user.id}_{user.username}"
 
             if container_type == 'jupyter':
-                port = self._get_available_port()
-                token = self._generate_jupyter_token()
-
-                container = self.client.containers.run(
-                    image=f"{image_name}:latest",
-                    name=container_name,
-                    volumes={
-                        dirs['jupyter']: {'bind': '/home/user/work', 'mode': 'rw'},
-                        dirs['models']: {'bind': '/home/user/models', 'mode': 'rw'},
-                        dirs['data']: {'bind': '/home/user/data', 'mode': 'rw'}
-                    },
-                    ports={'8888/tcp': port},
-                    environment={
-                        'JUPYTER_TOKEN': token,
-                        'GRANT_SUDO': 'yes'
-                    },
-                    detach=True,
-                    mem_limit=f"{user.mem_limit}m",                  # e.g. 8192 MB
-                    memswap_limit=f"{user.memswap_limit}m",          # e.g. 12288 MB
-                    nano_cpus=int(user.cpu_limit * 1e9),             # e.g. 3.0 (strict)
-                    runtime='nvidia' if user.gpu_access else None
-                )
-
-
-                DockerContainer.objects.update_or_create(
+                host = self.hosts.place(user)
+                client = self.hosts.client(host)
+                if not client:
+                    logger.error("Container creation failed: Docker not available")
+                    return None, None
+                gpu_options, gpu_ids = self._gpu_options(user, host)
+                # The warm pool lives on the local engine and its GPU
+                # containers see every card, so assigned devices skip it.
+                claimed = not is_remote(host) and not gpu_ids and self.warm_pool.claim(user, image_name, dirs, container_name)
+                if claimed:
+                    container, port, token = claimed
+                else:
+                    port = self._get_available_port(container_name)
+                    if port is None:
+                        return None, None
+                    token = self._generate_jupyter_token()
+
+                    container = client.containers.run(
+                        detach=True,
+                        **self._jupyter_run_kwargs(
+                            user, f"{image_name}:latest", container_name, dirs, port, token, gpu_options
+                        )
+                    )
+
+                db_container, _ = DockerContainer.objects.update_or_create(
                     user=user,
                     defaults={
+                        'host': host,
                         'container_id': container.id,
                         'image_name': f"{image_name}:latest",
                         'status': 'running',
                         'jupyter_token': token,
                         'jupyter_port': port,
+                        'gpu_devices': gpu_ids,
                         'resource_limits': {
                             'cpu': user.cpu_limit,
                             'ram': user.mem_limit,
+                            'swap': user.memswap_limit,
                             'gpu': user.gpu_access
                         }
                     }
                 )
+                port_allocator.attach(port, db_container)
+                self._pin_cpus(user, db_container, container)
 
-                return f"http://{settings.SERVER_IP}:{port}/?token={token}", token
+                url = self.jupyter_url(db_container)
+                self._watch_readiness(db_container, url)
+                return url, token
 
             else:
                 pass  # สำหรับ container ประเภทอื่น
 
         except Exception as e:
             logger.error(f"Container creation failed: {e}")
+            port_allocator.release(port)
             return None, None
+        finally:
+            gpu_allocator.settle(gpu_ids)
 
     def manage_container(self, user: CustomUser, action: str, container_type: str = 'default', by_admin: bool = False) -> bool:
-        if not self.client:
+        row = DockerContainer.objects.select_related('host').filter(user=user).first()
+        client = self.hosts.client_for(row)
+        if not client:
             return False
         container_name = f"{container_type}_{user.id}_{user.username}"
         try:
-            container = self.client.containers.get(container_name)
-            db_container = DockerContainer.objects.filter(user=user, container_id=container.id).first()
+            container = client.containers.get(container_name)
+            db_container = row if row and row.container_id == container.id else None
 
             if action == 'start':
+                if db_container:
+                    container = self.adopt_pool_container(db_container, container)
+                    container = self._rebalance_gpus(user, db_container, container)
+                    self._pin_cpus(user, db_container, container)
                 container.start()
                 if db_container:
                     db_container.status = 'running'
                     db_container.can_user_start = True
                     db_container.save()
+                    self._watch_readiness(db_container, self.jupyter_url(db_container))
                 logger.info(f"Started container {container_name}")
 
             elif action == 'stop':
@@ -190,6 +355,7 @@ class DockerManager:
                     db_container.status = 'stopped'
                     db_container.can_user_start = not by_admin
                     db_container.save()
+                cpu_pinner.defragment_async()
                 logger.info(f"Stopped container {container_name}")
 
             elif action == 'delete':
@@ -199,6 +365,7 @@ class DockerManager:
                 
                 if db_container:
                     db_container.delete()
+                cpu_pinner.defragment_async()
                 logger.info(f"Deleted container {container_name}")
 
             else:
@@ -215,10 +382,12 @@ class DockerManager:
             return False
 
     def get_container_stats(self, container_id: str) -> Optional[Dict]:
-        if not self.client:
+        row = DockerContainer.objects.select_related('host').filter(container_id=container_id).first()
+        client = self.hosts.client_for(row)
+        if not client:
             return None
         try:
-            container = self.client.containers.get(container_id)
+            container = client.containers.get(container_id)
             stats = container.stats(stream=False)
 
             cpu_stats = stats['cpu_stats']
@@ -231,20 +400,22 @@ class DockerManager:
             mem_limit = memory.get('limit', 1)
 
             # === GPU Usage via nvidia-smi ===
-            container_pids = set()
-            top_result = container.top()
-            for proc in top_result.get('Processes', []):
-                container_pids.add(proc[1])  # PID column
-
-            result = subprocess.run(
-                ['nvidia-smi', '--query-compute-apps=pid,used_memory', '--format=csv,noheader,nounits'],
-                stdout=subprocess.PIPE, text=True
-            )
+            # nvidia-smi only sees this machine's cards and PIDs
             gpu_mem_mb = 0
-            for line in result.stdout.strip().split('\n'):
-                pid, mem = line.strip().split(',')
-                if pid.strip() in container_pids:
-                    gpu_mem_mb += int(mem.strip())
+            if not is_remote(row.host if row else None):
+                container_pids = set()
+                top_result = container.top()
+                for proc in top_result.get('Processes', []):
+                    container_pids.add(proc[1])  # PID column
+
+                result = subprocess.run(
+                    ['nvidia-smi', '--query-compute-apps=pid,used_memory', '--format=csv,noheader,nounits'],
+                    stdout=subprocess.PIPE, text=True
+                )
+                for line in result.stdout.strip().split('\n'):
+                    pid, mem = line.strip().split(',')
+                    if pid.strip() in container_pids:
+                        gpu_mem_mb += int(mem.strip())
 
             return {
                 'cpu': round(cpu_percent, 2),
@@ -261,29 +432,32 @@ class DockerManager:
             return None
 
     def start_or_resume_container(self, user: CustomUser, image_name: str, container_type: str = 'jupyter') -> Tuple[Optional[str], Optional[str]]:
-        if not self.client:
-            return None, None
-
         container_name = f"{container_type}_{user.id}_{user.username}"
 
         try:
-            db_container = DockerContainer.objects.filter(user=user).first()
+            db_container = DockerContainer.objects.select_related('host').filter(user=user).first()
 
             if db_container:
+                client = self.hosts.client_for(db_container)
+                if not client:
+                    return None, None
                 try:
-                    container = self.client.containers.get(container_name)
+                    container = client.containers.get(container_name)
 
+                    url = self.jupyter_url(db_container)
                     if container.status != 'running':
+                        container = self.adopt_pool_container(db_container, container)
+                        container = self._rebalance_gpus(user, db_container, container)
+                        self._pin_cpus(user, db_container, container)
                         container.start()
                         db_container.status = 'running'
                         db_container.save()
+                        self._watch_readiness(db_container, url)
                         logger.info(f"Resumed container {container_name}")
                     else:
                         logger.info(f"Container {container_name} is already running")
 
-                    port = db_container.jupyter_port
-                    token = db_container.jupyter_token
-                    return f"http://{settings.SERVER_IP}:{port}/?token={token}", token
+                    return url, db_container.jupyter_token
 
                 except docker.errors.NotFound:
                     logger.warning(f"Stale DB container {container_name} deleted; recreating.")
@@ -0,0 +1,218 @@
+import logging
+import mimetypes
+import os
+import uuid
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+Range = Tuple[int, int]  # inclusive, as in Content-Range
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong validator from size and mtime, so ``If-Range`` can use it."""
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def parse_ranges(header: str, size: int, max_ranges: Optional[int] = None) -> Optional[List[Range]]:
+    """``bytes=0-99,-500`` -> merged, sorted inclusive ranges within ``size``.
+
+    Returns None when the header should be ignored (not bytes, malformed,
+    or too many pieces) and an empty list when nothing is satisfiable.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs.strip():
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        first, dash, last = spec.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix:
+                    ranges.append((max(0, size - suffix), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        end = size - 1 if end is None else end
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    max_ranges = max_ranges or settings.DOWNLOADS['MAX_RANGES']
+    if len(merged) > max_ranges:
+        return None
+    return merged
+
+
+def _if_range_matches(request, etag: str, mtime: int) -> bool:
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag  # weak tags never match
+    since = parse_http_date_safe(value)
+    return since is not None and since == mtime
+
+
+def _byterange_parts(ranges: Sequence[Range], size: int, content_type: str, boundary: str):
+    """(header bytes, range) per part and the closing delimiter of a multipart/byteranges body."""
+    parts = [
+        (f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n"
+         f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n".encode(), (start, end))
+        for start, end in ranges
+    ]
+    return parts, f"\r\n--{boundary}--\r\n".encode()
+
+
+def _read_blocks(handle, start: int, end: int, block: int) -> Iterator[bytes]:
+    handle.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = handle.read(min(block, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def _stream(path: str, pieces, block: int) -> Iterator[bytes]:
+    """``pieces`` is a list of bytes literals and inclusive byte ranges of ``path``."""
+    with open(path, 'rb') as handle:
+        for piece in pieces:
+            if isinstance(piece, bytes):
+                yield piece
+            else:
+                yield from _read_blocks(handle, *piece, block)
+
+
+async def _astream(path: str, pieces, block: int) -> AsyncIterator[bytes]:
+    """Async twin of :func:`_stream`: Django would otherwise read a sync
+    iterator completely into memory before sending it over ASGI."""
+    handle = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    read = sync_to_async(handle.read, thread_sensitive=False)
+    try:
+        for piece in pieces:
+            if isinstance(piece, bytes):
+                yield piece
+                continue
+            start, end = piece
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = await read(min(block, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+    finally:
+        handle.close()
+
+
+def _offload(path: str, mode: str) -> Optional[HttpResponse]:
+    response = HttpResponse()
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+        return response
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root:
+        return None
+    response['X-Accel-Redirect'] = settings.DOWNLOADS['ACCEL_PREFIX'] + quote(os.path.relpath(real, root))
+    return response
+
+
+def serve_file(request, path: str, filename: Optional[str] = None, as_attachment: bool = True,
+               mode: Optional[str] = None):
+    """Download response for ``path`` with conditional GET and byte ranges.
+
+    ``mode`` (default ``DOWNLOADS['MODE']``) is ``stream`` to send the bytes
+    from Python, or ``x-accel`` / ``x-sendfile`` to hand the file to the
+    front-end server, which then does ranges and conditionals itself.
+    """
+    cfg = settings.DOWNLOADS
+    mode = mode or cfg['MODE']
+    filename = filename or os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    stat = os.stat(path)
+
+    if mode in ('x-accel', 'x-sendfile'):
+        response = _offload(path, mode)
+        if response is not None:
+            response['Content-Type'] = content_type
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+            return response
+        logger.warning(f"[Downloads] {path} is outside MEDIA_ROOT; streaming it instead")
+
+    size = stat.st_size
+    etag = file_etag(stat)
+    mtime = int(stat.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if conditional is not None:
+        for key, value in headers.items():
+            conditional[key] = value
+        return conditional
+
+    ranges = None
+    if request.method == 'GET' and 'Range' in request.headers and _if_range_matches(request, etag, mtime):
+        ranges = parse_ranges(request.headers['Range'], size)
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    status = 200
+    if not ranges:
+        pieces, length = [(0, size - 1)] if size else [], size
+    elif len(ranges) == 1:
+        (start, end), = ranges
+        pieces, length, status = ranges, end - start + 1, 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        boundary = uuid.uuid4().hex
+        parts, closing = _byterange_parts(ranges, size, content_type, boundary)
+        pieces = [piece for part in parts for piece in part] + [closing]
+        length = sum(len(head) + end - start + 1 for head, (start, end) in parts) + len(closing)
+        status = 206
+        content_type = f'multipart/byteranges; boundary={boundary}'
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status)
+    elif isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_astream(path, pieces, cfg['BLOCK_BYTES']), status=status)
+    else:
+        response = StreamingHttpResponse(_stream(path, pieces, cfg['BLOCK_BYTES']), status=status)
+    for key, value in headers.items():
+        response[key] = value
+    response['Content-Type'] = content_type
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
@@ -0,0 +1,391 @@
+import logging
+import os
+import shutil
+import stat
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .file_index import file_index
+from .file_utils import ensure_workspace_exists, get_user_workspace
+from .models import ExtractionJob, UserFile
+from .readiness import notify_user
+from .uploads import bytes_available
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.tar', '.zip')
+# The destination is inside a folder mounted into the user's container, which
+# can swap in links while a job runs: never follow one, never reuse a file
+DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionCancelled(ExtractionError):
+    pass
+
+
+def archive_suffix(name: str) -> Optional[str]:
+    lower = name.lower()
+    return next((suffix for suffix in SUFFIXES if lower.endswith(suffix)), None)
+
+
+def is_archive(name: str) -> bool:
+    return archive_suffix(name) is not None
+
+
+def member_parts(name: str) -> Optional[List[str]]:
+    """Path components of member ``name``; None for names that would land
+    outside the destination (absolute paths, drive letters, ``..``)."""
+    name = name.replace('\\', '/')
+    if name.startswith('/') or name[1:2] == ':':
+        return None
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return parts
+
+
+def member_target(root: str, name: str) -> Optional[str]:
+    """Where member ``name`` is written under ``root``; None when it is refused."""
+    parts = member_parts(name)
+    return os.path.join(root, *parts) if parts else None
+
+
+class Member(NamedTuple):
+    name: str
+    kind: str  # 'file', 'dir', or 'other' (links, devices: never extracted)
+    size: int  # as declared by the archive
+    mtime: float
+    open: Optional[Callable[[], BinaryIO]]
+
+
+def _zip_members(archive: zipfile.ZipFile) -> Iterator[Member]:
+    for info in archive.infolist():
+        if info.flag_bits & 0x1:
+            raise ExtractionError("Encrypted zip archives are not supported")
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        if stat.S_ISLNK(info.external_attr >> 16):
+            yield Member(info.filename, 'other', 0, mtime, None)
+        elif info.is_dir():
+            yield Member(info.filename, 'dir', 0, mtime, None)
+        else:
+            yield Member(info.filename, 'file', info.file_size, mtime, lambda info=info: archive.open(info))
+
+
+def _tar_members(archive: tarfile.TarFile) -> Iterator[Member]:
+    for info in archive:
+        if info.isdir():
+            yield Member(info.name, 'dir', 0, info.mtime, None)
+        elif info.isreg():
+            yield Member(info.name, 'file', info.size, info.mtime, lambda info=info: archive.extractfile(info))
+        else:
+            yield Member(info.name, 'other', 0, info.mtime, None)
+
+
+class _Extractor:
+    """Writes the members of one archive under ``root``.
+
+    Every byte is counted as it is written, against the user's quota, the
+    archive's expansion ratio and ``MAX_BYTES``, so a zip bomb is stopped
+    at the limit whatever sizes its headers declare.
+    """
+
+    def __init__(self, job: ExtractionJob, source: str, root: str):
+        cfg = settings.EXTRACTION
+        self.job = job
+        self.source = source
+        self.root = os.path.abspath(root)  # not resolved: a link here is refused when opened
+        self.block = cfg['BLOCK_BYTES']
+        self.size = os.path.getsize(source)
+        self.ratio_limit = max(self.size, 1) * cfg['MAX_RATIO']
+        self.root_fd = -1
+        self.entries = 0
+        self.percent = 0
+        self._budget = 0
+        self._next_tick = 0.0
+
+    def _refresh(self):
+        """Save progress, pick up a cancel and re-read the quota."""
+        job = self.job
+        ExtractionJob.objects.filter(pk=job.pk).update(
+            files=job.files, bytes_written=job.bytes_written, skipped=job.skipped, updated_at=timezone.now(),
+        )
+        if ExtractionJob.objects.filter(pk=job.pk, status='cancelled').exists():
+            raise ExtractionCancelled("Cancelled")
+        # our own saved bytes are part of what the quota holds back as reserved
+        self._budget = bytes_available(job.user) + job.bytes_written
+        _notify(job, self.percent)
+        self._next_tick = time.monotonic() + settings.EXTRACTION['PROGRESS_SECONDS']
+
+    def _tick(self, position: int):
+        self.percent = min(int(position * 100 / self.size), 99) if self.size else 0
+        if time.monotonic() >= self._next_tick:
+            self._refresh()
+
+    def _check(self, more: int):
+        cfg = settings.EXTRACTION
+        total = self.job.bytes_written + more
+        if total > self.ratio_limit:
+            raise ExtractionError(f"Archive expands more than {cfg['MAX_RATIO']}x its size; refused as a possible zip bomb")
+        if total > cfg['MAX_BYTES']:
+            raise ExtractionError(f"Archive expands past the {cfg['MAX_BYTES']} byte limit")
+        if total > self._budget:
+            raise ExtractionError(f"Not enough storage: {max(self._budget, 0)} bytes available")
+
+    def _count_entries(self, count: int):
+        self.entries += count
+        if self.entries > settings.EXTRACTION['MAX_FILES']:
+            raise ExtractionError(f"Archive has more than {settings.EXTRACTION['MAX_FILES']} entries")
+
+    def _open_dir(self, parts: List[str]) -> int:
+        """A descriptor for ``root/<parts>``, creating directories on the way.
+        Each component is opened relative to the previous one without
+        following links, so nothing swapped in meanwhile is written through."""
+        fd = os.dup(self.root_fd)
+        try:
+            for part in parts:
+                try:
+                    os.mkdir(part, 0o755, dir_fd=fd)
+                except FileExistsError:
+                    pass
+                try:
+                    child = os.open(part, DIR_FLAGS, dir_fd=fd)
+                except OSError as e:
+                    raise ExtractionError(f"{'/'.join(parts)} is not a folder inside the destination ({e.strerror})")
+                os.close(fd)
+                fd = child
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _skip(self, member: Member, why: str):
+        self.job.skipped += 1
+        logger.warning(f"[Extraction] {self.job.pk}: skipped {why} {member.name!r}")
+
+    def _write(self, member: Member, parts: List[str], raw: BinaryIO):
+        self._check(member.size)  # declared size: fail before writing when it cannot fit
+        dir_fd = self._open_dir(parts[:-1])
+        try:
+            out_fd = os.open(parts[-1], FILE_FLAGS, 0o644, dir_fd=dir_fd)
+        except FileExistsError:
+            self._skip(member, 'duplicate member')
+            return
+        finally:
+            os.close(dir_fd)
+        with member.open() as data, os.fdopen(out_fd, 'wb') as out:
+            while True:
+                chunk = data.read(self.block)
+                if not chunk:
+                    break
+                self._check(len(chunk))  # actual size: headers may lie
+                out.write(chunk)
+                self.job.bytes_written += len(chunk)
+                self._tick(raw.tell())
+            out.flush()
+            if member.mtime:
+                os.utime(out.fileno(), (member.mtime, member.mtime))
+        self.job.files += 1
+
+    def _extract(self, members: Iterator[Member], raw: BinaryIO):
+        for member in members:
+            self._count_entries(1)
+            parts = member_parts(member.name)
+            if parts is None or member.kind == 'other':
+                self._skip(member, f'{member.kind} member')
+            elif member.kind == 'dir':
+                os.close(self._open_dir(parts))
+            else:
+                self._write(member, parts, raw)
+            self._tick(raw.tell())
+
+    def run(self):
+        self._refresh()
+        try:
+            self.root_fd = os.open(self.root, DIR_FLAGS)
+        except OSError as e:
+            raise ExtractionError(f"Destination is not a folder ({e.strerror})")
+        try:
+            self._unpack()
+        finally:
+            os.close(self.root_fd)
+
+    def _unpack(self):
+        with open(self.source, 'rb') as raw:
+            if archive_suffix(self.source) == '.zip':
+                with zipfile.ZipFile(raw) as archive:
+                    # the central directory gives the totals before anything is written
+                    infos = archive.infolist()
+                    if len(infos) > settings.EXTRACTION['MAX_FILES']:
+                        raise ExtractionError(f"Archive has more than {settings.EXTRACTION['MAX_FILES']} entries")
+                    self._check(sum(info.file_size for info in infos))
+                    self._extract(_zip_members(archive), raw)
+            else:
+                # stream mode: one forward pass over the compressed data
+                with tarfile.open(fileobj=raw, mode='r|*') as archive:
+                    self._extract(_tar_members(archive), raw)
+        self.percent = 100
+
+
+def describe(job: ExtractionJob, percent: Optional[int] = None) -> Dict:
+    return {
+        'id': str(job.id),
+        'archive': os.path.basename(job.archive),
+        'status': job.status,
+        'destination': job.destination,
+        'files': job.files,
+        'bytes': job.bytes_written,
+        'skipped': job.skipped,
+        'percent': 100 if job.status == 'complete' else percent,
+        'error': job.error,
+    }
+
+
+def _notify(job: ExtractionJob, percent: Optional[int] = None):
+    async_to_sync(notify_user)(job.user_id, {'type': f'extraction.{job.status}', **describe(job, percent)})
+
+
+def _destination(parent: str, name: str) -> str:
+    """A new directory under ``parent`` named after the archive."""
+    stem = os.path.basename(name)[:-len(archive_suffix(name))] or 'archive'
+    candidate, n = stem, 1
+    while True:
+        path = os.path.join(parent, candidate)
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            n += 1
+            candidate = f"{stem}_{n}"
+
+
+def _remove_output(job: ExtractionJob):
+    if job.destination:
+        shutil.rmtree(os.path.join(get_user_workspace(job.user), job.destination), ignore_errors=True)
+
+
+def _delete_archive(job: ExtractionJob):
+    user_file = job.user_file
+    if user_file is None:
+        return
+    try:
+        os.remove(user_file.file.path)
+    except FileNotFoundError:
+        pass
+    user_file.delete()
+    job.user_file = None
+
+
+def run_extraction(job_id) -> Optional[ExtractionJob]:
+    """Extract a queued job; returns None when another worker claimed it."""
+    if not ExtractionJob.objects.filter(pk=job_id, status='queued').update(status='running', updated_at=timezone.now()):
+        return None
+    job = ExtractionJob.objects.select_related('user', 'user_file').get(pk=job_id)
+    started = time.monotonic()
+    try:
+        workspace = ensure_workspace_exists(job.user)
+        parent = os.path.join(workspace, settings.EXTRACTION['DEST_DIR'])
+        os.makedirs(parent, exist_ok=True)
+        root = _destination(parent, job.archive)
+        job.destination = os.path.relpath(root, workspace)
+        job.save(update_fields=['destination', 'updated_at'])
+        _Extractor(job, default_storage.path(job.archive), root).run()
+    except ExtractionCancelled:
+        _remove_output(job)
+        job.status = 'cancelled'
+    except Exception as e:
+        # corrupt data surfaces as zipfile/tarfile/zlib/lzma errors or EOFError
+        _remove_output(job)
+        job.status = 'failed'
+        job.error = str(e) if isinstance(e, (ExtractionError, OSError)) else f"Unreadable archive: {e}"
+        logger.error(f"[Extraction] {job.pk} ({job.archive}) failed: {job.error}")
+    else:
+        job.status = 'complete'
+        # warm the browser's listings of the new folder and its parent
+        file_index.directory(parent)
+        file_index.directory(root)
+        if job.delete_archive:
+            _delete_archive(job)
+        logger.info(f"[Extraction] {job.archive} -> {job.destination}: {job.files} files, "
+                    f"{job.bytes_written} bytes, {job.skipped} skipped in {time.monotonic() - started:.1f}s")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'files', 'bytes_written', 'skipped', 'finished_at', 'updated_at'])
+    _notify(job)
+    return job
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.EXTRACTION['WORKERS'], thread_name_prefix='extraction')
+        return _pool
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_extraction(job_id)
+    except Exception as e:
+        logger.error(f"[Extraction] Worker failed on {job_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def queue_extraction(user_file: UserFile, delete_archive: bool = False) -> ExtractionJob:
+    """Queue ``user_file`` for extraction into the owner's workspace."""
+    if not is_archive(user_file.file.name):
+        raise ExtractionError(f"{user_file.filename()} is not a .zip or .tar archive")
+    job = ExtractionJob.objects.create(
+        user=user_file.user, user_file=user_file, archive=user_file.file.name, delete_archive=delete_archive,
+    )
+    transaction.on_commit(lambda: _executor().submit(_run_in_worker, job.pk))
+    logger.info(f"[Extraction] Queued {job.archive} as {job.pk}")
+    return job
+
+
+def cancel_extraction(job: ExtractionJob) -> bool:
+    """Stop a queued or running job; a running one removes its output at its next progress check."""
+    cancelled = ExtractionJob.objects.filter(pk=job.pk, status__in=['queued', 'running']).update(
+        status='cancelled', finished_at=timezone.now(), updated_at=timezone.now(),
+    )
+    return bool(cancelled)
+
+
+def recover_extractions() -> int:
+    """Fail jobs whose worker went away and run queued ones no worker picked up."""
+    cutoff = timezone.now() - timedelta(minutes=settings.EXTRACTION['STALE_MINUTES'])
+    stale = list(ExtractionJob.objects.filter(status='running', updated_at__lt=cutoff).select_related('user'))
+    for job in stale:
+        _remove_output(job)
+        job.status = 'failed'
+        job.error = "Interrupted"
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        _notify(job)
+    waiting = ExtractionJob.objects.filter(status='queued', created_at__lt=cutoff).values_list('pk', flat=True)
+    for job_id in list(waiting):
+        run_extraction(job_id)
+    if stale:
+        logger.warning(f"[Extraction] Failed {len(stale)} interrupted extractions")
+    return len(stale)
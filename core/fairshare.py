@@ -0,0 +1,289 @@
+import logging
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bookings import BookingConflict, book, free_slots
+from .models import ContainerSchedule, GpuTimeRequest
+from .readiness import notify_user
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('fifo', 'fair_share', 'fair_share_preempt')
+
+
+@dataclass
+class Ticket:
+    """One GPU-time request as the queue sees it (live or simulated)."""
+    user: Any
+    role: str
+    requested_at: datetime
+    duration: timedelta
+    earliest_start: datetime
+    ref: Any = field(default=None, compare=False)
+
+
+def decayed_hours(intervals: Iterable[Tuple[datetime, datetime]], now: datetime, half_life_days: float) -> float:
+    """Hours used, each hour counting half as much every ``half_life_days``."""
+    total = 0.0
+    for start, end in intervals:
+        end = min(end, now)
+        if end <= start:
+            continue
+        age_days = (now - end).total_seconds() / 86400
+        total += (end - start).total_seconds() / 3600 * 0.5 ** (age_days / half_life_days)
+    return total
+
+
+def priority(role: str, usage_hours: float) -> float:
+    """Role weight shared out by recent usage: higher goes first."""
+    weight = settings.FAIR_SHARE['ROLE_WEIGHTS'].get(role, 1.0)
+    return weight / (1.0 + usage_hours)
+
+
+def next_in_line(tickets: List[Ticket], usage: Dict, policy: str) -> Ticket:
+    if policy == 'fifo':
+        return min(tickets, key=lambda t: t.requested_at)
+    return min(tickets, key=lambda t: (-priority(t.role, usage.get(t.user, 0.0)), t.requested_at))
+
+
+def should_preempt(waiter: Ticket, holder: Ticket, usage: Dict, now: datetime) -> bool:
+    cfg = settings.FAIR_SHARE
+    if waiter.user == holder.user:
+        return False
+    if now - waiter.requested_at < timedelta(minutes=cfg['PREEMPT_AFTER_MINUTES']):
+        return False
+    return (priority(waiter.role, usage.get(waiter.user, 0.0))
+            >= cfg['PREEMPT_RATIO'] * priority(holder.role, usage.get(holder.user, 0.0)))
+
+
+def _notify(user_id: int, payload: Dict):
+    async_to_sync(notify_user)(user_id, payload)
+
+
+# --- live queue ------------------------------------------------------------
+
+def usage_by_user(now: datetime) -> Dict[int, float]:
+    """Decayed booked hours per user id over ``USAGE_WINDOW_DAYS``."""
+    cfg = settings.FAIR_SHARE
+    intervals = defaultdict(list)
+    rows = ContainerSchedule.objects.filter(
+        active=True, start_datetime__lt=now, end_datetime__gt=now - timedelta(days=cfg['USAGE_WINDOW_DAYS'])
+    ).values_list('container__user_id', 'start_datetime', 'end_datetime')
+    for user_id, start, end in rows:
+        intervals[user_id].append((start, end))
+    return {user_id: decayed_hours(spans, now, cfg['USAGE_HALF_LIFE_DAYS']) for user_id, spans in intervals.items()}
+
+
+def _ticket(req: GpuTimeRequest) -> Ticket:
+    return Ticket(req.user_id, req.user.role, req.requested_at, req.duration, req.earliest_start, ref=req)
+
+
+def _grant(waiting: List[Ticket], usage: Dict, policy: str, now: datetime) -> int:
+    """Book slots starting within the lookahead, best-placed ticket first.
+
+    Granted tickets are removed from ``waiting``; their hours count as
+    usage for the rest of the pass so one user can't take every slot.
+    """
+    lookahead = now + timedelta(hours=settings.FAIR_SHARE['LOOKAHEAD_HOURS'])
+    granted = 0
+    pending = [t for t in waiting if t.earliest_start <= lookahead]
+    while pending:
+        ticket = next_in_line(pending, usage, policy)
+        pending.remove(ticket)
+        after = max(now, ticket.earliest_start)
+        slots = free_slots(ticket.duration, 1, after, horizon=lookahead - after + ticket.duration)
+        if not slots:
+            continue
+        start, end = slots[0]
+        req = ticket.ref
+        try:
+            req.schedule = book(req.container, start, end)
+        except BookingConflict:
+            continue
+        req.status, req.granted_at = 'granted', now
+        req.save(update_fields=['schedule', 'status', 'granted_at'])
+        usage[ticket.user] = usage.get(ticket.user, 0.0) + ticket.duration.total_seconds() / 3600
+        waiting.remove(ticket)
+        granted += 1
+        logger.info(f"[FairShare] Granted {req.user.username} {start} - {end}")
+        _notify(req.user_id, {'type': 'gpu.granted', 'start': start.isoformat(), 'end': end.isoformat()})
+    return granted
+
+
+def _preempt(waiting: List[Ticket], usage: Dict, now: datetime) -> int:
+    """Cut short running queue-granted windows of users far above their share.
+
+    The holder keeps ``NOTICE_MINUTES`` and the rest of their window is
+    queued again with its original request time. Admin bookings are never
+    touched.
+    """
+    notice = timedelta(minutes=settings.FAIR_SHARE['NOTICE_MINUTES'])
+    holders = [_ticket(req) for req in GpuTimeRequest.objects.filter(
+        status='granted', schedule__start_datetime__lte=now, schedule__end_datetime__gt=now + notice
+    ).select_related('user', 'container', 'schedule')]
+
+    preempted = 0
+    for waiter in sorted(waiting, key=lambda t: -priority(t.role, usage.get(t.user, 0.0))):
+        if not holders:
+            break
+        holder = min(holders, key=lambda t: priority(t.role, usage.get(t.user, 0.0)))
+        if not should_preempt(waiter, holder, usage, now):
+            continue
+        holders.remove(holder)
+        req, schedule = holder.ref, holder.ref.schedule
+        new_end = now + notice
+        with transaction.atomic():
+            remaining = schedule.end_datetime - new_end
+            schedule.end_datetime = new_end
+            schedule.save(update_fields=['end_datetime'])
+            req.status = 'preempted'
+            req.save(update_fields=['status'])
+            GpuTimeRequest.objects.create(
+                user=req.user, container=req.container, duration=remaining,
+                earliest_start=new_end, requested_at=req.requested_at
+            )
+        preempted += 1
+        logger.warning(f"[FairShare] Preempted {req.user.username}; window now ends {new_end}")
+        _notify(req.user_id, {
+            'type': 'gpu.preempted', 'end': new_end.isoformat(), 'notice_minutes': notice.total_seconds() // 60
+        })
+    return preempted
+
+
+def run_fair_share(now: Optional[datetime] = None) -> Optional[Dict[str, int]]:
+    """One pass of the queue: grant what fits, then preempt if the policy allows."""
+    cfg = settings.FAIR_SHARE
+    if not cfg.get('ENABLED'):
+        return None
+    now = now or timezone.now()
+    policy = cfg['POLICY']
+
+    usage = usage_by_user(now)
+    waiting = [_ticket(req) for req in GpuTimeRequest.objects.filter(status='queued').select_related('user', 'container')]
+    summary = {'granted': _grant(waiting, usage, policy, now), 'preempted': 0}
+    if policy == 'fair_share_preempt' and waiting:
+        summary['preempted'] = _preempt(waiting, usage, now)
+        if summary['preempted']:
+            waiting = [_ticket(req) for req in GpuTimeRequest.objects.filter(status='queued').select_related('user', 'container')]
+            summary['granted'] += _grant(waiting, usage, policy, now)
+    return summary
+
+
+# --- simulation ------------------------------------------------------------
+
+def _first_gap(busy: List[List], after: datetime, length: timedelta, latest_start: datetime) -> Optional[datetime]:
+    cursor = after
+    for start, end, _ in sorted(busy, key=lambda b: b[0]):
+        if end <= cursor:
+            continue
+        if cursor + length <= start:
+            break
+        cursor = max(cursor, end)
+    return cursor if cursor <= latest_start else None
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def simulate(tickets: List[Ticket], policy: str, initial_usage: Optional[Dict] = None,
+             step: Optional[timedelta] = None) -> Dict:
+    """Replay ``tickets`` on an empty calendar under ``policy``.
+
+    Uses the same ordering and preemption rules as :func:`run_fair_share`,
+    stepping the clock every ``step`` (the slot alignment by default).
+    Returns overall and per-user wait times, Jain's fairness index over
+    weighted served hours, preemptions and unserved requests.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy: {policy}")
+    cfg = settings.FAIR_SHARE
+    step = step or timedelta(minutes=settings.BOOKINGS['SLOT_ALIGN_MINUTES'])
+    lookahead = timedelta(hours=cfg['LOOKAHEAD_HOURS'])
+    notice = timedelta(minutes=cfg['NOTICE_MINUTES'])
+    initial_usage = initial_usage or {}
+    if not tickets:
+        return {'policy': policy, 'requests': 0, 'mean_wait_hours': 0.0, 'p95_wait_hours': 0.0,
+                'fairness': 1.0, 'preemptions': 0, 'unserved': 0, 'users': {}}
+
+    pending = sorted(tickets, key=lambda t: t.requested_at)
+    busy: List[List] = []  # [start, end, ticket]
+    waits: Dict[Any, List[float]] = defaultdict(list)
+    served: Dict[Any, float] = defaultdict(float)
+    roles = {t.user: t.role for t in tickets}
+    preemptions = 0
+    clock = pending[0].requested_at
+    stop_at = pending[-1].requested_at + timedelta(days=settings.BOOKINGS['SEARCH_DAYS'])
+
+    def usage_at(now):
+        usage = {}
+        for user in roles:
+            spans = [(s, e) for s, e, t in busy if t.user == user]
+            usage[user] = initial_usage.get(user, 0.0) + decayed_hours(spans, now, cfg['USAGE_HALF_LIFE_DAYS'])
+        return usage
+
+    while pending and clock <= stop_at:
+        usage = usage_at(clock)
+        waiting = [t for t in pending if t.requested_at <= clock]
+        eligible = [t for t in waiting if t.earliest_start <= clock + lookahead]
+        while eligible:
+            ticket = next_in_line(eligible, usage, policy)
+            eligible.remove(ticket)
+            start = _first_gap(busy, max(clock, ticket.earliest_start), ticket.duration, clock + lookahead)
+            if start is None:
+                continue
+            busy.append([start, start + ticket.duration, ticket])
+            pending.remove(ticket)
+            waiting.remove(ticket)
+            waits[ticket.user].append((start - ticket.requested_at).total_seconds() / 3600)
+            usage[ticket.user] += ticket.duration.total_seconds() / 3600
+
+        if policy == 'fair_share_preempt' and waiting:
+            running = [b for b in busy if b[0] <= clock < b[1] - notice]
+            for waiter in sorted(waiting, key=lambda t: -priority(t.role, usage.get(t.user, 0.0))):
+                if not running:
+                    break
+                slot = min(running, key=lambda b: priority(b[2].role, usage.get(b[2].user, 0.0)))
+                if not should_preempt(waiter, slot[2], usage, clock):
+                    continue
+                running.remove(slot)
+                new_end = clock + notice
+                holder = slot[2]
+                remainder = Ticket(holder.user, holder.role, holder.requested_at, slot[1] - new_end, new_end)
+                slot[1] = new_end
+                pending.append(remainder)
+                preemptions += 1
+        clock += step
+
+    for start, end, ticket in busy:
+        served[ticket.user] += (end - start).total_seconds() / 3600
+
+    all_waits = [w for user_waits in waits.values() for w in user_waits]
+    shares = [served[u] / cfg['ROLE_WEIGHTS'].get(roles[u], 1.0) for u in roles]
+    fairness = (sum(shares) ** 2 / (len(shares) * sum(s * s for s in shares))) if any(shares) else 1.0
+    return {
+        'policy': policy,
+        'requests': len(tickets),
+        'mean_wait_hours': round(sum(all_waits) / len(all_waits), 2) if all_waits else 0.0,
+        'p95_wait_hours': round(_percentile(all_waits, 95), 2),
+        'fairness': round(fairness, 3),
+        'preemptions': preemptions,
+        'unserved': len(pending),
+        'users': {
+            user: {
+                'served_hours': round(served[user], 2),
+                'mean_wait_hours': round(sum(waits[user]) / len(waits[user]), 2) if waits[user] else None,
+            } for user in roles
+        },
+    }
@@ -0,0 +1,236 @@
+import base64
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .file_utils import ensure_workspace_exists, get_user_workspace
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ('name', 'size', 'modified', 'type')
+
+
+class BrowseError(ValueError):
+    pass
+
+
+@dataclass
+class Entry:
+    name: str
+    is_dir: bool
+    size: int
+    modified: float
+
+    @property
+    def ext(self) -> str:
+        return '' if self.is_dir else os.path.splitext(self.name)[1].lower()
+
+    def sort_value(self, sort: str):
+        if sort == 'size':
+            return self.size
+        if sort == 'modified':
+            return self.modified
+        if sort == 'type':
+            return self.ext
+        return self.name.casefold()
+
+
+class _Directory:
+    """Cached listing of one directory, valid while its mtime is unchanged."""
+
+    def __init__(self, mtime_ns: int, entries: Dict[str, Entry]):
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self._orders: Dict[Tuple[str, bool], Tuple[List[tuple], List[Entry]]] = {}
+
+    def ordered(self, sort: str, descending: bool) -> Tuple[List[tuple], List[Entry]]:
+        """Entries in ascending key order, plus their keys for bisecting.
+
+        Directories come first either way; a descending page walks the
+        list backwards, so they are ranked last here.
+        """
+        cached = self._orders.get((sort, descending))
+        if cached is None:
+            def key(entry: Entry):
+                return (entry.is_dir if descending else not entry.is_dir, entry.sort_value(sort), entry.name)
+            ordered = sorted(self.entries.values(), key=key)
+            cached = self._orders[(sort, descending)] = ([key(e) for e in ordered], ordered)
+        return cached
+
+
+def _stat_entry(dir_entry: os.DirEntry) -> Optional[Entry]:
+    try:
+        is_dir = dir_entry.is_dir(follow_symlinks=False)
+        stat = dir_entry.stat(follow_symlinks=False)
+    except OSError:
+        return None  # removed while scanning
+    return Entry(dir_entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime)
+
+
+class FileIndex:
+    """Per-process cache of workspace directory listings.
+
+    A directory is rescanned with ``os.scandir`` only when its mtime moves
+    (an entry was added, removed or renamed); the rescan stats just the new
+    names. Sizes of files rewritten in place are refreshed for the entries
+    a page returns.
+    """
+
+    def __init__(self, max_dirs: Optional[int] = None):
+        self._max_dirs = max_dirs
+        self._lock = threading.Lock()
+        self._dirs: 'OrderedDict[str, _Directory]' = OrderedDict()
+
+    @property
+    def max_dirs(self) -> int:
+        return self._max_dirs or settings.FILE_BROWSER['CACHED_DIRS']
+
+    def directory(self, path: str) -> _Directory:
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None:
+                self._dirs.move_to_end(path)
+                if cached.mtime_ns == mtime_ns:
+                    return cached
+
+        previous = cached.entries if cached is not None else {}
+        entries = {}
+        with os.scandir(path) as scan:
+            for dir_entry in scan:
+                entry = previous.get(dir_entry.name)
+                if entry is None or entry.is_dir != dir_entry.is_dir(follow_symlinks=False):
+                    entry = _stat_entry(dir_entry)
+                if entry is not None:
+                    entries[dir_entry.name] = entry
+        if cached is not None:
+            added = len(entries.keys() - previous.keys())
+            removed = len(previous.keys() - entries.keys())
+            logger.debug(f"[FileIndex] {path}: +{added} -{removed} entries")
+
+        directory = _Directory(mtime_ns, entries)
+        with self._lock:
+            self._dirs[path] = directory
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return directory
+
+    def invalidate(self, path: Optional[str] = None):
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(path, None)
+
+
+file_index = FileIndex()
+
+
+def resolve(user, relative: str = '') -> str:
+    """Absolute path of ``relative`` inside the user's workspace."""
+    root = os.path.realpath(ensure_workspace_exists(user))
+    target = os.path.realpath(os.path.join(root, relative.strip('/')))
+    if os.path.commonpath([root, target]) != root:
+        raise BrowseError("Path is outside your workspace")
+    return target
+
+
+def encode_cursor(sort: str, descending: bool, key: tuple) -> str:
+    raw = json.dumps([sort, descending, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise BrowseError("Invalid cursor")
+    if cursor_sort != sort or cursor_descending != descending or len(key) != 3:
+        raise BrowseError("Cursor belongs to a different sort order")
+    return tuple(key)
+
+
+def _describe(path: str, base: str, entry: Entry) -> Dict:
+    """JSON for ``entry`` with a fresh stat; the cached entry keeps the
+    values its directory is sorted by."""
+    size, modified = entry.size, entry.modified
+    try:
+        stat = os.stat(os.path.join(path, entry.name), follow_symlinks=False)
+        size, modified = (0 if entry.is_dir else stat.st_size), stat.st_mtime
+    except OSError:
+        pass
+    return {
+        'name': entry.name,
+        'path': os.path.join(base, entry.name),
+        'type': 'dir' if entry.is_dir else 'file',
+        'size': size,
+        'modified': modified,
+    }
+
+
+def browse(user, relative: str = '', sort: str = 'name', descending: bool = False, query: str = '',
+           kind: str = '', ext: str = '', limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict:
+    """One page of a workspace directory, continuing after ``cursor``.
+
+    Cursors hold the sort key of the last entry returned, so entries
+    added or removed between pages neither repeat nor get skipped.
+    """
+    if sort not in SORT_KEYS:
+        raise BrowseError(f"sort must be one of {', '.join(SORT_KEYS)}")
+    if kind not in ('', 'file', 'dir'):
+        raise BrowseError("type must be file or dir")
+    limit = min(limit or settings.FILE_BROWSER['PAGE_SIZE'], settings.FILE_BROWSER['MAX_PAGE_SIZE'])
+    if limit <= 0:
+        raise BrowseError("limit must be positive")
+
+    path = resolve(user, relative)
+    if not os.path.isdir(path):
+        raise BrowseError("Not a directory")
+    directory = file_index.directory(path)
+    keys, ordered = directory.ordered(sort, descending)
+
+    try:
+        if descending:
+            stop = bisect_left(keys, decode_cursor(cursor, sort, descending)) if cursor else len(ordered)
+            candidates = (ordered[i] for i in range(stop - 1, -1, -1))
+        else:
+            start = bisect_right(keys, decode_cursor(cursor, sort, descending)) if cursor else 0
+            candidates = (ordered[i] for i in range(start, len(ordered)))
+    except TypeError:
+        raise BrowseError("Invalid cursor")
+
+    query = query.casefold()
+    ext = ext.lower()
+    if ext and not ext.startswith('.'):
+        ext = '.' + ext
+    page: List[Entry] = []
+    last_key = None
+    more = False
+    for entry in candidates:
+        if (query and query not in entry.name.casefold()) or \
+                (kind and entry.is_dir != (kind == 'dir')) or (ext and entry.ext != ext):
+            continue
+        if len(page) == limit:
+            more = True
+            break
+        page.append(entry)
+        last_key = (entry.is_dir if descending else not entry.is_dir, entry.sort_value(sort), entry.name)
+
+    root = os.path.realpath(get_user_workspace(user))
+    base = os.path.relpath(path, root)
+    base = '' if base == '.' else base
+    return {
+        'path': base,
+        'count': len(ordered),
+        'entries': [_describe(path, base, entry) for entry in page],
+        'next_cursor': encode_cursor(sort, descending, last_key) if more else None,
+    }
@@ -0,0 +1,133 @@
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+import docker
+import pynvml
+from django.conf import settings
+
+from .models import DockerContainer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GpuDevice:
+    index: int
+    uuid: str
+    mem_total_mb: int
+    mem_free_mb: int
+    utilization: float  # percent
+
+
+class NvmlBackend:
+    """Live per-GPU readings from NVML."""
+
+    def devices(self) -> List[GpuDevice]:
+        pynvml.nvmlInit()
+        try:
+            devices = []
+            for index in range(pynvml.nvmlDeviceGetCount()):
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                uuid = pynvml.nvmlDeviceGetUUID(handle)
+                memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                devices.append(GpuDevice(
+                    index=index,
+                    uuid=uuid.decode() if isinstance(uuid, bytes) else uuid,
+                    mem_total_mb=memory.total // (1024 * 1024),
+                    mem_free_mb=memory.free // (1024 * 1024),
+                    utilization=pynvml.nvmlDeviceGetUtilizationRates(handle).gpu,
+                ))
+            return devices
+        finally:
+            pynvml.nvmlShutdown()
+
+
+class GpuAllocator:
+    """Assigns specific GPUs to containers instead of exposing all of them.
+
+    Devices are ranked by how many containers are already assigned to them,
+    then by live utilization and free memory, so new containers spread over
+    the cards rather than piling onto GPU 0.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or NvmlBackend()
+        self._lock = threading.Lock()
+        # Devices picked for containers that are still being created
+        self._pending = Counter()
+
+    @property
+    def config(self):
+        return settings.GPU_ALLOCATION
+
+    def enabled(self) -> bool:
+        return bool(self.config.get('ENABLED'))
+
+    def _devices(self) -> List[GpuDevice]:
+        try:
+            return self.backend.devices()
+        except Exception as e:
+            logger.error(f"[GPU] Could not read devices: {e}")
+            return []
+
+    def _usable(self, device: GpuDevice) -> bool:
+        return (device.mem_free_mb >= self.config['MIN_FREE_MB']
+                and device.utilization <= self.config['MAX_UTILIZATION'])
+
+    def _assigned_counts(self, exclude: Optional[DockerContainer] = None) -> Counter:
+        rows = DockerContainer.objects.filter(status='running').exclude(gpu_devices=[])
+        if exclude is not None:
+            rows = rows.exclude(id=exclude.id)
+        counts = Counter(self._pending)
+        for devices in rows.values_list('gpu_devices', flat=True):
+            counts.update(devices)
+        return counts
+
+    def pick(self, count: Optional[int] = None, exclude: Optional[DockerContainer] = None) -> Optional[List[str]]:
+        """UUIDs of the ``count`` best devices, or ``None`` when NVML sees no GPU.
+
+        Devices below ``MIN_FREE_MB`` or above ``MAX_UTILIZATION`` are only
+        used when no better card is left.
+
+        The pick is held as pending until :meth:`settle`, so concurrent
+        creations don't all land on the same card.
+        """
+        count = count or self.config['DEVICES_PER_CONTAINER']
+        devices = self._devices()
+        if not devices:
+            return None
+        with self._lock:
+            assigned = self._assigned_counts(exclude)
+            ranked = sorted(devices, key=lambda d: (
+                not self._usable(d), assigned[d.uuid], d.utilization, -d.mem_free_mb, d.index
+            ))
+            chosen = [d.uuid for d in ranked[:count]]
+            self._pending.update(chosen)
+        return chosen
+
+    def settle(self, uuids: Optional[List[str]]):
+        """Drop the pending hold once the assignment is saved or abandoned."""
+        if not uuids:
+            return
+        with self._lock:
+            self._pending.subtract(uuids)
+            self._pending = +self._pending
+
+    def needs_rebalance(self, row: DockerContainer) -> bool:
+        """True when a device assigned to ``row`` is gone or now overloaded."""
+        if not row.gpu_devices:
+            return False
+        devices = {d.uuid: d for d in self._devices()}
+        if not devices:
+            return False
+        return any(uuid not in devices or not self._usable(devices[uuid]) for uuid in row.gpu_devices)
+
+
+def device_requests(uuids: List[str]) -> List[docker.types.DeviceRequest]:
+    return [docker.types.DeviceRequest(device_ids=list(uuids), capabilities=[['gpu']])]
+
+
+gpu_allocator = GpuAllocator()
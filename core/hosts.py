@@ -0,0 +1,184 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import docker
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CustomUser, DockerContainer, DockerHost
+
+logger = logging.getLogger(__name__)
+
+
+def is_remote(host: Optional[DockerHost]) -> bool:
+    return host is not None and bool(host.base_url)
+
+
+def rows_on(host: Optional[DockerHost]):
+    """``DockerContainer`` rows placed on ``host``; ``None`` is the local engine."""
+    rows = DockerContainer.objects.all()
+    if is_remote(host):
+        return rows.filter(host=host)
+    return rows.filter(Q(host__isnull=True) | Q(host__base_url=''))
+
+
+def group_by_host(rows) -> Dict[Optional[DockerHost], List[DockerContainer]]:
+    """Rows keyed by the remote host they live on; ``None`` is the local engine."""
+    hosts = DockerHost.objects.in_bulk({row.host_id for row in rows if row.host_id})
+    groups: Dict[Optional[DockerHost], List[DockerContainer]] = {}
+    for row in rows:
+        host = hosts.get(row.host_id)
+        groups.setdefault(host if is_remote(host) else None, []).append(row)
+    return groups
+
+
+class PlacementPolicy:
+    """Chooses a host for a new container. Subclass and point
+    ``DOCKER_PLACEMENT_POLICY`` at it to plug in another strategy."""
+
+    def choose(self, hosts: List[DockerHost], cpu: float, mem_mb: int) -> Optional[DockerHost]:
+        fitting = [h for h in hosts if h.free_cpu >= cpu and h.free_mem_mb >= mem_mb]
+        if not fitting:
+            return None
+        return min(fitting, key=lambda h: self.score(h, cpu, mem_mb))
+
+    def score(self, host: DockerHost, cpu: float, mem_mb: int):
+        raise NotImplementedError
+
+
+class BinPackPolicy(PlacementPolicy):
+    """Fill the fullest host that still fits, keeping others free for big jobs."""
+
+    def score(self, host, cpu, mem_mb):
+        return (host.free_mem_mb - mem_mb, host.free_cpu - cpu, host.name)
+
+
+class SpreadPolicy(PlacementPolicy):
+    """Place on the emptiest host to reduce noisy neighbours."""
+
+    def score(self, host, cpu, mem_mb):
+        mem_share = host.free_mem_mb / host.mem_total_mb if host.mem_total_mb else 0
+        cpu_share = host.free_cpu / host.cpu_total if host.cpu_total else 0
+        return (-min(mem_share, cpu_share), host.name)
+
+
+class HostRegistry:
+    """Docker engines from ``DOCKER_HOSTS`` and a client for each of them.
+
+    Rows without a host (created before multi-host support) and hosts with
+    a blank ``base_url`` use the manager's default local client.
+    """
+
+    def __init__(self, default_client=None):
+        self.default_client = default_client
+        self._clients: Dict[int, docker.DockerClient] = {}
+        self._lock = threading.Lock()
+
+    def sync_configured_hosts(self):
+        for cfg in settings.DOCKER_HOSTS:
+            DockerHost.objects.update_or_create(
+                name=cfg['name'],
+                defaults={
+                    'base_url': cfg.get('base_url') or '',
+                    'public_address': cfg.get('public_address') or '',
+                }
+            )
+
+    def hosts(self) -> List[DockerHost]:
+        return list(DockerHost.objects.filter(enabled=True))
+
+    def remote_hosts(self) -> List[DockerHost]:
+        return [h for h in self.hosts() if is_remote(h)]
+
+    def client(self, host: Optional[DockerHost]):
+        if not is_remote(host):
+            return self.default_client
+        with self._lock:
+            client = self._clients.get(host.id)
+            if client is None:
+                client = self._clients[host.id] = docker.DockerClient(base_url=host.base_url)
+            return client
+
+    def client_for(self, row: Optional[DockerContainer]):
+        return self.client(row.host if row else None)
+
+    def client_for_id(self, container_id: str):
+        """Client of the engine a container runs on, found through its row;
+        containers without a row (e.g. the warm pool) are local."""
+        row = DockerContainer.objects.select_related('host').filter(container_id=container_id).first()
+        return self.client_for(row)
+
+    def engine_hosts(self) -> List[Optional[DockerHost]]:
+        """Every engine to look at: ``None`` for the local one, when it is up,
+        then each enabled remote host. Clients are left to the caller so one
+        unreachable host can be handled on its own."""
+        local = [None] if self.default_client else []
+        return local + self.remote_hosts()
+
+    def public_address(self, host: Optional[DockerHost]) -> str:
+        if host is not None and host.public_address:
+            return host.public_address
+        return settings.SERVER_IP
+
+    def policy(self) -> PlacementPolicy:
+        return import_string(settings.DOCKER_PLACEMENT_POLICY)()
+
+    def place(self, user: CustomUser) -> Optional[DockerHost]:
+        """Pick a host for ``user``'s container and reserve its limits there.
+
+        Returns ``None`` (local engine) when no hosts are registered.
+        """
+        hosts = [h for h in self.hosts() if h.reachable]
+        if not hosts:
+            return None
+        host = self.policy().choose(hosts, user.cpu_limit, user.mem_limit)
+        if host is None:
+            # Nothing has room: fall back to the host with most free memory
+            # rather than refusing to start.
+            host = max(hosts, key=lambda h: h.free_mem_mb)
+            logger.warning(f"[Hosts] No host fits {user.username}; overcommitting {host.name}")
+        DockerHost.objects.filter(id=host.id).update(
+            free_cpu=F('free_cpu') - user.cpu_limit,
+            free_mem_mb=F('free_mem_mb') - user.mem_limit
+        )
+        return host
+
+    def collect(self):
+        """Refresh capacity from each engine and free resources from placed limits."""
+        for host in DockerHost.objects.all():
+            client = self.client(host)
+            try:
+                if client is None:
+                    raise ConnectionError("Docker not available")
+                info = client.info()
+            except Exception as e:
+                logger.error(f"[Hosts] {host.name} unreachable: {e}")
+                DockerHost.objects.filter(id=host.id).update(reachable=False)
+                continue
+
+            rows = rows_on(host).filter(status='running')
+            used_cpu = used_mem = 0
+            for limits in rows.values_list('resource_limits', flat=True):
+                used_cpu += limits.get('cpu') or 0
+                used_mem += limits.get('ram') or 0
+
+            cpu_total = info.get('NCPU', 0)
+            mem_total_mb = info.get('MemTotal', 0) // (1024 * 1024)
+            DockerHost.objects.filter(id=host.id).update(
+                reachable=True,
+                cpu_total=cpu_total,
+                mem_total_mb=mem_total_mb,
+                free_cpu=cpu_total - used_cpu,
+                free_mem_mb=mem_total_mb - used_mem,
+                last_seen=timezone.now()
+            )
+
+
+def collect_host_stats():
+    """Scheduler entry point."""
+    from .docker_utils import docker_manager
+    docker_manager.hosts.sync_configured_hosts()
+    docker_manager.hosts.collect()
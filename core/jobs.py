@@ -1,83 +1,154 @@
-from .models import DockerContainer, ContainerSchedule, CustomUser
-from docker import from_env
+from .bulk import run_bulk_action
+from .models import DockerContainer, ContainerSchedule, CustomUser, RecurringSchedule
+from .recurrence import next_occurrence
 from django.utils import timezone
 from apscheduler.triggers.date import DateTrigger
+from typing import Dict, Optional
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-def stop_all_except(scheduler_user):
+
+def _seconds_after(scheduled_for, moment) -> Optional[float]:
+    if scheduled_for is None:
+        return None
+    if timezone.is_aware(scheduled_for) != timezone.is_aware(moment):
+        scheduled_for = (timezone.make_naive(scheduled_for) if timezone.is_aware(scheduled_for)
+                         else timezone.make_aware(scheduled_for))
+    return round((moment - scheduled_for).total_seconds(), 2)
+
+
+def _transition(name: str, rows, action: str, scheduled_for=None) -> Dict:
+    """Apply ``action`` to ``rows`` concurrently and report how late it ran.
+
+    ``start_delay`` is how long after ``scheduled_for`` the job began,
+    ``lateness`` how long after it the last container was done.
+    """
+    began = timezone.now()
+    started = time.monotonic()
+    summary = {'ok': 0, 'failed': 0}
+    for event in run_bulk_action(rows.select_related('user'), action, by_admin=False):
+        if event.get('done'):
+            summary = event
+        elif event['ok']:
+            logger.info(f"[Scheduler] {action.capitalize()}d container {event['container']} for user {event['user']}")
+
+    metrics = {
+        'transition': name,
+        'ok': summary['ok'],
+        'failed': summary['failed'],
+        'duration': round(time.monotonic() - started, 2),
+        'start_delay': _seconds_after(scheduled_for, began),
+        'lateness': _seconds_after(scheduled_for, timezone.now()),
+    }
+    logger.info(f"[Scheduler] {name} metrics: {metrics}")
+    return metrics
+
+
+def stop_all_except(scheduler_user, scheduled_for=None):
     logger.info(f"[Scheduler] stop_all_except: only {scheduler_user.username} remains active")
-    client = from_env()
-    
+
     # Set all users as inaccessible except the scheduled one
     CustomUser.objects.exclude(id=scheduler_user.id).update(is_accessible=False)
     scheduler_user.is_accessible = True
     scheduler_user.save()
 
-    # Stop all containers except the scheduled one
-    for container in DockerContainer.objects.exclude(user=scheduler_user):
-        try:
-            docker_container = client.containers.get(container.container_id)
-            if docker_container.status == 'running':
-                docker_container.pause()
-                logger.info(f"[Scheduler] Paused container {container.container_id} for user {container.user.username}")
-            container.status = 'paused'
-            container.save()
-        except Exception as e:
-            logger.error(f"[Scheduler][Error] Failed to stop container {container.container_id}: {e}")
-
-def reset_access_and_restart():
+    # Pause every other running container (one list call, concurrent pauses)
+    rows = DockerContainer.objects.exclude(user=scheduler_user).filter(status='running')
+    return _transition('stop_all_except', rows, 'pause', scheduled_for)
+
+
+def reset_access_and_restart(scheduled_for=None):
     logger.info("[Scheduler] reset_access_and_restart: granting access to all users")
-    client = from_env()
 
     # Set all users accessible
     CustomUser.objects.update(is_accessible=True)
 
-    # Optionally restart containers that were previously running
-    for container in DockerContainer.objects.all():
-        try:
-            docker_container = client.containers.get(container.container_id)
-            if container.status == 'paused':
-                docker_container.unpause()
-                logger.info(f"[Scheduler] Unpaused container {container.container_id} for user {container.user.username}")
-                container.status = 'running'
-                container.save()
-        except Exception as e:
-            logger.error(f"[Scheduler][Error] Failed to restart container {container.container_id}: {e}")
+    # Resume containers paused for the exclusive window
+    rows = DockerContainer.objects.filter(status='paused')
+    return _transition('reset_access_and_restart', rows, 'unpause', scheduled_for)
+
+EXCLUSIVE_ROLES = ['doctoral', 'teacher']
+
+
+def schedule_jobs(schedule: ContainerSchedule, now=None) -> Dict[str, Dict]:
+    """``add_job`` kwargs for one schedule's exclusive window, keyed by job id.
+
+    Only transitions still in the future are wanted, so a window already
+    under way keeps its end job.
+    """
+    user = schedule.container.user
+    if not schedule.active or user.role not in EXCLUSIVE_ROLES:
+        return {}
+
+    now = now or timezone.now()
+    tz = timezone.get_current_timezone()
+    jobs = {}
+    if schedule.start_datetime > now:
+        jobs[f"exclusive_start_{schedule.pk}"] = {
+            'func': 'core.jobs:stop_all_except',
+            'trigger': DateTrigger(run_date=schedule.start_datetime, timezone=tz),
+            'args': [user, schedule.start_datetime],
+        }
+    if schedule.end_datetime > now:
+        jobs[f"exclusive_end_{schedule.pk}"] = {
+            'func': 'core.jobs:reset_access_and_restart',
+            'trigger': DateTrigger(run_date=schedule.end_datetime, timezone=tz),
+            'args': [schedule.end_datetime],
+        }
+    return jobs
+
+
+def recurring_jobs(rule: RecurringSchedule, now=None) -> Dict[str, Dict]:
+    """``add_job`` kwargs for the next occurrence of a recurring window only.
+
+    Job ids carry the occurrence start, and the end job registers the
+    occurrence after it, so a rule never holds more than two jobs.
+    """
+    user = rule.container.user
+    if not rule.active or user.role not in EXCLUSIVE_ROLES:
+        return {}
+
+    now = now or timezone.now()
+    occurrence = next_occurrence(rule, now)
+    if occurrence is None:
+        return {}
+    start, end = occurrence
+    tz = timezone.get_current_timezone()
+    stamp = start.strftime('%Y%m%d%H%M')
+    jobs = {}
+    if start > now:
+        jobs[f"recurring_{rule.pk}_start_{stamp}"] = {
+            'func': 'core.jobs:stop_all_except',
+            'trigger': DateTrigger(run_date=start, timezone=tz),
+            'args': [user, start],
+        }
+    jobs[f"recurring_{rule.pk}_end_{stamp}"] = {
+        'func': 'core.jobs:end_recurring_occurrence',
+        'trigger': DateTrigger(run_date=end, timezone=tz),
+        'args': [rule.pk, end],
+    }
+    return jobs
+
+
+def end_recurring_occurrence(rule_id: int, scheduled_for=None):
+    metrics = reset_access_and_restart(scheduled_for)
+    from .scheduler import sync_recurring_jobs
+    sync_recurring_jobs([rule_id])
+    return metrics
+
 
 def schedule_all_containers(scheduler):
-    schedules = ContainerSchedule.objects.filter(active=True)
+    schedules = ContainerSchedule.objects.filter(active=True).select_related('container__user')
     logger.info(f"[Scheduler] Found {schedules.count()} active schedules")
 
-    from django.utils.timezone import now
-
     for schedule in schedules:
-        container = schedule.container
-        user = container.user
-
-        if user.role not in ['doctoral', 'teacher']:
+        user = schedule.container.user
+        if user.role not in EXCLUSIVE_ROLES:
             logger.warning(f"[Scheduler] Skipping schedule for user {user.username} with role {user.role}")
             continue
 
-        if schedule.start_datetime < now():
-            logger.warning(f"[Scheduler] Skipping past schedule for user {user.username} starting at {schedule.start_datetime}")
-            continue
-
-        container_id = container.container_id
         logger.info(f"Scheduling for user {user.username} from {schedule.start_datetime} to {schedule.end_datetime}")
-
-        scheduler.add_job(
-            stop_all_except,
-            trigger=DateTrigger(run_date=schedule.start_datetime, timezone=timezone.get_current_timezone()),
-            args=[user],
-            id=f"exclusive_start_{container_id}_{schedule.start_datetime.isoformat()}",
-            replace_existing=True
-        )
-
-        scheduler.add_job(
-            reset_access_and_restart,
-            trigger=DateTrigger(run_date=schedule.end_datetime, timezone=timezone.get_current_timezone()),
-            id=f"exclusive_end_{container_id}_{schedule.end_datetime.isoformat()}",
-            replace_existing=True
-        )
+        for job_id, spec in schedule_jobs(schedule).items():
+            scheduler.add_job(id=job_id, replace_existing=True, **spec)
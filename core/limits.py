@@ -0,0 +1,98 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+import docker
+from django.conf import settings
+
+from .cpus import cpu_pinner
+from .docker_utils import docker_manager
+from .hosts import group_by_host
+from .models import CustomUser, DockerContainer
+
+logger = logging.getLogger(__name__)
+
+CPU_KEYS = ('cpu_period', 'cpu_quota')
+
+
+def _update(container, limits: Dict) -> bool:
+    """Apply ``limits``; returns False when only memory could be changed.
+
+    Containers created before limits moved to CFS quota carry NanoCpus,
+    which the engine refuses to combine with a quota update.
+    """
+    try:
+        container.update(**limits)
+        return True
+    except docker.errors.APIError as e:
+        if 'nano' not in str(e).lower():
+            raise
+        container.update(**{k: v for k, v in limits.items() if k not in CPU_KEYS})
+        return False
+
+
+def apply_live_limits(users: Iterable[CustomUser], client=None) -> List[Dict]:
+    """Push each user's current mem/swap/cpu limits to their containers.
+
+    No container is recreated. Containers are looked up with one list call
+    per host, updated concurrently, and ``resource_limits`` is saved in one
+    bulk write.
+    """
+    users = {user.id: user for user in users}
+    rows = list(DockerContainer.objects.filter(user_id__in=users).exclude(container_id=''))
+    if not rows:
+        return []
+
+    engine = {}
+    for host, host_rows in group_by_host(rows).items():
+        host_client = client or docker_manager.hosts.client(host)
+        if not host_client:
+            continue
+        try:
+            engine.update({
+                c.id: c for c in host_client.containers.list(
+                    all=True, sparse=True, filters={'id': [row.container_id for row in host_rows]}
+                )
+            })
+        except Exception as e:
+            logger.error(f"[Limits] Could not list containers on {host or 'local'}: {e}")
+
+    def work(row):
+        user = users[row.user_id]
+        result = {'user': user.username, 'container': row.id, 'ok': False}
+        container = engine.get(row.container_id)
+        if container is None:
+            result['error'] = 'container not found'
+            return result
+        try:
+            result['cpu_applied'] = _update(container, docker_manager._user_limits(user))
+        except Exception as e:
+            logger.error(f"[Limits] Live update failed for {user.username}: {e}")
+            result['error'] = str(e)
+            return result
+
+        result['ok'] = True
+        result['gpu_pending'] = bool(row.resource_limits.get('gpu')) != bool(user.gpu_access)
+        row.resource_limits = {
+            'cpu': user.cpu_limit if result['cpu_applied'] else row.resource_limits.get('cpu'),
+            'ram': user.mem_limit,
+            'swap': user.memswap_limit,
+            # the runtime cannot change in place; takes effect on recreate
+            'gpu': row.resource_limits.get('gpu', user.gpu_access),
+        }
+        return result
+
+    with ThreadPoolExecutor(max_workers=settings.BULK_ACTIONS['MAX_PARALLEL']) as pool:
+        results = list(pool.map(work, rows))
+
+    updated = [row for row, result in zip(rows, results) if result['ok']]
+    if updated:
+        DockerContainer.objects.bulk_update(updated, ['resource_limits'])
+    # Resize cpusets to the new core counts
+    for row, result in zip(rows, results):
+        if result['ok'] and result['cpu_applied'] and row.status == 'running':
+            try:
+                cpu_pinner.pin(row, engine[row.container_id], users[row.user_id])
+            except Exception as e:
+                logger.error(f"[Limits] Could not resize cpuset for {result['user']}: {e}")
+    return results
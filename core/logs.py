@@ -0,0 +1,184 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .docker_utils import docker_manager
+
+logger = logging.getLogger(__name__)
+
+
+def log_group(container_id: str) -> str:
+    return f"container_logs_{container_id[:32]}"
+
+
+def parse_line(raw: bytes) -> Dict:
+    """Split a ``timestamps=True`` docker log line into epoch seconds and text."""
+    text = raw.decode('utf-8', errors='replace').rstrip('\r')
+    stamp, _, line = text.partition(' ')
+    try:
+        # RFC3339Nano: trim the fraction to microseconds for fromisoformat
+        main, _, frac = stamp.rstrip('Z').partition('.')
+        ts = datetime.fromisoformat(f"{main}.{(frac + '000000')[:6]}").replace(tzinfo=dt_timezone.utc).timestamp()
+    except ValueError:
+        return {'ts': None, 'line': text}
+    return {'ts': ts, 'line': line}
+
+
+class LogBuffer:
+    """Most recent log lines of one container, capped by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def extend(self, entries: List[Dict]):
+        with self._lock:
+            for entry in entries:
+                self._entries.append(entry)
+                self._size += len(entry['line'])
+            while self._size > self.max_bytes and self._entries:
+                self._size -= len(self._entries.popleft()['line'])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def tail(self, lines: Optional[int] = None, since: Optional[float] = None) -> List[Dict]:
+        with self._lock:
+            entries = list(self._entries)
+        if since is not None:
+            entries = [e for e in entries if e['ts'] is not None and e['ts'] >= since]
+        if lines is not None:
+            entries = entries[-lines:] if lines else []
+        return entries
+
+
+def _client_for(container_id: str):
+    return docker_manager.hosts.client_for_id(container_id)
+
+
+class LogFollower(threading.Thread):
+    """Streams one container's logs into its buffer and to websocket viewers."""
+
+    def __init__(self, container_id: str, buffer: LogBuffer):
+        super().__init__(name=f"logs-{container_id[:12]}", daemon=True)
+        self.container_id = container_id
+        self.buffer = buffer
+        self.stream = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        channel_layer = get_channel_layer()
+        try:
+            container = _client_for(self.container_id).containers.get(self.container_id)
+            self.stream = container.logs(
+                stream=True, follow=True, timestamps=True,
+                tail=settings.CONTAINER_LOGS['FOLLOW_BACKLOG']
+            )
+            if self._stopped.is_set():
+                self.stream.close()
+                return
+
+            partial = b''
+            for chunk in self.stream:
+                partial += chunk
+                *complete, partial = partial.split(b'\n')
+                if not complete:
+                    continue
+                entries = [parse_line(raw) for raw in complete]
+                self.buffer.extend(entries)
+                if channel_layer is not None:
+                    async_to_sync(channel_layer.group_send)(
+                        log_group(self.container_id), {'type': 'log.lines', 'lines': entries}
+                    )
+        except Exception as e:
+            if not self._stopped.is_set():
+                logger.error(f"[Logs] Follower for {self.container_id[:12]} stopped: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+
+
+class LogService:
+    """Shared followers and bounded buffers for container logs.
+
+    However many viewers watch a container, only one follower streams from
+    the daemon; it stops when the last viewer leaves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers: 'OrderedDict[str, LogBuffer]' = OrderedDict()
+        self._followers: Dict[str, LogFollower] = {}
+        self._viewers: Dict[str, int] = {}
+
+    def _buffer(self, container_id: str) -> LogBuffer:
+        cfg = settings.CONTAINER_LOGS
+        buffer = self._buffers.get(container_id)
+        if buffer is None:
+            buffer = self._buffers[container_id] = LogBuffer(cfg['BUFFER_BYTES'])
+            # Least recently used first; buffers being followed stay
+            for key in list(self._buffers):
+                if len(self._buffers) <= cfg['MAX_BUFFERS']:
+                    break
+                if key != container_id and key not in self._followers:
+                    del self._buffers[key]
+        self._buffers.move_to_end(container_id)
+        return buffer
+
+    def attach(self, container_id: str) -> LogBuffer:
+        with self._lock:
+            buffer = self._buffer(container_id)
+            self._viewers[container_id] = self._viewers.get(container_id, 0) + 1
+            if not self.is_following(container_id):
+                buffer.clear()  # the follower's backlog refills it
+                follower = self._followers[container_id] = LogFollower(container_id, buffer)
+                follower.start()
+            return buffer
+
+    def detach(self, container_id: str):
+        with self._lock:
+            remaining = self._viewers.get(container_id, 0) - 1
+            if remaining > 0:
+                self._viewers[container_id] = remaining
+                return
+            self._viewers.pop(container_id, None)
+            follower = self._followers.pop(container_id, None)
+        if follower:
+            follower.stop()
+
+    def is_following(self, container_id: str) -> bool:
+        follower = self._followers.get(container_id)
+        return follower is not None and follower.is_alive()
+
+    def tail(self, container_id: str, lines: Optional[int] = None, since: Optional[float] = None) -> List[Dict]:
+        limit = settings.CONTAINER_LOGS['MAX_TAIL_LINES']
+        lines = min(lines or limit, limit)
+        if self.is_following(container_id):
+            return self._buffers[container_id].tail(lines, since)
+
+        # No follower: ask the daemon, bounded by ``tail`` so a long-running
+        # container never ships its whole history.
+        container = _client_for(container_id).containers.get(container_id)
+        kwargs = {'timestamps': True, 'tail': lines}
+        if since is not None:
+            kwargs['since'] = since
+        raw = container.logs(**kwargs)
+        return [parse_line(line) for line in raw.split(b'\n') if line]
+
+
+log_service = LogService()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+import warnings
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import FileResponse
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from core.downloads import serve_file
+
+MODES = ('file-response', 'stream', 'stream-asgi', 'ranges', 'x-accel')
+
+
+class Command(BaseCommand):
+    help = "Compare download throughput and CPU cost of the file-serving modes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256, help='Size of the generated test file')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per mode; the best is reported')
+        parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated modes to compare')
+        parser.add_argument('--block-kb', type=int, default=None, help='Override DOWNLOADS BLOCK_BYTES')
+
+    def handle(self, *args, **options):
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        with tempfile.TemporaryDirectory() as media:
+            path = os.path.join(media, 'bench.bin')
+            with open(path, 'wb') as out:
+                for _ in range(options['size_mb']):
+                    out.write(os.urandom(1024 * 1024))
+            overrides = {'MEDIA_ROOT': media}
+            if options['block_kb']:
+                from django.conf import settings
+                overrides['DOWNLOADS'] = {**settings.DOWNLOADS, 'BLOCK_BYTES': options['block_kb'] * 1024}
+
+            self.stdout.write(f"{options['size_mb']} MB file, best of {options['repeat']}\n")
+            self.stdout.write(f"{'mode':<16}{'ms/request':>12}{'MB/s':>10}{'CPU s/GB':>10}{'bytes sent':>14}")
+            with override_settings(**overrides), warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                for mode in modes:
+                    runs = [self.measure(mode, path) for _ in range(options['repeat'])]
+                    wall, cpu, sent = min(runs)
+                    sent_mb = sent / (1024 * 1024)
+                    rate = f"{sent_mb / wall:.0f}" if sent and wall else '-'
+                    cost = f"{cpu / sent_mb * 1024:.2f}" if sent else '-'
+                    self.stdout.write(f"{mode:<16}{wall * 1000:>12.1f}{rate:>10}{cost:>10}{sent:>14}")
+        self.stdout.write("\nx-accel only sends headers; the bytes are then copied by nginx outside Python.")
+
+    def measure(self, mode, path):
+        wall, cpu = time.perf_counter(), time.process_time()
+        sent = self.download(mode, path)
+        return time.perf_counter() - wall, time.process_time() - cpu, sent
+
+    def download(self, mode, path):
+        if mode == 'file-response':  # what download_file returned before
+            response = FileResponse(open(path, 'rb'))
+            sent = sum(len(chunk) for chunk in response)
+            response.close()
+            return sent
+        if mode == 'stream-asgi':
+            return asyncio.run(self.consume_async(path))
+
+        request = RequestFactory().get('/')
+        if mode == 'ranges':
+            size = os.path.getsize(path)
+            starts = sorted(random.sample(range(0, size - 1024 * 1024, 1024 * 1024), 8))
+            request = RequestFactory().get('/', HTTP_RANGE='bytes=' + ','.join(f'{s}-{s + 1024 * 1024 - 1}' for s in starts))
+        response = serve_file(request, path, mode='x-accel' if mode == 'x-accel' else 'stream')
+        sent = sum(len(chunk) for chunk in response) if response.streaming else len(response.content)
+        response.close()
+        return sent
+
+    async def consume_async(self, path):
+        response = serve_file(AsyncRequestFactory().get('/'), path, mode='stream')
+        sent = 0
+        async for chunk in response:
+            sent += len(chunk)
+        return sent
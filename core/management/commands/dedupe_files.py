@@ -0,0 +1,30 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.blobs import adopt
+from core.models import AIModel, UserFile
+
+
+class Command(BaseCommand):
+    help = "Move existing user files and models into the deduplicated blob store"
+
+    def handle(self, *args, **options):
+        linked = skipped = 0
+        for model, field in ((UserFile, 'file'), (AIModel, 'model_file')):
+            for row in model.objects.filter(blob__isnull=True).iterator():
+                path = getattr(row, field).path
+                if not os.path.isfile(path):
+                    skipped += 1
+                    continue
+                with transaction.atomic():
+                    blob = adopt(path)
+                    if blob is not None:
+                        row.blob = blob
+                        row.save(update_fields=['blob'])
+                if blob is None:
+                    skipped += 1
+                    continue
+                linked += 1
+        self.stdout.write(f"Linked {linked} files, skipped {skipped} (missing, small or not linkable)")
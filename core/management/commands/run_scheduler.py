@@ -0,0 +1,27 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.service import DatabaseLock, FileLock, SchedulerService, make_lock
+
+
+class Command(BaseCommand):
+    help = "Run the scheduler and its periodic collectors as a leader-elected singleton"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lock', choices=['db', 'file'], help='Override SCHEDULER_SERVICE["LOCK"]')
+
+    def handle(self, *args, **options):
+        lock = {'db': DatabaseLock, 'file': FileLock}[options['lock']]() if options['lock'] else make_lock()
+        service = SchedulerService(lock)
+        signal.signal(signal.SIGTERM, lambda *_: service.stop())
+
+        self.stdout.write(f"Scheduler service {lock.identity} started; waiting for leadership")
+        try:
+            asyncio.run(service.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.shutdown()
+            self.stdout.write("Scheduler service stopped")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.disk_usage import DiskUsageScanner, disk_usage, scan_disk_usage
+
+
+class Command(BaseCommand):
+    help = "Rescan workspace disk usage now, or time cold and warm scans with --benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', action='store_true', help='Time scans without storing results')
+        parser.add_argument('--workers', type=int, default=None, help='Override DISK_USAGE WORKERS')
+        parser.add_argument('--repeat', type=int, default=3, help='Warm scans after the cold one')
+
+    def handle(self, *args, **options):
+        if not options['benchmark']:
+            count = scan_disk_usage()
+            self.stdout.write(f"Scanned {count} workspaces: listed {disk_usage.listed} directories, "
+                              f"reused {disk_usage.reused}")
+            return
+
+        scanner = DiskUsageScanner(workers=options['workers'])
+        for run in range(options['repeat'] + 1):
+            started = time.perf_counter()
+            usages = scanner.scan()
+            elapsed = time.perf_counter() - started
+            total = sum(usage.bytes for usage in usages.values())
+            self.stdout.write(f"{'cold' if run == 0 else 'warm'}: {elapsed:.3f}s, {len(usages)} workspaces, "
+                              f"{total / 1024 ** 3:.2f} GB, listed {scanner.listed}, reused {scanner.reused}")
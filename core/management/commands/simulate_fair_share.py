@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.fairshare import POLICIES, Ticket, simulate, usage_by_user
+from core.models import GpuTimeRequest
+
+
+class Command(BaseCommand):
+    help = "Replay recent GPU-time requests under each queue policy and compare them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='How many days of requests to replay')
+        parser.add_argument('--policies', default=','.join(POLICIES), help='Comma-separated policies to compare')
+        parser.add_argument('--per-user', action='store_true', help='Also print served hours per user')
+
+    def handle(self, *args, **options):
+        policies = [p.strip() for p in options['policies'].split(',') if p.strip()]
+        unknown = set(policies) - set(POLICIES)
+        if unknown:
+            raise CommandError(f"Unknown policies: {', '.join(sorted(unknown))}")
+
+        since = timezone.now() - timedelta(days=options['days'])
+        # Re-queued remainders of preempted windows share the original
+        # requested_at; only the first row per request is replayed.
+        seen, tickets = set(), []
+        rows = (GpuTimeRequest.objects.filter(requested_at__gte=since)
+                .exclude(status='cancelled').select_related('user').order_by('id'))
+        for row in rows:
+            key = (row.user_id, row.requested_at)
+            if key in seen:
+                continue
+            seen.add(key)
+            tickets.append(Ticket(row.user.username, row.user.role, row.requested_at,
+                                  row.duration, row.earliest_start))
+        if not tickets:
+            self.stdout.write("No GPU-time requests in that period.")
+            return
+
+        usernames = {row.user_id: row.user.username for row in rows}
+        initial_usage = {usernames[uid]: hours for uid, hours in usage_by_user(since).items() if uid in usernames}
+
+        self.stdout.write(f"Replaying {len(tickets)} requests from the last {options['days']} days\n")
+        self.stdout.write(f"{'policy':<20}{'mean wait h':>12}{'p95 wait h':>12}{'fairness':>10}{'preempted':>11}{'unserved':>10}")
+        for policy in policies:
+            result = simulate(tickets, policy, initial_usage)
+            self.stdout.write(
+                f"{policy:<20}{result['mean_wait_hours']:>12}{result['p95_wait_hours']:>12}"
+                f"{result['fairness']:>10}{result['preemptions']:>11}{result['unserved']:>10}"
+            )
+            if options['per_user']:
+                for user, stats in sorted(result['users'].items()):
+                    self.stdout.write(f"    {user:<16} served {stats['served_hours']}h, mean wait {stats['mean_wait_hours']}h")
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:01
+
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Model changes that were made without a migration before 0003_port_lease."""
+
+    dependencies = [
+        ('core', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='can_user_start',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='framework',
+            field=models.CharField(blank=True, choices=[('tensorflow', 'TensorFlow'), ('pytorch', 'PyTorch')], max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='aimodel',
+            name='model_file',
+            field=models.FileField(upload_to=core.models.user_model_path),
+        ),
+        migrations.AlterField(
+            model_name='dockercontainer',
+            name='dockerfile',
+            field=models.FileField(upload_to=core.models.user_dockerfile_path),
+        ),
+        migrations.AlterField(
+            model_name='userfile',
+            name='file',
+            field=models.FileField(upload_to=core.models.user_file_path),
+        ),
+        migrations.CreateModel(
+            name='ContainerSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('active', models.BooleanField(default=True)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='core.dockercontainer')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_model_drift'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortLease',
+            fields=[
+                ('port', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('holder', models.CharField(blank=True, max_length=255)),
+                ('leased_at', models.DateTimeField(auto_now_add=True)),
+                ('container', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='port_lease', to='core.dockercontainer')),
+            ],
+        ),
+    ]
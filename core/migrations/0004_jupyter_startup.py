@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_port_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JupyterStartup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('ready_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('succeeded', models.BooleanField(null=True)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='startups', to='core.dockercontainer')),
+            ],
+            options={
+                'ordering': ['-requested_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_jupyter_startup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DockerHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('base_url', models.CharField(blank=True, max_length=255)),
+                ('public_address', models.CharField(blank=True, max_length=255)),
+                ('enabled', models.BooleanField(default=True)),
+                ('reachable', models.BooleanField(default=True)),
+                ('cpu_total', models.FloatField(default=0)),
+                ('mem_total_mb', models.PositiveIntegerField(default=0)),
+                ('free_cpu', models.FloatField(default=0)),
+                ('free_mem_mb', models.IntegerField(default=0)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='host',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='containers', to='core.dockerhost'),
+        ),
+    ]
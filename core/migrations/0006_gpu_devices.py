@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_docker_host'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='gpu_devices',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_gpu_devices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='cpuset_cpus',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='dockercontainer',
+            name='cpuset_mems',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_cpuset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='containerschedule',
+            index=models.Index(fields=['active', 'start_datetime', 'end_datetime'], name='schedule_active_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='containerschedule',
+            index=models.Index(fields=['container', 'start_datetime'], name='schedule_container_start_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_scheduler_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=255)),
+                ('kind', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('partial', 'Some containers failed'), ('failed', 'Failed'), ('missed', 'Missed')], max_length=10)),
+                ('scheduled_for', models.DateTimeField()),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('containers_ok', models.PositiveIntegerField(default=0)),
+                ('containers_failed', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-scheduled_for'],
+                'indexes': [models.Index(fields=['scheduled_for'], name='job_run_scheduled_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_file_transfers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiskUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('files', models.PositiveIntegerField(default=0)),
+                ('directories', models.PositiveIntegerField(default=0)),
+                ('breakdown', models.JSONField(default=dict)),
+                ('scanned_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='disk_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 import os
+import uuid
 from django.db import models
 from users.models import CustomUser
 from os.path import basename
@@ -18,6 +19,30 @@ def user_model_path(instance, filename):
 def user_dockerfile_path(instance, filename):
     return f"user_{instance.user.id}_{instance.user.username}/{filename}"
 
+class DockerHost(models.Model):
+    """A Docker engine user containers can be placed on.
+
+    Capacity and free resources are refreshed by ``core.hosts`` from the
+    engine and the limits of containers placed on it.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    base_url = models.CharField(max_length=255, blank=True)  # blank: local engine from the environment
+    public_address = models.CharField(max_length=255, blank=True)  # used in Jupyter URLs
+    enabled = models.BooleanField(default=True)
+    reachable = models.BooleanField(default=True)
+    cpu_total = models.FloatField(default=0)
+    mem_total_mb = models.PositiveIntegerField(default=0)
+    free_cpu = models.FloatField(default=0)
+    free_mem_mb = models.IntegerField(default=0)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class DockerContainer(models.Model):
     STATUS_CHOICES = [
         ('building', 'Building'),
@@ -27,6 +52,7 @@ class DockerContainer(models.Model):
     ]
     
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='containers')
+    host = models.ForeignKey(DockerHost, null=True, blank=True, on_delete=models.SET_NULL, related_name='containers')
     container_id = models.CharField(max_length=64, blank=True)
     can_user_start = models.BooleanField(default=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='building')
@@ -42,6 +68,9 @@ class DockerContainer(models.Model):
     resource_limits = models.JSONField(default=dict)
     image_name = models.CharField(max_length=255, blank=True)
     port_bindings = models.JSONField(default=dict)
+    gpu_devices = models.JSONField(default=list, blank=True)  # assigned GPU UUIDs
+    cpuset_cpus = models.CharField(max_length=255, blank=True)  # e.g. "4-7"
+    cpuset_mems = models.CharField(max_length=64, blank=True)  # NUMA nodes of cpuset_cpus
     framework = models.CharField(max_length=20, choices=[('tensorflow', 'TensorFlow'), ('pytorch', 'PyTorch')], blank=True, null=True)
     
     class Meta:
@@ -58,9 +87,57 @@ class DockerContainer(models.Model):
         return f"{self.user.username}'s container ({self.status})"
 
 
+class JupyterStartup(models.Model):
+    """One start/resume of a Jupyter container and how long it took to answer."""
+    container = models.ForeignKey(DockerContainer, on_delete=models.CASCADE, related_name='startups')
+    requested_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    succeeded = models.BooleanField(null=True)  # None while still probing
+
+    class Meta:
+        ordering = ['-requested_at']
+
+    @property
+    def seconds_to_ready(self):
+        if self.ready_at:
+            return (self.ready_at - self.requested_at).total_seconds()
+        return None
+
+    def __str__(self):
+        return f"{self.container} startup at {self.requested_at}"
+
+
+class PortLease(models.Model):
+    """A host port handed out to a Jupyter container.
+
+    The port is the primary key, so two workers can never lease the same one.
+    Leases are dropped with their container; unattached leases are reclaimed
+    by ``core.ports.PortAllocator.reclaim``.
+    """
+    port = models.PositiveIntegerField(primary_key=True)
+    container = models.OneToOneField(DockerContainer, null=True, blank=True, on_delete=models.CASCADE, related_name='port_lease')
+    holder = models.CharField(max_length=255, blank=True)  # docker container name while unattached
+    leased_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.port} -> {self.container_id or self.holder or 'unattached'}"
+
+
+class Blob(models.Model):
+    """Content stored once by ``core.blobs``; user paths are hardlinks to it."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
 class UserFile(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='user_files')
     file = models.FileField(upload_to=user_file_path)
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name='user_files')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -96,6 +173,7 @@ class AIModel(models.Model):
     name = models.CharField(max_length=100)
     framework = models.CharField(max_length=20, choices=FRAMEWORKS)
     model_file = models.FileField(upload_to=user_model_path)
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name='ai_models')
     created_at = models.DateTimeField(auto_now_add=True)
     file_type = 'models'  # Used in upload path
     
@@ -129,9 +207,223 @@ class ContainerSchedule(models.Model):
     end_datetime = models.DateTimeField()
     active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # overlap lookups: active=True AND start < :end AND end > :start
+            models.Index(fields=['active', 'start_datetime', 'end_datetime'], name='schedule_active_range_idx'),
+            models.Index(fields=['container', 'start_datetime'], name='schedule_container_start_idx'),
+        ]
+
     def is_now_in_schedule(self):
         now = timezone.now()
         return self.start_datetime <= now <= self.end_datetime
 
     def __str__(self):
-        return f"{self.container.user.username} | {self.start_datetime} - {self.end_datetime}"
\ No newline at end of file
+        return f"{self.container.user.username} | {self.start_datetime} - {self.end_datetime}"
+
+class RecurringSchedule(models.Model):
+    """A repeating exclusive window, expanded on demand by ``core.recurrence``."""
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+
+    container = models.ForeignKey(DockerContainer, on_delete=models.CASCADE, related_name='recurring_schedules')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveSmallIntegerField(default=1)  # every n days / weeks
+    weekdays = models.JSONField(default=list, blank=True)  # 0 = Monday; weekly rules only
+    start_time = models.TimeField()
+    duration = models.DurationField()
+    first_date = models.DateField()
+    until = models.DateField(null=True, blank=True)  # inclusive
+    exceptions = models.JSONField(default=list, blank=True)  # ISO dates that are skipped
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.container.user.username} | {self.frequency} from {self.first_date} at {self.start_time}"
+
+class GpuTimeRequest(models.Model):
+    """A request for an exclusive GPU window, granted by ``core.fairshare``."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('granted', 'Granted'),
+        ('preempted', 'Preempted'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='gpu_requests')
+    container = models.ForeignKey(DockerContainer, on_delete=models.CASCADE, related_name='gpu_requests')
+    duration = models.DurationField()
+    earliest_start = models.DateTimeField()
+    # Kept when the remainder of a preempted window is re-queued
+    requested_at = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    schedule = models.OneToOneField(
+        ContainerSchedule, null=True, blank=True, on_delete=models.SET_NULL, related_name='gpu_request'
+    )
+    granted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['requested_at']
+        indexes = [models.Index(fields=['status', 'requested_at'], name='gpu_request_status_idx')]
+
+    def __str__(self):
+        return f"{self.user.username} | {self.duration} ({self.status})"
+
+class SchedulerLease(models.Model):
+    """Named lease / lock row: the ``core.service`` leader lease (whoever holds
+    it runs the scheduler), the booking lock of ``core.bookings`` and the
+    refill lock of ``core.warm_pool``."""
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=255, blank=True, default='')
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.holder or '-'} until {self.expires_at}"
+
+class JobRun(models.Model):
+    """One scheduler job execution, as recorded by ``core.telemetry``."""
+    STATUS_CHOICES = [
+        ('ok', 'OK'),
+        ('partial', 'Some containers failed'),
+        ('failed', 'Failed'),
+        ('missed', 'Missed'),
+    ]
+
+    job_id = models.CharField(max_length=255)
+    kind = models.CharField(max_length=100)  # job id without pks / timestamps
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    scheduled_for = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)  # seconds
+    containers_ok = models.PositiveIntegerField(default=0)
+    containers_failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-scheduled_for']
+        indexes = [models.Index(fields=['scheduled_for'], name='job_run_scheduled_idx')]
+
+    @property
+    def lateness(self):
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.scheduled_for).total_seconds()
+
+    def __str__(self):
+        return f"{self.job_id} @ {self.scheduled_for} ({self.status})"
+
+class UploadSession(models.Model):
+    """A resumable upload (``core.uploads``); chunks are written straight to ``path``."""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    path = models.CharField(max_length=500)  # storage name, relative to MEDIA_ROOT
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    expected_sha256 = models.CharField(max_length=64, blank=True)  # from the client, checked on completion
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    extract = models.BooleanField(default=False)  # unpack into the workspace once complete (archives only)
+    user_file = models.OneToOneField(UserFile, null=True, blank=True, on_delete=models.SET_NULL, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='upload_status_idx')]
+
+    def __str__(self):
+        return f"{self.user.username} | {self.filename} {self.offset}/{self.size} ({self.status})"
+
+
+class ExtractionJob(models.Model):
+    """Unpacking of an uploaded archive into the workspace (``core.extraction``)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='extractions')
+    user_file = models.ForeignKey(UserFile, null=True, blank=True, on_delete=models.SET_NULL, related_name='extractions')
+    archive = models.CharField(max_length=500)  # storage name, relative to MEDIA_ROOT
+    destination = models.CharField(max_length=500, blank=True)  # relative to the workspace, set once started
+    delete_archive = models.BooleanField(default=False)  # drop the uploaded archive once extracted
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    files = models.PositiveIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)  # links, devices and names outside the destination
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='extraction_status_idx')]
+
+    def __str__(self):
+        return f"{self.user.username} | {os.path.basename(self.archive)} ({self.status})"
+
+
+class FileTransfer(models.Model):
+    """A background copy or move of workspace paths (``core.transfers``)."""
+    ACTION_CHOICES = [
+        ('copy', 'Copy'),
+        ('move', 'Move'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='transfers')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    sources = models.JSONField(default=list)  # paths relative to the workspace
+    destination = models.CharField(max_length=500, blank=True)  # folder, relative to the workspace
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total_files = models.PositiveIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    files_done = models.PositiveIntegerField(default=0)
+    bytes_done = models.BigIntegerField(default=0)
+    shared = models.PositiveIntegerField(default=0)  # copies made as reflinks / hardlinks, moves made as renames
+    created = models.JSONField(default=list)  # top-level paths written, removed if a copy fails
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='transfer_status_idx')]
+
+    def __str__(self):
+        return f"{self.user.username} | {self.action} {len(self.sources)} items to {self.destination or '/'} ({self.status})"
+
+
+class DiskUsage(models.Model):
+    """Size of a user's workspace, kept current by ``core.disk_usage``."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='disk_usage')
+    bytes = models.BigIntegerField(default=0)  # hardlinked files counted once
+    files = models.PositiveIntegerField(default=0)
+    directories = models.PositiveIntegerField(default=0)
+    breakdown = models.JSONField(default=dict)  # top-level workspace folder -> bytes
+    scanned_at = models.DateTimeField(null=True, blank=True)
+
+    def percent_of(self, limit_mb: int) -> float:
+        return round(self.bytes / (limit_mb * 1024 * 1024) * 100, 1) if limit_mb else 0.0
+
+    def __str__(self):
+        return f"{self.user.username} | {self.bytes} bytes in {self.files} files"
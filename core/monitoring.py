@@ -1,18 +1,16 @@
 import psutil
 import docker
-from docker.errors import DockerException
 import subprocess
+from .docker_utils import docker_manager
+from .hosts import is_remote
 from .models import DockerContainer
 import os
 import pynvml  # ✅ เพิ่มการ import
 
-try:
-    docker_client = docker.from_env()
-except DockerException:
-    docker_client = None
-
 
 def get_system_stats():
+    # This machine's figures, so its GPUs are found through the local engine
+    docker_client = docker_manager.client
     cpu_percent = psutil.cpu_percent(interval=1)
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage('/')
@@ -80,11 +78,11 @@ def get_all_child_pids(pid):
 
 
 def get_user_container_stats(container_id):
-    if not docker_client:
-        return None
-
     try:
-        container = DockerContainer.objects.get(container_id=container_id)
+        container = DockerContainer.objects.select_related('host').get(container_id=container_id)
+        docker_client = docker_manager.hosts.client_for(container)
+        if not docker_client:
+            return None
         user = getattr(container, 'active_user', None)
         docker_container = docker_client.containers.get(container_id)
         stats = docker_container.stats(stream=False)
@@ -104,27 +102,29 @@ def get_user_container_stats(container_id):
         if user and user.cpu_limit > 0:
             cpu_percent = cpu_percent / user.cpu_limit
 
-        # 🎯 GPU Memory usage
+        # 🎯 GPU Memory usage (NVML and /proc only see containers on this machine)
         gpu_memory_mb = 0
-        try:
-            inspect = docker_container.attrs
-            pid_host = inspect["State"]["Pid"]
-            pids = get_all_child_pids(pid_host) if pid_host else []
-
-            pynvml.nvmlInit()
-            handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-
-            processes = pynvml.nvmlDeviceGetComputeRunningProcesses(handle)
-            for proc in processes:
-                if proc.pid in pids:
-                    used_memory = getattr(proc, 'usedGpuMemory', 0)
-                    gpu_memory_mb += used_memory // (1024 * 1024)
-
-            pynvml.nvmlShutdown()
-
-        except Exception as e:
-            print(f"[GPU] Error using pynvml: {e}")
-            gpu_memory_mb = 0
+        if not is_remote(container.host):
+            try:
+                inspect = docker_container.attrs
+                pid_host = inspect["State"]["Pid"]
+                pids = get_all_child_pids(pid_host) if pid_host else []
+
+                pynvml.nvmlInit()
+                # Containers are assigned specific cards, so look at all of them
+                for index in range(pynvml.nvmlDeviceGetCount()):
+                    handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                    processes = pynvml.nvmlDeviceGetComputeRunningProcesses(handle)
+                    for proc in processes:
+                        if proc.pid in pids:
+                            used_memory = getattr(proc, 'usedGpuMemory', 0) or 0
+                            gpu_memory_mb += used_memory // (1024 * 1024)
+
+                pynvml.nvmlShutdown()
+
+            except Exception as e:
+                print(f"[GPU] Error using pynvml: {e}")
+                gpu_memory_mb = 0
 
         return {
             'cpu_percent': round(cpu_percent, 2),
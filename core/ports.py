@@ -0,0 +1,142 @@
+import logging
+import random
+import socket
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DockerContainer, PortLease
+
+logger = logging.getLogger(__name__)
+
+# An unattached lease older than this is assumed to belong to a start that
+# crashed between leasing the port and saving the container row.
+UNATTACHED_TTL = timedelta(minutes=10)
+# Holder of leases on ports found busy on the host. Docker names cannot
+# start with '(', so reclaim() never mistakes it for a live container and
+# the port is retried once the lease expires.
+BUSY_HOLDER = '(busy)'
+
+
+class PortAllocator:
+    """Hands out host ports from ``JUPYTER_PORT_RANGE`` using DB leases.
+
+    Allocation inserts a ``PortLease`` row for a random port in the range;
+    the primary key makes the insert the atomic claim across processes, so
+    the expected cost is O(1) while the range is not nearly full. Release is
+    a single-row delete.
+    """
+
+    random_attempts = 16
+
+    def __init__(self, port_range=None):
+        self._port_range = port_range
+
+    @property
+    def port_range(self):
+        return self._port_range or settings.JUPYTER_PORT_RANGE
+
+    def _is_bindable(self, port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind(('', port))
+            except OSError:
+                return False
+        return True
+
+    def _try_lease(self, port: int, holder: str) -> bool:
+        try:
+            with transaction.atomic():
+                PortLease.objects.create(port=port, holder=holder)
+        except IntegrityError:
+            return False
+
+        if not self._is_bindable(port):
+            # Used by something outside our control; keep it leased so
+            # nobody retries it until reclaim() expires the lease.
+            logger.warning(f"[Ports] Port {port} is busy on the host; skipping")
+            PortLease.objects.filter(port=port).update(holder=BUSY_HOLDER)
+            return False
+        return True
+
+    def _free_ports(self) -> Iterable[int]:
+        low, high = self.port_range
+        leased = set(PortLease.objects.filter(port__gte=low, port__lte=high).values_list('port', flat=True))
+        free = [p for p in range(low, high + 1) if p not in leased]
+        random.shuffle(free)
+        return free
+
+    def allocate(self, holder: str = '') -> Optional[int]:
+        low, high = self.port_range
+        for _ in range(self.random_attempts):
+            port = random.randint(low, high)
+            if self._try_lease(port, holder):
+                return port
+
+        # Range is crowded: fall back to the exact free set.
+        for port in self._free_ports():
+            if self._try_lease(port, holder):
+                return port
+
+        logger.error(f"[Ports] No free port left in {low}-{high}")
+        return None
+
+    def attach(self, port: int, container: DockerContainer, holder: str = ''):
+        PortLease.objects.filter(container=container).exclude(port=port).delete()
+        PortLease.objects.filter(port=port).update(container=container, holder=holder)
+
+    def release(self, port: Optional[int]):
+        if port is not None:
+            PortLease.objects.filter(port=port).delete()
+
+    def reclaim(self, live_names: Optional[Iterable[str]] = None) -> int:
+        """Drop stale unattached leases and backfill leases for legacy rows.
+
+        ``live_names`` are names of containers that still exist on the daemon;
+        unattached leases held by one of them (e.g. warm pool containers) are
+        kept regardless of age. Leases on busy ports always expire.
+        """
+        stale = PortLease.objects.filter(
+            container__isnull=True,
+            leased_at__lt=timezone.now() - UNATTACHED_TTL
+        )
+        if live_names is not None:
+            stale = stale.exclude(holder__in=list(live_names))
+        else:
+            stale = stale.filter(holder__in=['', BUSY_HOLDER])
+        removed, _ = stale.delete()
+
+        unleased = DockerContainer.objects.filter(
+            jupyter_port__isnull=False, port_lease__isnull=True
+        ).values_list('id', 'jupyter_port')
+        PortLease.objects.bulk_create(
+            [PortLease(port=port, container_id=cid) for cid, port in unleased],
+            ignore_conflicts=True
+        )
+
+        if removed:
+            logger.info(f"[Ports] Reclaimed {removed} stale port leases")
+        return removed
+
+
+port_allocator = PortAllocator()
+
+
+def reclaim_port_leases():
+    """Scheduler entry point."""
+    from .docker_utils import docker_manager
+    hosts = docker_manager.hosts
+    engine_hosts = hosts.engine_hosts()
+    live_names = [] if engine_hosts else None
+    for host in engine_hosts:
+        try:
+            live_names += [c.name for c in hosts.client(host).containers.list(all=True)]
+        except Exception as e:
+            # Without every engine's names a live holder could look stale
+            logger.error(f"[Ports] Could not list containers on {host.name if host else 'local'}: {e}")
+            live_names = None
+            break
+    port_allocator.reclaim(live_names)
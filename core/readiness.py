@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DockerContainer, JupyterStartup
+
+logger = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = 2.0  # connect and first-line read, per probe
+
+
+def notification_group(user_id: int) -> str:
+    return f"notifications_user_{user_id}"
+
+
+async def notify_user(user_id: int, payload: dict):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        await channel_layer.group_send(notification_group(user_id), {'type': 'notify', 'payload': payload})
+    except Exception as e:
+        logger.error(f"[Readiness] Could not notify user {user_id}: {e}")
+
+
+async def jupyter_answers(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> bool:
+    """True once Jupyter's unauthenticated ``/api`` endpoint returns 200."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        writer.write(f"GET /api HTTP/1.0\r\nHost: {host}:{port}\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        return status_line.split(b' ')[1:2] == [b'200']
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+@database_sync_to_async
+def _finish(startup_id: int, attempts: int, succeeded: bool):
+    JupyterStartup.objects.filter(id=startup_id).update(
+        attempts=attempts,
+        succeeded=succeeded,
+        ready_at=timezone.now() if succeeded else None
+    )
+
+
+def probe_deadline() -> timedelta:
+    """How long after ``requested_at`` a probe has certainly given up:
+    ``TIMEOUT`` plus the last backoff sleep and one probe's own timeouts."""
+    cfg = settings.JUPYTER_READINESS
+    return timedelta(seconds=cfg['TIMEOUT'] + cfg['MAX_DELAY'] + 2 * PROBE_TIMEOUT)
+
+
+def still_probing(startup: JupyterStartup) -> bool:
+    """False once the probe finished, or once it would have: a worker that
+    died mid-probe leaves ``succeeded`` unset for good."""
+    return startup.succeeded is None and timezone.now() - startup.requested_at < probe_deadline()
+
+
+def expire_startups() -> int:
+    """Scheduler entry point: mark startups whose probe went away as failed."""
+    expired = JupyterStartup.objects.filter(
+        succeeded__isnull=True, requested_at__lt=timezone.now() - probe_deadline()
+    ).update(succeeded=False)
+    if expired:
+        logger.warning(f"[Readiness] Marked {expired} abandoned startup probes as failed")
+    return expired
+
+
+class ReadinessProber:
+    """Polls newly started notebooks and tells the browser when they answer.
+
+    All probes share one event loop on a daemon thread, so a probe costs a
+    coroutine rather than a thread or a request from a refreshing browser.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='jupyter-readiness', daemon=True).start()
+            return self._loop
+
+    def watch(self, db_container: DockerContainer, url: str, host: Optional[str] = None):
+        """Start probing ``db_container``'s Jupyter port in the background."""
+        if not db_container.jupyter_port:
+            return None
+        startup = JupyterStartup.objects.create(container=db_container)
+        host = host or settings.JUPYTER_READINESS['HOST']
+        return asyncio.run_coroutine_threadsafe(
+            self.probe(startup.id, db_container.user_id, host, db_container.jupyter_port, url),
+            self._ensure_loop()
+        )
+
+    async def probe(self, startup_id: int, user_id: int, host: str, port: int, url: str) -> bool:
+        cfg = settings.JUPYTER_READINESS
+        started = time.monotonic()
+        delay = cfg['INITIAL_DELAY']
+        attempts = 0
+
+        await notify_user(user_id, {'type': 'jupyter.starting'})
+        while time.monotonic() - started < cfg['TIMEOUT']:
+            attempts += 1
+            if await jupyter_answers(host, port):
+                seconds = round(time.monotonic() - started, 2)
+                await _finish(startup_id, attempts, True)
+                await notify_user(user_id, {'type': 'jupyter.ready', 'url': url, 'seconds': seconds})
+                logger.info(f"[Readiness] Jupyter on port {port} ready after {seconds}s ({attempts} probes)")
+                return True
+            await notify_user(user_id, {'type': 'jupyter.progress', 'attempts': attempts})
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, cfg['MAX_DELAY'])
+
+        await _finish(startup_id, attempts, False)
+        await notify_user(user_id, {'type': 'jupyter.failed'})
+        logger.warning(f"[Readiness] Jupyter on port {port} not ready after {cfg['TIMEOUT']}s")
+        return False
+
+
+readiness_prober = ReadinessProber()
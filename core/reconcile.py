@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Q
+
+from .docker_utils import LABEL_MANAGED, LABEL_POOL, docker_manager
+from .hosts import rows_on
+from .models import DockerContainer, DockerHost
+
+logger = logging.getLogger(__name__)
+
+
+def _name(container) -> str:
+    names = container.attrs.get('Names') or ['']
+    return names[0].lstrip('/')
+
+
+def _is_idle_pool_container(container) -> bool:
+    labels = container.attrs.get('Labels') or {}
+    return LABEL_POOL in labels and os.path.isdir(docker_manager.warm_pool._slot_path(_name(container)))
+
+
+def _unchanged(rows: Iterable[DockerContainer], *fields: str) -> Q:
+    """Rows still as they were read: same container (not recreated meanwhile)
+    and, with ``fields``, the same values."""
+    return reduce(or_, (Q(id=row.id, container_id=row.container_id,
+                          **{name: getattr(row, name) for name in fields}) for row in rows))
+
+
+def reconcile(client=None, host: Optional[DockerHost] = None) -> Optional[Dict[str, int]]:
+    """Bring the rows placed on ``host`` in line with its daemon in one pass.
+
+    One labelled ``containers.list`` call and one query over all rows; fixes
+    are written in bulk, and only to rows nobody changed since they were read:
+
+    * status drift  -> rows take the engine's status
+    * missing       -> rows whose container is gone are deleted
+    * orphans       -> managed containers without a row are logged, and
+                       removed when ``RECONCILE['REMOVE_ORPHANS']`` is set
+    """
+    client = client or docker_manager.hosts.client(host)
+    if not client:
+        return None
+
+    cfg = settings.RECONCILE
+    now = time.time()
+
+    # Rows first: a container created after this query shows up as an orphan
+    # (covered by the grace period) rather than a row being deleted.
+    rows = list(rows_on(host).exclude(container_id=''))
+    try:
+        listed = client.containers.list(all=True, sparse=True, filters={'label': LABEL_MANAGED})
+    except Exception as e:
+        logger.error(f"[Reconcile] Could not list containers on {host or 'local'}: {e}")
+        return None
+    by_id = {c.id: c for c in listed}
+
+    missing_rows = [row for row in rows if row.container_id not in by_id]
+    if missing_rows:
+        # Containers created before labels were introduced are not in the
+        # filtered listing; look them up once before deciding they're gone.
+        try:
+            for c in client.containers.list(all=True, sparse=True):
+                by_id.setdefault(c.id, c)
+        except Exception as e:
+            logger.error(f"[Reconcile] Could not list unlabelled containers: {e}")
+            return None
+        missing_rows = [row for row in rows if row.container_id not in by_id]
+
+    drifted = defaultdict(list)  # engine status -> rows
+    for row in rows:
+        container = by_id.get(row.container_id)
+        if container is not None and row.status != container.status:
+            drifted[container.status].append(row)
+    changed = 0
+    for status, status_rows in drifted.items():
+        changed += DockerContainer.objects.filter(_unchanged(status_rows, 'status')).update(status=status)
+
+    missing = 0
+    if missing_rows:
+        _, deleted = DockerContainer.objects.filter(_unchanged(missing_rows)).delete()
+        missing = deleted.get(DockerContainer._meta.label, 0)
+        logger.warning(f"[Reconcile] Removed {missing} rows whose container no longer exists")
+
+    known = {row.container_id for row in rows}
+    orphans = [
+        c for c in listed
+        if c.id not in known
+        and not _is_idle_pool_container(c)
+        and now - c.attrs.get('Created', now) > cfg['ORPHAN_GRACE']
+    ]
+    for container in orphans:
+        if cfg.get('REMOVE_ORPHANS'):
+            try:
+                container.remove(force=True)
+                logger.warning(f"[Reconcile] Removed orphan container {_name(container)}")
+            except Exception as e:
+                logger.error(f"[Reconcile] Failed to remove orphan {_name(container)}: {e}")
+        else:
+            logger.warning(f"[Reconcile] Orphan container {_name(container)} has no database row")
+
+    summary = {'status': changed, 'missing': missing, 'orphans': len(orphans)}
+    if any(summary.values()):
+        logger.info(f"[Reconcile] {summary}")
+    return summary
+
+
+def reconcile_containers():
+    """Scheduler entry point: the local engine, then each remote host."""
+    reconcile()
+    for host in docker_manager.hosts.remote_hosts():
+        reconcile(host=host)
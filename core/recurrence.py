@@ -0,0 +1,76 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ContainerSchedule, RecurringSchedule
+
+# Open-ended rules are searched at most this far ahead for a next occurrence
+MAX_LOOKAHEAD_DAYS = 366
+
+
+def _at(day: date, moment: time) -> datetime:
+    value = datetime.combine(day, moment)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def day_start(day: date) -> datetime:
+    return _at(day, time.min)
+
+
+def _matches(rule: RecurringSchedule, day: date) -> bool:
+    if rule.frequency == 'daily':
+        return (day - rule.first_date).days % rule.interval == 0
+    weekdays = rule.weekdays or [rule.first_date.weekday()]
+    if day.weekday() not in weekdays:
+        return False
+    first_monday = rule.first_date - timedelta(days=rule.first_date.weekday())
+    return ((day - first_monday).days // 7) % rule.interval == 0
+
+
+def occurrences(rule: RecurringSchedule, start: datetime, end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """Occurrences of ``rule`` overlapping ``[start, end)``.
+
+    Only days inside the window are visited, so the cost depends on the
+    window, not on how long the rule runs.
+    """
+    day = max(rule.first_date, (start - rule.duration).date())
+    last = end.date() if rule.until is None else min(end.date(), rule.until)
+    skipped = set(rule.exceptions)
+    while day <= last:
+        if _matches(rule, day) and day.isoformat() not in skipped:
+            occurrence_start = _at(day, rule.start_time)
+            occurrence_end = occurrence_start + rule.duration
+            if occurrence_start < end and occurrence_end > start:
+                yield occurrence_start, occurrence_end
+        day += timedelta(days=1)
+
+
+def next_occurrence(rule: RecurringSchedule, after: datetime) -> Optional[Tuple[datetime, datetime]]:
+    """The first occurrence still running or starting after ``after``."""
+    cursor = max(after, day_start(rule.first_date))
+    limit = (day_start(rule.until + timedelta(days=1)) if rule.until
+             else cursor + timedelta(days=MAX_LOOKAHEAD_DAYS * rule.interval))
+    step = timedelta(days=7 * rule.interval)
+    while cursor < limit:
+        for occurrence in occurrences(rule, cursor, min(cursor + step, limit)):
+            return occurrence
+        cursor += step
+    return None
+
+
+def expand(rules: Iterable[RecurringSchedule], start: datetime, end: datetime) -> List[ContainerSchedule]:
+    """Occurrences in ``[start, end)`` as unsaved schedules, so they can sit
+    next to real bookings in overlap checks and calendars.
+
+    Each carries its rule as ``.recurring``.
+    """
+    rows = []
+    for rule in rules:
+        for occurrence_start, occurrence_end in occurrences(rule, start, end):
+            row = ContainerSchedule(container=rule.container, start_datetime=occurrence_start,
+                                    end_datetime=occurrence_end, active=rule.active)
+            row.recurring = rule
+            rows.append(row)
+    return rows
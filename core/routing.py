@@ -5,4 +5,6 @@ websocket_urlpatterns = [
     re_path(r'ws/monitoring/$', consumers.MonitoringConsumer.as_asgi()),
     re_path(r'ws/container/(?P<container_id>\w+)/$', consumers.ContainerConsumer.as_asgi()),
     re_path(r'ws/usage/$', consumers.MonitoringConsumer.as_asgi()),
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/logs/(?P<container_pk>\d+)/$', consumers.LogConsumer.as_asgi()),
 ]
\ No newline at end of file
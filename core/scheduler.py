@@ -1,29 +1,210 @@
 import atexit
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from django.conf import settings
+from django.utils import timezone
 from apscheduler.schedulers.background import BackgroundScheduler
 from django_apscheduler.jobstores import DjangoJobStore
-from django_apscheduler.models import DjangoJobExecution
+from .models import ContainerSchedule, RecurringSchedule
+from .telemetry import JOB_EVENTS, record_job_event
+
+scheduler = BackgroundScheduler(job_defaults={
+    'coalesce': True,
+    'misfire_grace_time': settings.SCHEDULER_SERVICE['MISFIRE_GRACE_SECONDS'],
+})
+
+def add_service_jobs():
+    scheduler.add_job(
+        'core.reconcile:reconcile_containers',
+        trigger='interval',
+        seconds=settings.RECONCILE.get('INTERVAL', 15),
+        id='reconcile_containers',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.ports:reclaim_port_leases',
+        trigger='interval',
+        minutes=5,
+        id='port_lease_reclaim',
+        replace_existing=True
+    )
+    if settings.CPU_PINNING.get('ENABLED'):
+        scheduler.add_job(
+            'core.cpus:defragment_cpusets',
+            trigger='interval',
+            seconds=settings.CPU_PINNING.get('DEFRAG_INTERVAL', 300),
+            id='cpuset_defragment',
+            replace_existing=True
+        )
+    scheduler.add_job(
+        'core.telemetry:prune_job_runs',
+        trigger='interval',
+        hours=settings.JOB_TELEMETRY.get('PRUNE_HOURS', 6),
+        id='job_run_prune',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.uploads:expire_uploads',
+        trigger='interval',
+        minutes=settings.UPLOADS.get('CLEANUP_MINUTES', 60),
+        id='upload_expire',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.extraction:recover_extractions',
+        trigger='interval',
+        minutes=settings.EXTRACTION.get('STALE_MINUTES', 15),
+        id='extraction_recover',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.transfers:recover_transfers',
+        trigger='interval',
+        minutes=settings.FILE_TRANSFERS.get('STALE_MINUTES', 15),
+        id='transfer_recover',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.readiness:expire_startups',
+        trigger='interval',
+        seconds=settings.JUPYTER_READINESS.get('TIMEOUT', 120),
+        id='startup_expire',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.disk_usage:scan_disk_usage',
+        trigger='interval',
+        seconds=settings.DISK_USAGE.get('INTERVAL_SECONDS', 300),
+        id='disk_usage_scan',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        'core.hosts:collect_host_stats',
+        trigger='interval',
+        seconds=settings.DOCKER_HOST_STATS_INTERVAL,
+        id='docker_host_stats',
+        replace_existing=True
+    )
+    if settings.FAIR_SHARE.get('ENABLED'):
+        scheduler.add_job(
+            'core.fairshare:run_fair_share',
+            trigger='interval',
+            seconds=settings.FAIR_SHARE.get('INTERVAL', 60),
+            id='fair_share_queue',
+            replace_existing=True
+        )
+    if settings.WARM_POOL.get('ENABLED'):
+        scheduler.add_job(
+            'core.warm_pool:refill_warm_pool',
+            trigger='interval',
+            seconds=settings.WARM_POOL.get('REFILL_INTERVAL', 60),
+            id='warm_pool_refill',
+            replace_existing=True
+        )
+
+# Exclusive-window jobs are named exclusive_{start,end}_<ContainerSchedule pk>,
+# recurring ones recurring_<RecurringSchedule pk>_{start,end}_<occurrence start>
+EXCLUSIVE_PREFIX = 'exclusive_'
+RECURRING_PREFIX = 'recurring_'
+
+
+def _schedule_id(job_id: str) -> Optional[int]:
+    suffix = job_id.rsplit('_', 1)[-1]
+    return int(suffix) if suffix.isdigit() else None
+
+
+def _rule_id(job_id: str) -> Optional[int]:
+    part = job_id[len(RECURRING_PREFIX):].split('_', 1)[0]
+    return int(part) if part.isdigit() else None
+
+
+def job_signature(func_ref: str, trigger, args) -> Tuple:
+    """What makes two jobs equivalent; model instances compare by pk."""
+    return (func_ref, trigger.run_date, tuple(getattr(a, 'pk', a) for a in args))
+
+
+def _sync_jobs(prefix: str, owner_of: Callable[[str], Optional[int]], wanted: Dict[str, Dict],
+               owner_ids: Optional[Set[int]]) -> Dict[str, int]:
+    current = {
+        job.id: job for job in scheduler.get_jobs()
+        if job.id.startswith(prefix)
+        and (owner_ids is None or owner_of(job.id) in owner_ids)
+    }
+
+    counts = {'added': 0, 'modified': 0, 'removed': 0}
+    now = datetime.now(timezone.get_current_timezone())
+    for job_id in current.keys() - wanted.keys():
+        run_at = current[job_id].next_run_time
+        if run_at is not None and run_at <= now:
+            continue  # due or running; the scheduler drops it itself
+        scheduler.remove_job(job_id)
+        counts['removed'] += 1
+    for job_id, spec in wanted.items():
+        job = current.get(job_id)
+        if job is None:
+            scheduler.add_job(id=job_id, **spec)
+            counts['added'] += 1
+        elif job_signature(job.func_ref, job.trigger, job.args) != job_signature(spec['func'], spec['trigger'], spec['args']):
+            # replace_existing updates the stored job, so its executions stay
+            scheduler.add_job(id=job_id, replace_existing=True, **spec)
+            counts['modified'] += 1
+
+    if any(counts.values()):
+        print(f"[Scheduler] {prefix.rstrip('_').capitalize()} jobs synced: {counts}")
+    return counts
+
+
+def sync_schedule_jobs(schedule_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Add, modify or remove only the exclusive-window jobs that differ.
+
+    With ``schedule_ids`` only those schedules' jobs are compared; without,
+    every schedule is (a full rebuild that leaves unchanged jobs alone).
+    Execution history is kept.
+    """
+    from .jobs import schedule_jobs
+
+    schedules = ContainerSchedule.objects.select_related('container__user')
+    if schedule_ids is not None:
+        schedule_ids = set(schedule_ids)
+        schedules = schedules.filter(id__in=schedule_ids)
+    wanted = {}
+    for schedule in schedules:
+        wanted.update(schedule_jobs(schedule))
+    return _sync_jobs(EXCLUSIVE_PREFIX, _schedule_id, wanted, schedule_ids)
+
+
+def sync_recurring_jobs(rule_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Like :func:`sync_schedule_jobs`, for the next occurrence of each recurring rule."""
+    from .jobs import recurring_jobs
+
+    rules = RecurringSchedule.objects.select_related('container__user')
+    if rule_ids is not None:
+        rule_ids = set(rule_ids)
+        rules = rules.filter(id__in=rule_ids)
+    wanted = {}
+    for rule in rules:
+        wanted.update(recurring_jobs(rule))
+    return _sync_jobs(RECURRING_PREFIX, _rule_id, wanted, rule_ids)
 
-scheduler = BackgroundScheduler()
 
 def start_scheduler():
     if not scheduler.running:
         scheduler.add_jobstore(DjangoJobStore(), "default")
+        scheduler.add_listener(record_job_event, JOB_EVENTS)
 
-        from .jobs import schedule_all_containers
-        schedule_all_containers(scheduler)
+        # Start paused so the sync sees the jobs already in the store
+        scheduler.start(paused=True)
+        sync_schedule_jobs()
+        sync_recurring_jobs()
+        add_service_jobs()
+        scheduler.resume()
 
-        scheduler.start()
-        atexit.register(lambda: scheduler.shutdown())
+        atexit.register(lambda: scheduler.shutdown() if scheduler.running else None)
         print("[Scheduler] Scheduler started")
 
 def reload_schedules():
-    scheduler.remove_all_jobs()
-
-    try:
-        DjangoJobExecution.objects.all().delete()
-    except Exception as e:
-        print(f"[Scheduler] Warning: Failed to delete old job executions: {e}")
-
-    from .jobs import schedule_all_containers
-    schedule_all_containers(scheduler)
-    print("[Scheduler] Schedules reloaded")
\ No newline at end of file
+    """Bring every schedule's jobs up to date (edits are normally synced by signals)."""
+    sync_schedule_jobs()
+    sync_recurring_jobs()
+    add_service_jobs()
+    print("[Scheduler] Schedules reloaded")
@@ -0,0 +1,224 @@
+import asyncio
+import fcntl
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+def _identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class DatabaseLock:
+    """Leader lease in a database row; works across hosts.
+
+    The holder renews it every ``RENEW_SECONDS``; once it has not been
+    renewed for ``LEASE_SECONDS`` any standby may take it over.
+    """
+
+    def __init__(self, name: str = 'scheduler', ttl: Optional[int] = None):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl or settings.SCHEDULER_SERVICE['LEASE_SECONDS'])
+        self.identity = _identity()
+
+    def acquire(self) -> bool:
+        now = timezone.now()
+        SchedulerLease.objects.get_or_create(name=self.name, defaults={'expires_at': now})
+        taken = SchedulerLease.objects.filter(name=self.name).filter(
+            Q(expires_at__lte=now) | Q(holder=self.identity)
+        ).update(holder=self.identity, expires_at=now + self.ttl)
+        return taken == 1
+
+    renew = acquire
+
+    def release(self):
+        SchedulerLease.objects.filter(name=self.name, holder=self.identity).update(
+            holder='', expires_at=timezone.now()
+        )
+
+
+class FileLock:
+    """Leader lock as an ``flock`` on a local file; one host only.
+
+    The kernel drops the lock when the holder dies, so there is nothing
+    to renew.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.SCHEDULER_SERVICE['LOCK_FILE']
+        self.identity = _identity()
+        self._handle = None
+
+    def acquire(self) -> bool:
+        if self._handle is not None:
+            return True
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.truncate(0)
+        handle.write(self.identity)
+        handle.flush()
+        self._handle = handle
+        return True
+
+    renew = acquire
+
+    def release(self):
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+
+def make_lock():
+    if settings.SCHEDULER_SERVICE['LOCK'] == 'file':
+        return FileLock()
+    return DatabaseLock()
+
+
+# --- schedule-change signalling ----------------------------------------------
+
+# Set while this process's scheduler is paused after losing the lead; it
+# cannot be shut down and started again, so ``running`` alone won't do.
+_demoted = threading.Event()
+
+
+def _sync_functions():
+    from .scheduler import sync_recurring_jobs, sync_schedule_jobs
+    return {'schedule': sync_schedule_jobs, 'recurring': sync_recurring_jobs}
+
+
+def request_sync(kind: str, ids: Optional[Iterable[int]] = None):
+    """Bring the leader's jobs for ``ids`` of ``kind`` up to date.
+
+    Runs in-process when this process is the leader (a job or the
+    embedded dev scheduler), otherwise the leader is told over the
+    channel layer: the job store is shared, but only the leader's own
+    ``add_job`` wakes its scheduler. Messages missed while no leader is
+    up are covered by the full sync a new leader does on takeover.
+    """
+    from .scheduler import scheduler
+    ids = None if ids is None else list(ids)
+    if scheduler.running and not _demoted.is_set():
+        _sync_functions()[kind](ids)
+        return
+    layer = get_channel_layer()
+    if layer is None:
+        logger.warning(f"[SchedulerService] No channel layer; {kind} change to {ids} not sent")
+        return
+    try:
+        async_to_sync(layer.send)(settings.SCHEDULER_SERVICE['CHANNEL'], {
+            'type': 'scheduler.sync', 'kind': kind, 'ids': ids,
+        })
+    except Exception as e:
+        logger.error(f"[SchedulerService] Could not signal {kind} change: {e}")
+
+
+class SchedulerService:
+    """Runs the scheduler (and with it every periodic collector) in the one
+    process holding the leader lock; the others wait as standbys.
+    """
+
+    def __init__(self, lock=None):
+        self.lock = lock or make_lock()
+        self.leader = False
+        self._started = False
+        self._stop = threading.Event()
+
+    def elect(self) -> bool:
+        """Take, keep or lose leadership, starting or pausing the scheduler."""
+        from .scheduler import reload_schedules, scheduler, start_scheduler
+        close_old_connections()
+        try:
+            holding = self.lock.renew() if self.leader else self.lock.acquire()
+        except Exception as e:
+            logger.error(f"[SchedulerService] Lock check failed: {e}")
+            holding = False
+
+        if holding and not self.leader:
+            self.leader = True
+            logger.info(f"[SchedulerService] {self.lock.identity} is now the leader")
+            if not self._started:
+                start_scheduler()
+                self._started = True
+            else:
+                reload_schedules()
+                scheduler.resume()
+                _demoted.clear()
+        elif not holding and self.leader:
+            self.leader = False
+            logger.warning(f"[SchedulerService] {self.lock.identity} lost leadership; pausing scheduler")
+            _demoted.set()
+            scheduler.pause()
+        return self.leader
+
+    def handle(self, message: dict):
+        if message.get('type') != 'scheduler.sync':
+            return
+        sync = _sync_functions().get(message.get('kind'))
+        if sync is None:
+            logger.warning(f"[SchedulerService] Unknown sync kind: {message.get('kind')}")
+            return
+        sync(message.get('ids'))
+
+    async def serve(self):
+        interval = settings.SCHEDULER_SERVICE['RENEW_SECONDS']
+        channel = settings.SCHEDULER_SERVICE['CHANNEL']
+        layer = get_channel_layer()
+        renew_at = 0.0
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            if loop.time() >= renew_at:
+                await sync_to_async(self.elect)()
+                renew_at = loop.time() + interval
+            if not (self.leader and layer):
+                await asyncio.sleep(max(0.0, renew_at - loop.time()))
+                continue
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), timeout=max(0.1, renew_at - loop.time()))
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                logger.error(f"[SchedulerService] Channel layer receive failed: {e}")
+                await asyncio.sleep(max(0.0, renew_at - loop.time()))
+                continue
+            try:
+                await sync_to_async(self.handle)(message)
+            except Exception as e:
+                logger.error(f"[SchedulerService] Failed to apply {message}: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self):
+        from .scheduler import scheduler
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        if self.leader:
+            self.lock.release()
+            self.leader = False
+
+
+def start_embedded_service():
+    """Run a standby/leader candidate in a daemon thread (``runserver``)."""
+    service = SchedulerService()
+    threading.Thread(target=lambda: asyncio.run(service.serve()), name='scheduler-service', daemon=True).start()
+    return service
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AIModel, ContainerSchedule, RecurringSchedule, UserFile
+
+
+@receiver([post_save, post_delete], sender=ContainerSchedule)
+def sync_schedule_on_change(sender, instance, **kwargs):
+    """Have the scheduler leader re-sync only the edited schedule's jobs once committed."""
+    from .bookings import booking_index
+    from .service import request_sync
+    booking_index.invalidate()
+    transaction.on_commit(booking_index.invalidate)
+    schedule_id = instance.pk  # cleared on the instance after a delete
+    transaction.on_commit(lambda: request_sync('schedule', [schedule_id]))
+
+
+@receiver([post_save, post_delete], sender=RecurringSchedule)
+def sync_recurring_on_change(sender, instance, **kwargs):
+    """Re-register the next occurrence of the edited rule once committed."""
+    from .bookings import booking_index
+    from .service import request_sync
+    booking_index.invalidate()
+    transaction.on_commit(booking_index.invalidate)
+    rule_id = instance.pk
+    transaction.on_commit(lambda: request_sync('recurring', [rule_id]))
+
+
+@receiver(post_delete, sender=UserFile)
+@receiver(post_delete, sender=AIModel)
+def release_blob_on_delete(sender, instance, **kwargs):
+    """Remove deduplicated content once its last file or model is gone."""
+    from .blobs import release
+    digest = instance.blob_id
+    if digest:
+        transaction.on_commit(lambda: release(digest))
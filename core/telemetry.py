@@ -0,0 +1,163 @@
+import logging
+import math
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from django.conf import settings
+from django.utils import timezone
+
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS = EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+
+
+def _local(moment: datetime) -> datetime:
+    """APScheduler hands out aware datetimes; store them the way the project does."""
+    if settings.USE_TZ:
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+    return timezone.make_naive(moment) if timezone.is_aware(moment) else moment
+
+
+def job_kind(job_id: str) -> str:
+    """``exclusive_start_12`` -> ``exclusive_start``; ``recurring_3_end_202501071300`` -> ``recurring_end``."""
+    return '_'.join(part for part in job_id.split('_') if not part.isdigit())
+
+
+class JobTelemetry:
+    """Scheduler listener writing one :class:`JobRun` per execution.
+
+    The submit event gives the actual start; the executed / error event
+    gives the duration and, for exclusive-window transitions, the metrics
+    ``core.jobs`` returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._submitted: Dict[Tuple[str, datetime], datetime] = {}
+
+    def _wanted(self, job_id: str, status: str) -> bool:
+        return status != 'ok' or job_id.startswith(tuple(settings.JOB_TELEMETRY['ALWAYS_RECORD']))
+
+    def listen(self, event):
+        try:
+            if event.code == EVENT_JOB_SUBMITTED:
+                now = timezone.now()
+                with self._lock:
+                    for run_time in event.scheduled_run_times:
+                        self._submitted[(event.job_id, run_time)] = now
+                    if len(self._submitted) > 1000:
+                        cutoff = now - timedelta(days=1)
+                        self._submitted = {k: v for k, v in self._submitted.items() if v > cutoff}
+            elif event.code == EVENT_JOB_MISSED:
+                self.record(event.job_id, event.scheduled_run_time, status='missed')
+            else:
+                with self._lock:
+                    started_at = self._submitted.pop((event.job_id, event.scheduled_run_time), None)
+                error = ''
+                if event.exception is not None:
+                    error = ''.join(traceback.format_exception_only(type(event.exception), event.exception))
+                    if event.traceback:
+                        error += event.traceback
+                self.record(event.job_id, event.scheduled_run_time, started_at=started_at,
+                            retval=event.retval, error=error)
+        except Exception as e:
+            logger.error(f"[Telemetry] Could not record {event}: {e}")
+
+    def record(self, job_id: str, scheduled_for: datetime, started_at: Optional[datetime] = None,
+               retval=None, error: str = '', status: Optional[str] = None) -> Optional[JobRun]:
+        scheduled_for = _local(scheduled_for)
+        metrics = retval if isinstance(retval, dict) else {}
+        containers_ok = metrics.get('ok', 0) or 0
+        containers_failed = metrics.get('failed', 0) or 0
+        if status is None:
+            status = 'failed' if error else ('partial' if containers_failed else 'ok')
+        if not self._wanted(job_id, status):
+            return None
+
+        duration = metrics.get('duration')
+        if metrics.get('start_delay') is not None:
+            started_at = scheduled_for + timedelta(seconds=metrics['start_delay'])
+        if started_at is not None and duration is None and status != 'missed':
+            duration = round((timezone.now() - started_at).total_seconds(), 3)
+
+        return JobRun.objects.create(
+            job_id=job_id[:255],
+            kind=job_kind(job_id)[:100],
+            status=status,
+            scheduled_for=scheduled_for,
+            started_at=started_at,
+            duration=duration,
+            containers_ok=containers_ok,
+            containers_failed=containers_failed,
+            error=error[:4000],
+        )
+
+
+job_telemetry = JobTelemetry()
+
+
+def record_job_event(event):
+    job_telemetry.listen(event)
+
+
+def prune_job_runs() -> int:
+    """Drop runs past ``RETENTION_DAYS`` or beyond ``MAX_ROWS``, and old
+    django_apscheduler executions with them."""
+    from django_apscheduler.models import DjangoJobExecution
+
+    cfg = settings.JOB_TELEMETRY
+    deleted, _ = JobRun.objects.filter(
+        scheduled_for__lt=timezone.now() - timedelta(days=cfg['RETENTION_DAYS'])
+    ).delete()
+    # Past the cap, everything scheduled at or before the first surplus row goes
+    surplus = JobRun.objects.order_by('-scheduled_for').values_list('scheduled_for', flat=True)[cfg['MAX_ROWS']:cfg['MAX_ROWS'] + 1]
+    if surplus:
+        extra, _ = JobRun.objects.filter(scheduled_for__lte=surplus[0]).delete()
+        deleted += extra
+    DjangoJobExecution.objects.delete_old_job_executions(cfg['RETENTION_DAYS'] * 86400)
+    if deleted:
+        logger.info(f"[Telemetry] Pruned {deleted} job runs")
+    return deleted
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def job_run_summary(days: Optional[int] = None) -> Dict:
+    """Lateness percentiles and failure rate over the last ``days``, overall and per kind."""
+    days = days or settings.JOB_TELEMETRY['SUMMARY_DAYS']
+    rows = JobRun.objects.filter(scheduled_for__gte=timezone.now() - timedelta(days=days)).values_list(
+        'kind', 'status', 'scheduled_for', 'started_at'
+    )
+
+    def summarize(entries):
+        lateness = [(started - planned).total_seconds() for _, _, planned, started in entries if started]
+        failed = sum(1 for _, status, _, _ in entries if status != 'ok')
+        return {
+            'runs': len(entries),
+            'failed': failed,
+            'missed': sum(1 for _, status, _, _ in entries if status == 'missed'),
+            'failure_rate': round(failed / len(entries) * 100, 1) if entries else 0.0,
+            'lateness_p50': _percentile(lateness, 50),
+            'lateness_p95': _percentile(lateness, 95),
+            'lateness_max': max(lateness) if lateness else None,
+        }
+
+    rows = list(rows)
+    by_kind = {}
+    for row in rows:
+        by_kind.setdefault(row[0], []).append(row)
+    return {
+        'days': days,
+        'overall': summarize(rows),
+        'kinds': {kind: summarize(entries) for kind, entries in sorted(by_kind.items())},
+    }
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import CustomUser
+from core.archives import ArchiveStream, walk
+from core.models import UserFile
+
+ARCHIVES = {'ZIP_COMPRESSION': 'stored', 'COMPRESS_LEVEL': 1, 'BLOCK_BYTES': 4096}
+
+
+@override_settings(ARCHIVES=ARCHIVES)
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure')
+        self.client.force_login(self.user)
+        self.workspace = os.path.join(self.media, f'user_{self.user.id}_doc')
+        self.results = os.path.join(self.workspace, 'data', 'results')
+        os.makedirs(os.path.join(self.results, 'epoch_1'))
+        os.makedirs(os.path.join(self.results, 'empty'))
+        self.contents = {
+            'results/metrics.csv': b'loss,acc\n0.1,0.9\n',
+            'results/epoch_1/weights.bin': os.urandom(50_000),
+        }
+        for name, data in self.contents.items():
+            with open(os.path.join(self.workspace, 'data', name), 'wb') as out:
+                out.write(data)
+        os.symlink('/etc/passwd', os.path.join(self.results, 'passwd'))
+
+    def test_folder_as_zip(self):
+        response = self.client.get(reverse('download-archive'), {'path': 'data/results'})
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('results.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        for name, data in self.contents.items():
+            self.assertEqual(archive.read(name), data)
+        self.assertIn('results/empty/', archive.namelist())
+        self.assertNotIn('results/passwd', archive.namelist())
+
+    def test_folder_as_tar_gz(self):
+        response = self.client.get(reverse('download-archive'), {'path': 'data/results', 'format': 'tar.gz'})
+
+        with tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content)), mode='r:gz') as archive:
+            for name, data in self.contents.items():
+                self.assertEqual(archive.extractfile(name).read(), data)
+            self.assertTrue(archive.getmember('results/empty').isdir())
+
+    def test_selected_uploads_and_paths(self):
+        upload_dir = os.path.join(self.workspace, 'user_data')
+        os.makedirs(upload_dir)
+        with open(os.path.join(upload_dir, 'report.pdf'), 'wb') as out:
+            out.write(b'%PDF')
+        upload = UserFile.objects.create(user=self.user, file=f'user_{self.user.id}_doc/user_data/report.pdf')
+        other = CustomUser.objects.create_user(username='other', password='secure')
+        foreign = UserFile.objects.create(user=other, file=f'user_{self.user.id}_doc/user_data/report.pdf')
+
+        response = self.client.get(reverse('download-archive'), {
+            'file_id': [upload.id, foreign.id], 'path': 'data/results/metrics.csv',
+        })
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['metrics.csv', 'report.pdf'])
+
+    def test_paths_outside_the_workspace_are_refused(self):
+        self.assertEqual(self.client.get(reverse('download-archive'), {'path': '../../'}).status_code, 400)
+
+    def test_large_members_use_zip64(self):
+        with patch('zipfile.ZIP64_LIMIT', 1000):
+            body = b''.join(ArchiveStream(walk(self.results, 'results'), 'zip'))
+
+        archive = zipfile.ZipFile(io.BytesIO(body))
+        info = archive.getinfo('results/epoch_1/weights.bin')
+        self.assertEqual(info.extract_version, zipfile.ZIP64_VERSION)
+        self.assertEqual(archive.read(info), self.contents['results/epoch_1/weights.bin'])
+
+    def test_output_is_produced_block_by_block(self):
+        chunks = list(ArchiveStream(walk(self.results, 'results'), 'zip'))
+
+        self.assertLessEqual(max(len(c) for c in chunks), ARCHIVES['BLOCK_BYTES'] + 512)
+
+    def test_closing_the_stream_stops_reading(self):
+        stream = ArchiveStream(walk(self.results, 'results'), 'tar.gz')
+        chunks = iter(stream)
+        next(chunks)
+
+        with patch.object(stream, '_read', side_effect=AssertionError("read after close")):
+            chunks.close()
+
+        self.assertEqual(stream.files, 0)
+
+    def test_cancelled_async_stream_sets_flag(self):
+        stream = ArchiveStream(walk(self.results, 'results'), 'zip')
+
+        async def first_chunk_then_disconnect():
+            chunks = stream.__aiter__()
+            await chunks.__anext__()
+            await chunks.aclose()
+
+        asyncio.run(first_chunk_then_disconnect())
+        self.assertTrue(stream.cancelled.is_set())
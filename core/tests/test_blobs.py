@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import CustomUser
+from core.blobs import adopt, blob_path, dedup_report, store
+from core.models import AIModel, Blob, UserFile
+
+BLOB_STORE = {'ENABLED': True, 'DIR': 'blobs', 'MIN_SIZE': 1024}
+
+
+class BlobStoreTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, BLOB_STORE=BLOB_STORE)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.checkpoint = os.urandom(64 * 1024)
+        self.users = [
+            CustomUser.objects.create_user(username=f'student{i}', password='secure', role='bachelor', role_verified=True)
+            for i in range(3)
+        ]
+
+    def upload(self, user, data=None, name='resnet.pt'):
+        return store(UserFile(user=user), 'file', SimpleUploadedFile(name, data or self.checkpoint))
+
+    def test_identical_uploads_share_one_inode(self):
+        files = [self.upload(user) for user in self.users]
+        model = store(AIModel(user=self.users[0], name='resnet', framework='pytorch'), 'model_file',
+                      SimpleUploadedFile('resnet.pt', self.checkpoint))
+
+        self.assertEqual(Blob.objects.count(), 1)
+        inodes = {os.stat(f.file.path).st_ino for f in files} | {os.stat(model.model_file.path).st_ino}
+        self.assertEqual(inodes, {os.stat(blob_path(files[0].blob_id)).st_ino})
+        with open(files[2].file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.checkpoint)
+
+        report = dedup_report()
+        self.assertEqual(report['references'], 4)
+        self.assertEqual(report['saved_bytes'], 3 * len(self.checkpoint))
+        self.assertEqual(report['top'][0]['refs'], 4)
+
+    def test_blob_row_and_reference_commit_together(self):
+        # one transaction: the blob's row lock lasts until the reference exists,
+        # and a failed save leaves no unreferenced blob row behind
+        with patch.object(UserFile, 'save', side_effect=IntegrityError('boom')):
+            with self.assertRaises(IntegrityError):
+                self.upload(self.users[0])
+        self.assertFalse(Blob.objects.exists())
+
+        self.upload(self.users[0])
+        self.assertEqual(Blob.objects.count(), 1)
+
+    def test_blob_is_removed_with_its_last_reference(self):
+        first, second = self.upload(self.users[0]), self.upload(self.users[1])
+        digest = first.blob_id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(blob_path(digest)))
+        self.assertTrue(os.path.exists(second.file.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(blob_path(digest)))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_small_and_distinct_files_are_kept_apart(self):
+        small = self.upload(self.users[0], data=b'tiny', name='notes.txt')
+        other = self.upload(self.users[1], data=os.urandom(4096))
+
+        self.assertIsNone(small.blob)
+        self.assertNotEqual(other.blob_id, self.upload(self.users[2]).blob_id)
+
+    def test_existing_file_is_replaced_by_a_link(self):
+        self.upload(self.users[0])
+        path = os.path.join(self.media, 'legacy.bin')
+        with open(path, 'wb') as out:
+            out.write(self.checkpoint)
+
+        blob = adopt(path)
+
+        self.assertEqual(os.stat(path).st_ino, os.stat(blob_path(blob.sha256)).st_ino)
+
+    def test_multipart_upload_view_hashes_while_receiving(self):
+        user = self.users[0]
+        self.client.force_login(user)
+        # above the in-memory limit, so the hashing temp-file handler takes it
+        data = os.urandom(3 * 1024 * 1024)
+        with self.settings(FILE_UPLOAD_TEMP_DIR=self.media), \
+                patch('core.blobs.hash_file', side_effect=AssertionError("hashed twice")):
+            self.client.post(reverse('file-manager'), {'files': SimpleUploadedFile('big.bin', data)})
+
+        user_file = UserFile.objects.get(user=user)
+        self.assertIsNotNone(user_file.blob)
+        self.assertEqual(user_file.blob.size, len(data))
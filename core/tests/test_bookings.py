@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core import bookings
+from core.bookings import BookingConflict, IntervalTree, book, booking_index, free_slots
+from core.models import ContainerSchedule, DockerContainer
+
+BOOKINGS = {'INDEX_TTL': 30, 'SLOT_ALIGN_MINUTES': 15, 'SEARCH_DAYS': 7, 'MAX_SLOTS': 50, 'MAX_CALENDAR_DAYS': 62}
+
+
+class IntervalTreeTestCase(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        intervals = []
+        for i in range(300):
+            start = rng.randint(0, 1000)
+            intervals.append((start, start + rng.randint(1, 50), i))
+        tree = IntervalTree(intervals)
+
+        for _ in range(200):
+            start = rng.randint(0, 1050)
+            end = start + rng.randint(1, 80)
+            expected = {i for s, e, i in intervals if s < end and e > start}
+            self.assertEqual(set(tree.overlapping(start, end)), expected)
+
+    def test_touching_intervals_do_not_overlap(self):
+        tree = IntervalTree([(0, 10, 'a'), (20, 30, 'b')])
+        self.assertEqual(tree.overlapping(10, 20), [])
+        self.assertEqual(tree.overlapping(9, 21), ['a', 'b'])
+
+
+@override_settings(BOOKINGS=BOOKINGS)
+class BookingTestCase(TestCase):
+    def setUp(self):
+        booking_index.invalidate()
+        self.addCleanup(booking_index.invalidate)
+        self.admin = CustomUser.objects.create_superuser(username='admin', password='secure', email='a@x.io')
+        self.user = CustomUser.objects.create_user(username='doc', password='secure', role='doctoral')
+        self.container = DockerContainer.objects.create(user=self.user, container_id='c1')
+        other = CustomUser.objects.create_user(username='other', password='secure', role='teacher')
+        self.other = DockerContainer.objects.create(user=other, container_id='c2')
+        self.base = (timezone.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    def at(self, hours):
+        return self.base + timedelta(hours=hours)
+
+    def test_container_can_hold_many_bookings(self):
+        book(self.container, self.at(0), self.at(2))
+        book(self.container, self.at(4), self.at(6))
+        self.assertEqual(self.container.schedules.count(), 2)
+
+    def test_overlap_is_rejected_but_editing_own_booking_is_not(self):
+        mine = book(self.container, self.at(0), self.at(2))
+        with self.assertRaises(BookingConflict) as ctx:
+            book(self.other, self.at(1), self.at(3))
+        self.assertEqual(ctx.exception.conflicts, [mine])
+
+        book(self.container, self.at(1), self.at(3), schedule=mine)
+        mine.refresh_from_db()
+        self.assertEqual(mine.start_datetime, self.at(1))
+
+    def test_final_check_runs_under_the_booking_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            book(self.container, self.at(0), self.at(2))
+        sql = [query['sql'] for query in queries]
+        lock = next(i for i, q in enumerate(sql) if q.startswith('UPDATE "core_schedulerlease"'))
+        insert = next(i for i, q in enumerate(sql) if q.startswith('INSERT INTO "core_containerschedule"'))
+        self.assertTrue(any('FROM "core_containerschedule"' in q for q in sql[lock:insert]))
+
+    def test_inactive_bookings_do_not_block(self):
+        book(self.container, self.at(0), self.at(2), active=False)
+        book(self.other, self.at(0), self.at(2))
+
+    def test_free_slots_skip_bookings(self):
+        book(self.container, self.at(0), self.at(2))
+        book(self.other, self.at(3), self.at(4) + timedelta(minutes=5))
+
+        slots = free_slots(timedelta(hours=1), count=3, after=self.at(0))
+
+        self.assertEqual(slots, [
+            (self.at(2), self.at(3)),
+            (self.at(4) + timedelta(minutes=15), self.at(5) + timedelta(minutes=15)),
+            (self.at(5) + timedelta(minutes=15), self.at(6) + timedelta(minutes=15)),
+        ])
+
+    def test_calendar_and_free_slot_endpoints(self):
+        book(self.container, self.at(0), self.at(2))
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('schedule-calendar'), {
+            'start': self.base.date().isoformat(), 'end': (self.base + timedelta(days=1)).date().isoformat()
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['user'] for e in response.json()['events']], ['doc'])
+
+        response = self.client.get(reverse('schedule-free-slots'), {
+            'length': 90, 'count': 1, 'after': self.at(0).isoformat()
+        })
+        self.assertEqual(response.json()['slots'], [{'start': self.at(2).isoformat(), 'end': self.at(3.5).isoformat()}])
+
+        self.assertEqual(self.client.get(reverse('schedule-calendar'), {'start': 'nope'}).status_code, 400)
+
+    def test_schedule_form_adds_a_second_booking(self):
+        book(self.container, self.at(0), self.at(2))
+        self.client.force_login(self.admin)
+        day = self.base.date().isoformat()
+
+        response = self.client.post(reverse('create_schedule', args=[self.user.id]), {
+            'start_date': day, 'start_time': '13:00', 'end_date': day, 'end_time': '14:00', 'active': 'on',
+        })
+
+        self.assertRedirects(response, reverse('superuser-dashboard'), fetch_redirect_response=False)
+        self.assertEqual(ContainerSchedule.objects.filter(container=self.container).count(), 2)
+
+
+@override_settings(BOOKINGS=BOOKINGS)
+@skipUnlessDBFeature('has_select_for_update')  # row locks that make a second writer wait
+class ConcurrentBookingTestCase(TransactionTestCase):
+    def setUp(self):
+        booking_index.invalidate()
+        self.addCleanup(booking_index.invalidate)
+        start = (timezone.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+        self.slot = (start, start + timedelta(hours=2))
+        self.containers = [
+            DockerContainer.objects.create(user=CustomUser.objects.create_user(username=name, password='secure'),
+                                           container_id=name)
+            for name in ('first', 'second')
+        ]
+
+    def test_two_bookings_of_the_same_slot_do_not_both_pass(self):
+        checking = threading.Event()
+        busy_tree = bookings._busy_tree
+        results = {}
+
+        def slow_check(*args, **kwargs):
+            tree = busy_tree(*args, **kwargs)
+            if threading.current_thread().name == 'first':
+                checking.set()
+                time.sleep(0.5)  # the second booking arrives in this window
+            return tree
+
+        def attempt(container):
+            try:
+                book(container, *self.slot)
+                results[container.container_id] = 'booked'
+            except BookingConflict:
+                results[container.container_id] = 'conflict'
+            finally:
+                connection.close()
+
+        with patch('core.bookings._busy_tree', side_effect=slow_check):
+            first = threading.Thread(target=attempt, args=(self.containers[0],), name='first')
+            first.start()
+            checking.wait(5)
+            second = threading.Thread(target=attempt, args=(self.containers[1],), name='second')
+            second.start()
+            first.join()
+            second.join()
+
+        self.assertEqual(results, {'first': 'booked', 'second': 'conflict'})
+        self.assertEqual(ContainerSchedule.objects.filter(active=True).count(), 1)
@@ -0,0 +1,85 @@
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import docker
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+
+from users.models import CustomUser
+from core.bulk import run_bulk_action
+from core.models import DockerContainer
+from core.views import admin_bulk_container_action
+
+
+class BulkActionTestCase(TestCase):
+    def setUp(self):
+        self.rows = []
+        for name in ('alice', 'bob', 'carol'):
+            user = CustomUser.objects.create_user(username=name, password='secure')
+            self.rows.append(DockerContainer.objects.create(user=user, container_id=f'{name}_id', status='running'))
+
+        self.engine = {}
+        for row in self.rows[:2]:
+            container = MagicMock()
+            container.id = row.container_id
+            self.engine[row.container_id] = container
+        self.engine['bob_id'].stop.side_effect = docker.errors.APIError('boom')
+
+        self.client = MagicMock()
+        self.client.containers.list.return_value = list(self.engine.values())
+
+    def test_stop_reports_each_item_and_bulk_updates_successes(self):
+        rows = DockerContainer.objects.select_related('user')
+        events = list(run_bulk_action(rows, 'stop', client=self.client))
+
+        self.client.containers.list.assert_called_once()
+        self.assertEqual(events[-1], {'done': True, 'ok': 1, 'failed': 2})
+        by_user = {e['user']: e for e in events[:-1]}
+        self.assertTrue(by_user['alice']['ok'])
+        self.assertFalse(by_user['bob']['ok'])
+        self.assertIn('not found', by_user['carol']['error'])
+
+        alice = DockerContainer.objects.get(container_id='alice_id')
+        self.assertEqual(alice.status, 'stopped')
+        self.assertFalse(alice.can_user_start)
+        self.assertEqual(DockerContainer.objects.get(container_id='bob_id').status, 'running')
+
+    def test_start_gives_claimed_pool_containers_the_users_mounts(self):
+        recreated = MagicMock()
+        with patch('core.bulk.docker_manager.adopt_pool_container', return_value=recreated) as adopt:
+            events = list(run_bulk_action(DockerContainer.objects.filter(container_id='alice_id'), 'start', client=self.client))
+
+        self.assertEqual(events[-1], {'done': True, 'ok': 1, 'failed': 0})
+        self.assertEqual(adopt.call_args.args[1], self.engine['alice_id'])
+        recreated.start.assert_called_once()
+        self.engine['alice_id'].start.assert_not_called()
+
+    def test_asgi_response_streams_each_event_as_it_happens(self):
+        release = threading.Event()
+        self.engine['bob_id'].stop.side_effect = lambda **kwargs: release.wait(5)
+        request = AsyncRequestFactory().post(reverse('admin-bulk-container-action'), {
+            'action': 'stop', 'container_ids': [row.id for row in self.rows[:2]],
+        })
+        request.user = CustomUser.objects.create_superuser(username='admin', password='secure')
+
+        with patch('core.bulk._client', return_value=self.client):
+            response = admin_bulk_container_action(request)
+            self.assertTrue(response.is_async)
+
+            async def consume():
+                lines = []
+                async for line in response.streaming_content:
+                    lines.append(json.loads(line))
+                    # alice arrives while bob's stop is still blocked
+                    if len(lines) == 1:
+                        self.assertEqual(lines[0]['user'], 'alice')
+                        release.set()
+                return lines
+
+            lines = async_to_sync(consume)()
+
+        self.assertEqual([line.get('user') for line in lines], ['alice', 'bob', None])
+        self.assertEqual(lines[-1], {'done': True, 'ok': 2, 'failed': 0})
+        self.assertEqual(DockerContainer.objects.get(container_id='bob_id').status, 'stopped')
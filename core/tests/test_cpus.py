@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest.mock import MagicMock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from users.models import CustomUser
+from core.cpus import CpuPinner, choose_cpus, format_cpulist, parse_cpulist, read_topology
+from core.models import DockerContainer
+
+
+def fake_sysfs(root, nodes=2, cores_per_node=4):
+    """Write a sysfs tree: ``nodes`` NUMA nodes, two hyperthreads per core.
+
+    Core ``i`` is CPUs ``i`` and ``i + total_cores``, like Linux numbers them.
+    """
+    total = nodes * cores_per_node
+    os.makedirs(os.path.join(root, 'cpu'))
+    with open(os.path.join(root, 'cpu', 'online'), 'w') as f:
+        f.write(f"0-{2 * total - 1}\n")
+    for node in range(nodes):
+        cores = range(node * cores_per_node, (node + 1) * cores_per_node)
+        os.makedirs(os.path.join(root, 'node', f'node{node}'))
+        with open(os.path.join(root, 'node', f'node{node}', 'cpulist'), 'w') as f:
+            f.write(format_cpulist(list(cores) + [c + total for c in cores]) + '\n')
+        for core in cores:
+            for cpu in (core, core + total):
+                topo = os.path.join(root, 'cpu', f'cpu{cpu}', 'topology')
+                os.makedirs(topo)
+                with open(os.path.join(topo, 'thread_siblings_list'), 'w') as f:
+                    f.write(f"{core},{core + total}\n")
+
+
+class TopologyTestCase(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        fake_sysfs(self.root)
+
+    def test_cpulist_round_trip(self):
+        self.assertEqual(parse_cpulist('0-3,8,10-11\n'), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(format_cpulist([11, 0, 1, 2, 3, 8, 10]), '0-3,8,10-11')
+
+    def test_reads_nodes_and_siblings(self):
+        topology = read_topology(self.root, reserved=[0, 8])
+        self.assertEqual(topology.nodes[0], [(1, 9), (2, 10), (3, 11)])
+        self.assertEqual(topology.node_of(12), 1)
+
+    def test_exclusive_prefers_whole_cores_on_the_fullest_fitting_node(self):
+        topology = read_topology(self.root)
+        used = Counter([0, 8, 1])  # node 0: core 0 taken, half of core 1 taken
+        self.assertEqual(choose_cpus(topology, used, 4), [2, 3, 10, 11])
+        self.assertEqual(choose_cpus(topology, used, 6), [4, 5, 6, 12, 13, 14])
+
+    def test_exclusive_spills_across_nodes_only_when_needed(self):
+        topology = read_topology(self.root)
+        used = Counter(range(0, 6))
+        picked = choose_cpus(topology, used, 8)
+        self.assertEqual(len(picked), 8)
+        self.assertEqual({topology.node_of(c) for c in picked}, {0, 1})
+        self.assertIsNone(choose_cpus(topology, used, 8, single_node=True))
+
+    def test_shared_uses_least_loaded_node(self):
+        topology = read_topology(self.root)
+        used = Counter(topology.cpus(0))
+        self.assertEqual(choose_cpus(topology, used, 2, exclusive=False), [4, 12])
+
+
+class CpuPinnerTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        fake_sysfs(self.root)
+        settings = override_settings(CPU_PINNING={
+            'ENABLED': True, 'MODE': 'exclusive', 'SYSFS_ROOT': self.root, 'RESERVED_CPUS': []
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.pinner = CpuPinner()
+
+    def make(self, name, cpus, **fields):
+        user = CustomUser.objects.create_user(username=name, password='secure', cpu_limit=cpus)
+        return user, DockerContainer.objects.create(user=user, container_id=f'{name}_id', status='running', **fields)
+
+    def test_pin_is_kept_across_restarts(self):
+        user, row = self.make('alice', 2)
+        container = MagicMock()
+        self.pinner.pin(row, container, user)
+        container.update.assert_called_once_with(cpuset_cpus='0,8', cpuset_mems='0')
+
+        container.reset_mock()
+        row.refresh_from_db()
+        self.assertEqual(self.pinner.pin(row, container, user), '0,8')
+        container.update.assert_not_called()
+
+    def test_taken_pin_is_replaced_on_start(self):
+        alice, alice_row = self.make('alice', 2, cpuset_cpus='0,8', cpuset_mems='0')
+        bob, bob_row = self.make('bob', 2, cpuset_cpus='0,8', cpuset_mems='0')
+        container = MagicMock()
+        self.pinner.pin(bob_row, container, bob)
+        self.assertEqual(bob_row.cpuset_cpus, '1,9')
+
+    def test_defragment_moves_split_containers_onto_one_node(self):
+        self.make('alice', 4, cpuset_cpus='2-3,10-11', cpuset_mems='0')
+        _, split = self.make('bob', 4, cpuset_cpus='1,4,9,12', cpuset_mems='0-1')
+        client = MagicMock()
+
+        self.assertEqual(self.pinner.defragment(client), 1)
+
+        split.refresh_from_db()
+        self.assertEqual((split.cpuset_cpus, split.cpuset_mems), ('0-1,8-9', '0'))
+        client.containers.get.assert_called_once_with('bob_id')
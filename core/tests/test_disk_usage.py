@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import CustomUser
+from core.disk_usage import DiskUsageScanner, scan_disk_usage
+from core.models import DiskUsage
+
+DISK_USAGE = {'WORKERS': 4, 'INTERVAL_SECONDS': 300, 'RESTAT_HOURS': 24}
+
+
+@override_settings(DISK_USAGE=DISK_USAGE)
+class DiskUsageTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure', storage_limit=1)
+        self.workspace = os.path.join(self.media, f'user_{self.user.id}_doc')
+        self.write('data/set/train.csv', 10_000)
+        self.write('data/set/nested/test.csv', 5_000)
+        self.write('user_data/report.pdf', 2_000)
+        self.write('notes.txt', 100)
+        os.makedirs(os.path.join(self.media, 'blobs'))
+        self.scanner = DiskUsageScanner()
+
+    def path(self, relative):
+        return os.path.join(self.workspace, relative)
+
+    def write(self, relative, size):
+        os.makedirs(os.path.dirname(self.path(relative)), exist_ok=True)
+        with open(self.path(relative), 'wb') as out:
+            out.write(b'x' * size)
+
+    def test_totals_per_user_and_top_folder(self):
+        os.link(self.path('data/set/train.csv'), self.path('user_data/train.csv'))
+        os.link(self.path('data/set/train.csv'), self.path('data/train_copy.csv'))
+        os.symlink('/etc', self.path('data/etc'))
+        other = os.path.join(self.media, 'user_99_(other)', 'models')
+        os.makedirs(other)
+        with open(os.path.join(other, 'weights.bin'), 'wb') as out:
+            out.write(b'w' * 300)
+
+        usages = self.scanner.scan()
+
+        usage = usages[self.user.id]
+        self.assertEqual(usage.bytes, 17_100)  # the hardlinked file counts once
+        self.assertEqual((usage.files, usage.directories), (6, 5))
+        self.assertEqual(usage.breakdown, {'.': 100, 'data': 15_000, 'user_data': 12_000})
+        self.assertEqual(usages[99].bytes, 300)
+        self.assertEqual(set(usages), {self.user.id, 99})
+
+    def test_rescan_lists_only_changed_directories(self):
+        self.scanner.scan()
+        self.assertEqual((self.scanner.listed, self.scanner.reused), (5, 0))
+
+        self.assertEqual(self.scanner.scan()[self.user.id].bytes, 17_100)
+        self.assertEqual((self.scanner.listed, self.scanner.reused), (0, 5))
+
+        self.write('data/set/nested/more.csv', 1_000)
+        shutil.rmtree(self.path('user_data'))
+        usage = self.scanner.scan()[self.user.id]
+
+        self.assertEqual(usage.bytes, 16_100)
+        self.assertNotIn('user_data', usage.breakdown)
+        self.assertEqual((self.scanner.listed, self.scanner.reused), (2, 2))  # nested and the workspace root
+
+    def test_files_grown_in_place_are_caught_by_the_restat(self):
+        self.scanner.scan()
+        with open(self.path('notes.txt'), 'ab') as out:
+            out.write(b'y' * 900)
+
+        self.assertEqual(self.scanner.scan()[self.user.id].bytes, 17_100)
+        with override_settings(DISK_USAGE={**DISK_USAGE, 'RESTAT_HOURS': 0}):
+            self.assertEqual(self.scanner.scan()[self.user.id].bytes, 18_000)
+        self.assertEqual(self.scanner.listed, 5)
+
+    def test_scan_stores_usage_for_the_dashboard(self):
+        stale = CustomUser.objects.create_user(username='gone', password='secure')
+        DiskUsage.objects.create(user=stale, bytes=5_000, files=3)
+        os.makedirs(os.path.join(self.media, 'user_4242_deleted'))
+
+        with patch('core.disk_usage.disk_usage', self.scanner):
+            self.assertEqual(scan_disk_usage(), 2)
+
+        row = DiskUsage.objects.get(user=self.user)
+        self.assertEqual((row.bytes, row.files), (17_100, 4))
+        self.assertEqual(list(row.breakdown), ['data', 'user_data', '.'])
+        self.assertIsNotNone(row.scanned_at)
+        self.assertEqual(DiskUsage.objects.get(user=stale).bytes, 0)
+        self.assertFalse(DiskUsage.objects.filter(user_id=4242).exists())
+
+        admin = CustomUser.objects.create_superuser(username='admin', password='secure')
+        self.client.force_login(admin)
+        usages = {u['username']: u for u in self.client.get(reverse('api_usage_data')).json()['usages']}
+        self.assertEqual(usages['doc']['disk_usage'], 1.6)  # of a 1 MB limit
+        self.assertEqual(usages['doc']['disk_bytes'], 17_100)
+        self.assertEqual(usages['admin']['disk_usage'], 0)
+        self.assertContains(self.client.get(reverse('superuser-dashboard')), '0.0 / 1 MB')
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from users.models import CustomUser
+from core.downloads import parse_ranges, serve_file
+from core.models import UserFile
+
+DOWNLOADS = {'MODE': 'stream', 'ACCEL_PREFIX': '/protected-media/', 'BLOCK_BYTES': 1000, 'MAX_RANGES': 4}
+
+
+@override_settings(DOWNLOADS=DOWNLOADS)
+class ParseRangesTestCase(SimpleTestCase):
+    def test_forms_are_clamped_sorted_and_merged(self):
+        self.assertEqual(parse_ranges('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_ranges('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_ranges('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_ranges('bytes=500-5000', 1000), [(500, 999)])
+        self.assertEqual(parse_ranges('bytes=200-299, 0-99,100-150', 1000), [(0, 150), (200, 299)])
+
+    def test_unsatisfiable_and_ignored_headers(self):
+        self.assertEqual(parse_ranges('bytes=1000-', 1000), [])
+        self.assertEqual(parse_ranges('bytes=-0', 1000), [])
+        self.assertIsNone(parse_ranges('items=0-1', 1000))
+        self.assertIsNone(parse_ranges('bytes=5-1', 1000))
+        self.assertIsNone(parse_ranges('bytes=0-0,2-2,4-4,6-6,8-8', 1000))  # more than MAX_RANGES
+
+
+@override_settings(DOWNLOADS=DOWNLOADS)
+class DownloadViewTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure', role='doctoral', role_verified=True)
+        self.client.force_login(self.user)
+        self.data = os.urandom(5000)
+        name = f'user_{self.user.id}_doc/user_data/model.bin'
+        os.makedirs(os.path.dirname(os.path.join(self.media, name)))
+        with open(os.path.join(self.media, name), 'wb') as out:
+            out.write(self.data)
+        self.file = UserFile.objects.create(user=self.user, file=name)
+        self.url = reverse('download-file', args=[self.file.id])
+
+    def test_full_download_carries_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], '5000')
+        self.assertIn('model.bin', response['Content-Disposition'])
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_single_range_resumes_download(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4000-')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 4000-4999/5000')
+        self.assertEqual(b''.join(response.streaming_content), self.data[4000:])
+
+    def test_multiple_ranges_are_sent_as_multipart(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,2000-2009')
+
+        self.assertEqual(response.status_code, 206)
+        boundary = response['Content-Type'].split('boundary=')[1]
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        parts = body.split(f'--{boundary}'.encode())[1:-1]
+        self.assertEqual(len(parts), 2)
+        self.assertIn(b'Content-Range: bytes 2000-2009/5000', parts[1])
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + self.data[2000:2010] + b'\r\n'))
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=9000-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */5000')
+
+    def test_stale_if_range_gets_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '5000')
+
+    def test_x_accel_mode_only_sends_headers(self):
+        with self.settings(DOWNLOADS={**DOWNLOADS, 'MODE': 'x-accel'}):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/user_{self.user.id}_doc/user_data/model.bin')
+        self.assertEqual(response.content, b'')
+
+    def test_asgi_requests_stream_asynchronously(self):
+        request = AsyncRequestFactory().get('/', headers={'Range': 'bytes=10-19'})
+
+        async def consume():
+            response = serve_file(request, self.file.file.path)
+            return response.is_async, b''.join([chunk async for chunk in response])
+
+        is_async, body = asyncio.run(consume())
+        self.assertTrue(is_async)
+        self.assertEqual(body, self.data[10:20])
@@ -0,0 +1,259 @@
+import io
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.extraction import cancel_extraction, member_target, queue_extraction, recover_extractions, run_extraction
+from core.models import ExtractionJob, UserFile
+from core.uploads import bytes_used
+
+EXTRACTION = {
+    'WORKERS': 1, 'DEST_DIR': 'data', 'MAX_RATIO': 200, 'MAX_BYTES': 10 * 1024 ** 2, 'MAX_FILES': 100,
+    'BLOCK_BYTES': 4096, 'PROGRESS_SECONDS': 0, 'STALE_MINUTES': 15,
+}
+
+
+@override_settings(EXTRACTION=EXTRACTION)
+@patch('core.extraction._notify')
+class ExtractionTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure', role='doctoral', role_verified=True)
+        self.workspace = os.path.join(self.media, f'user_{self.user.id}_doc')
+
+    def upload(self, name, data):
+        path = os.path.join(self.workspace, 'user_data', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            out.write(data)
+        return UserFile.objects.create(user=self.user, file=f'user_{self.user.id}_doc/user_data/{name}')
+
+    def zip_bytes(self, members, compression=zipfile.ZIP_STORED):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression) as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return buffer.getvalue()
+
+    def tar_bytes(self, members, mode='w:gz'):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode=mode) as archive:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                if isinstance(data, tuple):  # (type, linkname)
+                    info.type, info.linkname = data
+                    archive.addfile(info)
+                else:
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def extract(self, user_file, **kwargs):
+        job = queue_extraction(user_file, **kwargs)
+        return run_extraction(job.pk)
+
+    def test_zip_is_unpacked_into_a_new_data_folder(self, notify):
+        upload = self.upload('dataset.zip', self.zip_bytes({'train/a.csv': b'1,2\n', 'test/b.csv': b'3,4\n'}))
+
+        job = self.extract(upload, delete_archive=True)
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual(job.destination, 'data/dataset')
+        self.assertEqual((job.files, job.bytes_written), (2, 8))
+        with open(os.path.join(self.workspace, 'data', 'dataset', 'train', 'a.csv'), 'rb') as extracted:
+            self.assertEqual(extracted.read(), b'1,2\n')
+        self.assertFalse(UserFile.objects.filter(pk=upload.pk).exists())
+        self.assertEqual(notify.call_args.args[0].status, 'complete')
+
+        again = self.extract(self.upload('dataset.zip', self.zip_bytes({'c.csv': b''})))
+        self.assertEqual(again.destination, 'data/dataset_2')
+
+    def test_unsafe_tar_members_are_skipped(self, notify):
+        upload = self.upload('dataset.tar.gz', self.tar_bytes({
+            'ok/data.txt': b'fine',
+            '../escape.txt': b'outside',
+            '/etc/cron.d/evil': b'absolute',
+            'ok/link': (tarfile.SYMTYPE, '/etc/passwd'),
+            'ok/hard': (tarfile.LNKTYPE, '/etc/shadow'),
+        }))
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual((job.files, job.skipped), (1, 4))
+        root = os.path.join(self.workspace, 'data', 'dataset')
+        self.assertEqual(sorted(os.listdir(os.path.join(root, 'ok'))), ['data.txt'])
+        self.assertFalse(os.path.exists(os.path.join(self.workspace, 'data', 'escape.txt')))
+        self.assertTrue(UserFile.objects.filter(pk=upload.pk).exists())
+
+    def test_links_planted_during_extraction_are_never_followed(self, notify):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside, ignore_errors=True)
+        victim = os.path.join(outside, 'victim.txt')
+        with open(victim, 'wb') as out:
+            out.write(b'keep')
+        root = os.path.join(self.workspace, 'data', 'dataset')
+
+        def plant(job, percent=None):
+            # what a container sharing data/ could do once the folder exists
+            if job.destination and not os.path.lexists(os.path.join(root, 'victim.txt')):
+                os.symlink(victim, os.path.join(root, 'victim.txt'))
+                os.symlink(outside, os.path.join(root, 'sub'))
+
+        notify.side_effect = plant
+        upload = self.upload('dataset.tar', self.tar_bytes({
+            'victim.txt': b'overwritten', 'a.txt': b'a', 'a.txt.': b'', './a.txt': b'again',
+        }, mode='w'))
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual((job.files, job.skipped), (2, 2))  # the planted link and the repeated a.txt
+        with open(victim, 'rb') as kept:
+            self.assertEqual(kept.read(), b'keep')
+        with open(os.path.join(root, 'a.txt'), 'rb') as first:
+            self.assertEqual(first.read(), b'a')
+
+        notify.side_effect = None
+        nested = os.path.join(self.workspace, 'data', 'nested')
+        os.makedirs(nested)
+        os.symlink(outside, os.path.join(nested, 'sub'))
+        with patch('core.extraction._destination', return_value=nested):
+            escaped = self.extract(self.upload('nested.tar', self.tar_bytes({'sub/x.txt': b'x'}, mode='w')))
+        self.assertEqual(escaped.status, 'failed')
+        self.assertIn('not a folder', escaped.error)
+        self.assertEqual(os.listdir(outside), ['victim.txt'])
+
+    def test_member_names_outside_the_root(self, notify):
+        for name in ('../x', 'a/../../x', '/x', 'C:/x', 'C:\\x', '..\\x', '', './'):
+            self.assertIsNone(member_target('/root', name), name)
+        self.assertEqual(member_target('/root', './a//b'), '/root/a/b')
+
+    def test_zip_bomb_is_refused_and_output_removed(self, notify):
+        upload = self.upload('bomb.zip', self.zip_bytes({'zeros.bin': b'\0' * (5 * 1024 ** 2)}, zipfile.ZIP_DEFLATED))
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('zip bomb', job.error)
+        self.assertEqual(os.listdir(os.path.join(self.workspace, 'data')), [])
+
+    def test_zip_with_forged_sizes_is_refused(self, notify):
+        size = struct.pack('<I', 2 * 1024 ** 2)
+        # local and central headers claim 1000 bytes for 2 MB of zeros
+        data = self.zip_bytes({'zeros.bin': b'\0' * (2 * 1024 ** 2)}, zipfile.ZIP_DEFLATED).replace(size, struct.pack('<I', 1000))
+
+        job = self.extract(self.upload('forged.zip', data))
+
+        self.assertEqual(job.status, 'failed')
+        self.assertLessEqual(job.bytes_written, 1000)
+        self.assertEqual(os.listdir(os.path.join(self.workspace, 'data')), [])
+
+    def test_quota_is_charged_as_data_is_written(self, notify):
+        self.user.storage_limit = 1  # MB
+        self.user.save()
+        upload = self.upload('big.tar', self.tar_bytes({'part1': os.urandom(600_000), 'part2': os.urandom(600_000)}, 'w'))
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Not enough storage', job.error)
+        self.assertEqual(os.listdir(os.path.join(self.workspace, 'data')), [])
+
+    def test_extracted_data_counts_as_used_until_removed(self, notify):
+        upload = self.upload('small.tar', self.tar_bytes({'a': b'x' * 1000}, 'w'))
+        archive_size = bytes_used(self.user)
+
+        job = self.extract(upload)
+
+        self.assertEqual(bytes_used(self.user), archive_size + 1000)
+        shutil.rmtree(os.path.join(self.workspace, job.destination))
+        self.assertEqual(bytes_used(self.user), archive_size)
+
+    def test_too_many_entries(self, notify):
+        upload = self.upload('many.zip', self.zip_bytes({f'f{i}': b'' for i in range(101)}))
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('more than 100 entries', job.error)
+
+    def test_cancel_stops_the_job_and_removes_output(self, notify):
+        upload = self.upload('data.tar', self.tar_bytes({f'f{i}': os.urandom(10_000) for i in range(20)}, 'w'))
+        notify.side_effect = lambda job, percent=None: job.files == 3 and cancel_extraction(job)
+
+        job = self.extract(upload)
+
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(os.listdir(os.path.join(self.workspace, 'data')), [])
+        self.assertTrue(UserFile.objects.filter(pk=upload.pk).exists())
+
+    def test_corrupt_archive_fails(self, notify):
+        job = self.extract(self.upload('broken.tar.gz', b'not gzip at all'))
+
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error.startswith('Unreadable archive'))
+
+    def test_recovery(self, notify):
+        upload = self.upload('data.zip', self.zip_bytes({'a': b'1'}))
+        interrupted = ExtractionJob.objects.create(user=self.user, archive='x.zip', status='running', destination='data/x')
+        os.makedirs(os.path.join(self.workspace, 'data', 'x'))
+        forgotten = queue_extraction(upload)
+        old = timezone.now() - timedelta(hours=1)
+        ExtractionJob.objects.update(updated_at=old, created_at=old)
+
+        self.assertEqual(recover_extractions(), 1)
+
+        interrupted.refresh_from_db()
+        forgotten.refresh_from_db()
+        self.assertEqual((interrupted.status, interrupted.error), ('failed', 'Interrupted'))
+        self.assertFalse(os.path.exists(os.path.join(self.workspace, 'data', 'x')))
+        self.assertEqual(forgotten.status, 'complete')
+        self.assertIsNone(run_extraction(forgotten.pk))
+
+    def test_views(self, notify):
+        self.client.force_login(self.user)
+        with patch('core.views.queue_extraction', wraps=queue_extraction) as queued:
+            self.client.post(reverse('file-manager'), {
+                'files': [SimpleUploadedFile('set.zip', self.zip_bytes({'a': b'1'})), SimpleUploadedFile('notes.txt', b'')],
+                'extract': '1',
+            })
+        self.assertEqual(queued.call_count, 1)
+        job = ExtractionJob.objects.get()
+        self.assertTrue(job.delete_archive)
+
+        notes = UserFile.objects.get(file__endswith='notes.txt')
+        self.assertEqual(self.client.post(reverse('extract-file', args=[notes.id])).status_code, 400)
+
+        detail = self.client.delete(reverse('extraction-detail', args=[job.id]))
+        self.assertEqual(detail.json()['status'], 'cancelled')
+        self.assertIsNone(run_extraction(job.pk))
+
+    def test_chunked_upload_with_extract_flag(self, notify):
+        from core.uploads import create_upload, write_chunk
+        data = self.zip_bytes({'a': b'1'})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            session = create_upload(self.user, 'set.zip', len(data), extract=True)
+            write_chunk(session, 0, io.BytesIO(data), len(data))
+
+        self.assertEqual(len(callbacks), 1)
+        job = run_extraction(ExtractionJob.objects.get().pk)
+        self.assertEqual(job.status, 'complete')
+        self.assertFalse(UserFile.objects.exists())
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.bookings import booking_index
+from core.fairshare import Ticket, decayed_hours, run_fair_share, simulate
+from core.models import ContainerSchedule, DockerContainer, GpuTimeRequest
+
+FAIR_SHARE = {
+    'ENABLED': True,
+    'POLICY': 'fair_share',
+    'ROLE_WEIGHTS': {'doctoral': 2, 'teacher': 3},
+    'USAGE_HALF_LIFE_DAYS': 7,
+    'USAGE_WINDOW_DAYS': 30,
+    'LOOKAHEAD_HOURS': 2,
+    'MAX_REQUEST_HOURS': 8,
+    'PREEMPT_AFTER_MINUTES': 60,
+    'PREEMPT_RATIO': 2.0,
+    'NOTICE_MINUTES': 15,
+    'INTERVAL': 60,
+}
+BOOKINGS = {'INDEX_TTL': 30, 'SLOT_ALIGN_MINUTES': 15, 'SEARCH_DAYS': 7, 'MAX_SLOTS': 50, 'MAX_CALENDAR_DAYS': 62}
+
+
+@override_settings(FAIR_SHARE=FAIR_SHARE, BOOKINGS=BOOKINGS)
+class SimulationTestCase(SimpleTestCase):
+    def test_usage_halves_every_half_life(self):
+        now = datetime(2025, 1, 15)
+        recent = decayed_hours([(now - timedelta(hours=2), now)], now, 7)
+        old = decayed_hours([(now - timedelta(days=7, hours=2), now - timedelta(days=7))], now, 7)
+        self.assertAlmostEqual(recent, 2.0)
+        self.assertAlmostEqual(old, 1.0)
+
+    def test_fair_share_serves_light_user_sooner_than_fifo(self):
+        t0 = datetime(2025, 1, 6, 8)
+        tickets = [Ticket('heavy', 'doctoral', t0 + timedelta(minutes=i), timedelta(hours=4), t0) for i in range(6)]
+        tickets.append(Ticket('light', 'doctoral', t0 + timedelta(hours=1), timedelta(hours=4), t0))
+
+        fifo = simulate(tickets, 'fifo')
+        fair = simulate(tickets, 'fair_share')
+
+        self.assertLess(fair['users']['light']['mean_wait_hours'], fifo['users']['light']['mean_wait_hours'])
+        self.assertEqual(fifo['unserved'], 0)
+        self.assertEqual(fair['unserved'], 0)
+
+    def test_preemption_cuts_long_window_for_starved_user(self):
+        t0 = datetime(2025, 1, 6, 8)
+        tickets = [
+            Ticket('heavy', 'doctoral', t0, timedelta(hours=8), t0),
+            Ticket('light', 'teacher', t0 + timedelta(minutes=30), timedelta(hours=1), t0),
+        ]
+
+        result = simulate(tickets, 'fair_share_preempt', initial_usage={'heavy': 20.0})
+
+        self.assertEqual(result['preemptions'], 1)
+        self.assertLess(result['users']['light']['mean_wait_hours'], 2)
+        self.assertEqual(result['users']['heavy']['served_hours'], 8)
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            simulate([], 'lottery')
+
+
+@override_settings(FAIR_SHARE=FAIR_SHARE, BOOKINGS=BOOKINGS)
+@patch('core.fairshare._notify')
+class FairShareQueueTestCase(TestCase):
+    def setUp(self):
+        booking_index.invalidate()
+        self.addCleanup(booking_index.invalidate)
+        self.now = timezone.now()
+        self.heavy = self.make_user('heavy', 'doctoral')
+        self.light = self.make_user('light', 'doctoral')
+        # Ten hours used yesterday
+        ContainerSchedule.objects.create(
+            container=self.heavy.container,
+            start_datetime=self.now - timedelta(days=1, hours=10),
+            end_datetime=self.now - timedelta(days=1),
+        )
+
+    def make_user(self, username, role):
+        user = CustomUser.objects.create_user(username=username, password='secure', role=role, role_verified=True)
+        user.container = DockerContainer.objects.create(user=user, container_id=f'c-{username}')
+        return user
+
+    def queue(self, user, hours, waited_minutes=0):
+        return GpuTimeRequest.objects.create(
+            user=user, container=user.container, duration=timedelta(hours=hours),
+            earliest_start=self.now, requested_at=self.now - timedelta(minutes=waited_minutes)
+        )
+
+    def test_lighter_user_is_granted_first_despite_asking_later(self, notify):
+        heavy = self.queue(self.heavy, 2, waited_minutes=10)
+        light = self.queue(self.light, 2, waited_minutes=5)
+
+        self.assertEqual(run_fair_share(self.now), {'granted': 2, 'preempted': 0})
+
+        heavy.refresh_from_db()
+        light.refresh_from_db()
+        self.assertLess(light.schedule.start_datetime, heavy.schedule.start_datetime)
+        self.assertEqual(notify.call_args_list[0].args[0], self.light.id)
+        self.assertEqual(notify.call_args_list[0].args[1]['type'], 'gpu.granted')
+
+    def test_fifo_keeps_arrival_order(self, notify):
+        heavy = self.queue(self.heavy, 2, waited_minutes=10)
+        light = self.queue(self.light, 2, waited_minutes=5)
+
+        with self.settings(FAIR_SHARE={**FAIR_SHARE, 'POLICY': 'fifo'}):
+            run_fair_share(self.now)
+
+        heavy.refresh_from_db()
+        light.refresh_from_db()
+        self.assertLess(heavy.schedule.start_datetime, light.schedule.start_datetime)
+
+    def test_requests_beyond_lookahead_stay_queued(self, notify):
+        ContainerSchedule.objects.create(
+            container=self.heavy.container, start_datetime=self.now, end_datetime=self.now + timedelta(hours=3)
+        )
+        waiting = self.queue(self.light, 2)
+
+        run_fair_share(self.now)
+
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'queued')
+        notify.assert_not_called()
+
+    def test_preempts_queue_granted_window_with_notice(self, notify):
+        held = self.queue(self.heavy, 6, waited_minutes=120)
+        held.schedule = ContainerSchedule.objects.create(
+            container=self.heavy.container,
+            start_datetime=self.now - timedelta(hours=1), end_datetime=self.now + timedelta(hours=5),
+        )
+        held.status = 'granted'
+        held.save()
+        waiter = self.queue(self.light, 1, waited_minutes=90)
+
+        with self.settings(FAIR_SHARE={**FAIR_SHARE, 'POLICY': 'fair_share_preempt'}):
+            summary = run_fair_share(self.now)
+
+        # The waiter goes next; the heavy user's remainder resumes after it
+        self.assertEqual(summary, {'granted': 2, 'preempted': 1})
+        held.refresh_from_db()
+        self.assertEqual(held.status, 'preempted')
+        self.assertEqual(held.schedule.end_datetime, self.now + timedelta(minutes=15))
+        waiter.refresh_from_db()
+        self.assertEqual(waiter.status, 'granted')
+        self.assertGreaterEqual(waiter.schedule.start_datetime, held.schedule.end_datetime)
+        remainder = GpuTimeRequest.objects.exclude(id=held.id).get(user=self.heavy)
+        self.assertEqual(remainder.duration, timedelta(hours=4, minutes=45))
+        self.assertEqual(remainder.requested_at, held.requested_at)
+        self.assertGreaterEqual(remainder.schedule.start_datetime, waiter.schedule.end_datetime)
+        self.assertIn('gpu.preempted', [c.args[1]['type'] for c in notify.call_args_list])
+
+    def test_admin_bookings_are_never_preempted(self, notify):
+        ContainerSchedule.objects.create(
+            container=self.heavy.container,
+            start_datetime=self.now - timedelta(hours=1), end_datetime=self.now + timedelta(hours=3),
+        )
+        self.queue(self.light, 1, waited_minutes=90)
+
+        with self.settings(FAIR_SHARE={**FAIR_SHARE, 'POLICY': 'fair_share_preempt'}):
+            self.assertEqual(run_fair_share(self.now), {'granted': 0, 'preempted': 0})
+
+    def test_request_view_queues_once(self, notify):
+        self.client.force_login(self.light)
+
+        self.client.post(reverse('request-gpu-time'), {'hours': 2})
+        self.client.post(reverse('request-gpu-time'), {'hours': 1})
+        response = self.client.post(reverse('request-gpu-time'), {'hours': 20})
+
+        self.assertRedirects(response, reverse('ai-dashboard'), fetch_redirect_response=False)
+        self.assertEqual(GpuTimeRequest.objects.filter(user=self.light).count(), 1)
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import CustomUser
+from core import file_index as index_module
+from core.file_index import BrowseError, browse, file_index
+
+FILE_BROWSER = {'PAGE_SIZE': 100, 'MAX_PAGE_SIZE': 1000, 'CACHED_DIRS': 8}
+
+
+class FileIndexTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, FILE_BROWSER=FILE_BROWSER)
+        override.enable()
+        self.addCleanup(override.disable)
+        file_index.invalidate()
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure')
+        self.data_dir = os.path.join(self.media, f'user_{self.user.id}_doc', 'data')
+        os.makedirs(os.path.join(self.data_dir, 'zz_subdir'))
+        for i in range(250):
+            self.touch(f'sample_{i:03}.csv', size=i)
+
+    def touch(self, name, size=0):
+        with open(os.path.join(self.data_dir, name), 'wb') as out:
+            out.write(b'x' * size)
+
+    def walk(self, **kwargs):
+        names, cursor = [], None
+        while True:
+            page = browse(self.user, 'data', cursor=cursor, **kwargs)
+            names += [entry['name'] for entry in page['entries']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return names
+
+    def test_pages_cover_directory_once_with_directories_first(self):
+        names = self.walk(limit=100)
+
+        self.assertEqual(len(names), 251)
+        self.assertEqual(names[0], 'zz_subdir')
+        self.assertEqual(names[1:], sorted(names[1:]))
+
+    def test_descending_size_order(self):
+        page = browse(self.user, 'data', sort='size', descending=True, limit=3)
+
+        self.assertEqual([e['name'] for e in page['entries']], ['zz_subdir', 'sample_249.csv', 'sample_248.csv'])
+        self.assertEqual(self.walk(sort='size', descending=True, limit=70)[-1], 'sample_000.csv')
+
+    def test_cursor_is_stable_when_entries_change_between_pages(self):
+        first = browse(self.user, 'data', limit=100)
+        self.touch('aaa_new.csv')  # sorts before the cursor
+        self.touch('zzz_new.csv')
+        os.remove(os.path.join(self.data_dir, 'sample_150.csv'))
+
+        rest = []
+        cursor = first['next_cursor']
+        while cursor:
+            page = browse(self.user, 'data', limit=100, cursor=cursor)
+            rest += [e['name'] for e in page['entries']]
+            cursor = page['next_cursor']
+
+        self.assertEqual(rest[0], 'sample_099.csv')
+        self.assertNotIn('aaa_new.csv', rest)
+        self.assertNotIn('sample_150.csv', rest)
+        self.assertEqual(rest[-1], 'zzz_new.csv')
+
+    def test_search_and_filters(self):
+        self.touch('notes.txt')
+
+        self.assertEqual(self.walk(query='SAMPLE_12'), [f'sample_{i}.csv' for i in range(120, 130)])
+        self.assertEqual(self.walk(kind='dir'), ['zz_subdir'])
+        self.assertEqual(self.walk(ext='txt'), ['notes.txt'])
+
+    def test_rescan_only_stats_new_entries(self):
+        browse(self.user, 'data')
+        self.touch('late.csv')
+
+        with patch.object(index_module, '_stat_entry', wraps=index_module._stat_entry) as stat_entry:
+            browse(self.user, 'data')
+            browse(self.user, 'data')
+
+        self.assertEqual(stat_entry.call_count, 1)
+
+    def test_paths_outside_workspace_are_refused(self):
+        with self.assertRaises(BrowseError):
+            browse(self.user, '../')
+        with self.assertRaises(BrowseError):
+            browse(self.user, 'data', cursor='bm90LWEtY3Vyc29y')
+
+    def test_views(self):
+        self.client.force_login(self.user)
+
+        listing = self.client.get(reverse('browse-workspace'), {'path': 'data', 'limit': 5, 'order': 'desc'})
+        self.assertEqual(listing.status_code, 200)
+        self.assertEqual(listing.json()['entries'][1]['name'], 'sample_249.csv')
+        self.assertEqual(self.client.get(reverse('browse-workspace'), {'path': '/etc/../..'}).status_code, 400)
+
+        download = self.client.get(reverse('download-workspace-file'), {'path': 'data/sample_010.csv'})
+        self.assertEqual(b''.join(download.streaming_content), b'x' * 10)
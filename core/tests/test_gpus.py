@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+
+from users.models import CustomUser
+from core.docker_utils import DockerManager
+from core.gpus import GpuAllocator, GpuDevice
+from core.models import DockerContainer
+
+GPU_ALLOCATION = {'ENABLED': True, 'DEVICES_PER_CONTAINER': 1, 'MIN_FREE_MB': 2048, 'MAX_UTILIZATION': 90}
+
+
+class FakeNvml:
+    """Stands in for NVML: a list of GpuDevice readings the test can edit."""
+
+    def __init__(self, *devices):
+        self.readings = [
+            GpuDevice(index=i, uuid=f'GPU-{i}', mem_total_mb=24576, mem_free_mb=free, utilization=util)
+            for i, (free, util) in enumerate(devices)
+        ]
+
+    def devices(self):
+        return list(self.readings)
+
+
+@override_settings(GPU_ALLOCATION=GPU_ALLOCATION)
+class GpuAllocatorTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secure', gpu_access=True)
+
+    def test_prefers_idle_card_with_most_free_memory(self):
+        allocator = GpuAllocator(FakeNvml((20000, 80), (22000, 5), (24000, 5)))
+        self.assertEqual(allocator.pick(), ['GPU-2'])
+
+    def test_spreads_over_cards_already_assigned(self):
+        allocator = GpuAllocator(FakeNvml((24000, 0), (24000, 0)))
+        DockerContainer.objects.create(user=self.user, status='running', gpu_devices=['GPU-0'])
+        self.assertEqual(allocator.pick(), ['GPU-1'])
+
+    def test_pending_picks_are_not_handed_out_twice(self):
+        allocator = GpuAllocator(FakeNvml((24000, 0), (24000, 0)))
+        first, second = allocator.pick(), allocator.pick()
+        self.assertNotEqual(first, second)
+        allocator.settle(first)
+        self.assertEqual(allocator.pick(), first)
+
+    def test_overloaded_cards_are_used_last(self):
+        allocator = GpuAllocator(FakeNvml((1000, 10), (24000, 99), (8000, 50)))
+        self.assertEqual(allocator.pick(count=2), ['GPU-2', 'GPU-0'])
+
+    def test_no_devices(self):
+        self.assertIsNone(GpuAllocator(FakeNvml()).pick())
+
+    def test_needs_rebalance_when_card_is_gone_or_busy(self):
+        nvml = FakeNvml((24000, 0), (24000, 0))
+        allocator = GpuAllocator(nvml)
+        row = DockerContainer(user=self.user, gpu_devices=['GPU-1'])
+        self.assertFalse(allocator.needs_rebalance(row))
+        nvml.readings[1].utilization = 100
+        self.assertTrue(allocator.needs_rebalance(row))
+        nvml.readings.pop()
+        self.assertTrue(allocator.needs_rebalance(row))
+
+
+@override_settings(GPU_ALLOCATION=GPU_ALLOCATION, DOCKER_HOSTS=[])
+class GpuContainerTestCase(TestCase):
+    def setUp(self):
+        self.engine = MagicMock()
+        with patch('core.docker_utils.docker.from_env', return_value=self.engine):
+            self.manager = DockerManager()
+        self.user = CustomUser.objects.create_user(username='alice', password='secure', gpu_access=True)
+        self.nvml = FakeNvml((24000, 0), (24000, 0))
+        patcher = patch('core.docker_utils.gpu_allocator', GpuAllocator(self.nvml))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('core.docker_utils.readiness_prober')
+    @patch('core.docker_utils.port_allocator')
+    def test_container_gets_only_its_devices(self, ports, prober):
+        ports.allocate.return_value = 40001
+        self.engine.containers.run.return_value = MagicMock(id='c1')
+
+        self.manager.create_container(self.user, 'my-torch', 'jupyter')
+
+        kwargs = self.engine.containers.run.call_args.kwargs
+        self.assertNotIn('runtime', kwargs)
+        self.assertEqual(kwargs['device_requests'][0]['DeviceIDs'], ['GPU-0'])
+        self.assertEqual(DockerContainer.objects.get(user=self.user).gpu_devices, ['GPU-0'])
+
+    @patch('core.docker_utils.readiness_prober')
+    def test_restart_moves_off_a_busy_card(self, prober):
+        row = DockerContainer.objects.create(
+            user=self.user, container_id='c1', status='stopped', image_name='my-torch:latest',
+            jupyter_port=40001, jupyter_token='tok', gpu_devices=['GPU-0']
+        )
+        old = MagicMock(id='c1', status='exited')
+        old.name = f'jupyter_{self.user.id}_alice'
+        self.engine.containers.get.return_value = old
+        self.engine.containers.create.return_value = MagicMock(id='c2', status='created')
+        self.nvml.readings[0].utilization = 100
+
+        self.manager.start_or_resume_container(self.user, 'my-torch')
+
+        old.remove.assert_called_once_with(force=True)
+        kwargs = self.engine.containers.create.call_args.kwargs
+        self.assertEqual(kwargs['device_requests'][0]['DeviceIDs'], ['GPU-1'])
+        self.assertEqual(kwargs['ports'], {'8888/tcp': 40001})
+        self.engine.containers.create.return_value.start.assert_called_once()
+        row.refresh_from_db()
+        self.assertEqual((row.container_id, row.gpu_devices), ('c2', ['GPU-1']))
@@ -0,0 +1,249 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import docker
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import CustomUser
+from core import monitoring
+from core.consumers import ContainerConsumer, count_containers
+from core.docker_utils import DockerManager
+from core.hosts import BinPackPolicy, HostRegistry, SpreadPolicy, rows_on
+from core.models import DockerContainer, DockerHost, PortLease
+from core.ports import reclaim_port_leases
+from core.reconcile import reconcile
+
+GB = 1024 ** 3
+
+
+def fake_engine(ncpu, mem_gb):
+    client = MagicMock()
+    client.info.return_value = {'NCPU': ncpu, 'MemTotal': mem_gb * GB}
+    client.containers.list.return_value = []
+    return client
+
+
+STATS = {
+    'cpu_stats': {'cpu_usage': {'total_usage': 300}, 'system_cpu_usage': 2000, 'online_cpus': 2},
+    'precpu_stats': {'cpu_usage': {'total_usage': 100}, 'system_cpu_usage': 1000},
+    'memory_stats': {'usage': 256 * 1024 ** 2, 'limit': GB},
+    'networks': {'eth0': {'rx_bytes': 1024 ** 2, 'tx_bytes': 0}},
+}
+
+
+class FakeContainer:
+    def __init__(self, id, name, status='running'):
+        self.id, self.name, self.status = id, name, status
+        self.attrs = {'State': {'Pid': 0}}
+
+    def stats(self, stream=False):
+        return STATS
+
+    def top(self):
+        return {'Processes': []}
+
+
+class FakeEngine:
+    """A Docker engine that only knows its own containers and records builds."""
+
+    def __init__(self, *containers, down=False):
+        self.by_id = {c.id: c for c in containers}
+        self.down = down
+        self.built = []
+        self.containers = SimpleNamespace(get=self._get, list=self._list)
+        self.images = SimpleNamespace(build=self._build)
+
+    def ping(self):
+        return True
+
+    def _get(self, key):
+        for container in self.by_id.values():
+            if key in (container.id, container.name):
+                return container
+        raise docker.errors.NotFound(key)
+
+    def _list(self, all=False):
+        if self.down:
+            raise docker.errors.APIError('engine unreachable')
+        return [c for c in self.by_id.values() if all or c.status == 'running']
+
+    def _build(self, tag, **kwargs):
+        self.built.append(tag)
+        return SimpleNamespace(id=f'sha256:{tag}'), [{'stream': 'Successfully built'}]
+
+
+class PlacementPolicyTestCase(TestCase):
+    def setUp(self):
+        self.big = DockerHost(name='big', cpu_total=32, mem_total_mb=65536, free_cpu=20, free_mem_mb=40000)
+        self.small = DockerHost(name='small', cpu_total=8, mem_total_mb=16384, free_cpu=6, free_mem_mb=8000)
+
+    def test_binpack_fills_the_tightest_host_that_fits(self):
+        self.assertIs(BinPackPolicy().choose([self.big, self.small], 2, 4096), self.small)
+        self.assertIs(BinPackPolicy().choose([self.big, self.small], 8, 4096), self.big)
+
+    def test_spread_prefers_the_emptiest_host(self):
+        self.assertIs(SpreadPolicy().choose([self.big, self.small], 2, 4096), self.big)
+
+    def test_nothing_fits(self):
+        self.assertIsNone(BinPackPolicy().choose([self.big, self.small], 64, 4096))
+
+
+@override_settings(DOCKER_HOSTS=[
+    {'name': 'local', 'base_url': '', 'public_address': '10.0.0.1'},
+    {'name': 'gpu2', 'base_url': 'tcp://10.0.0.2:2376', 'public_address': '10.0.0.2'},
+])
+class HostRegistryTestCase(TestCase):
+    def setUp(self):
+        self.local_engine = fake_engine(4, 8)
+        self.remote_engine = fake_engine(16, 64)
+        self.registry = HostRegistry(self.local_engine)
+        self.registry.sync_configured_hosts()
+        self.local = DockerHost.objects.get(name='local')
+        self.remote = DockerHost.objects.get(name='gpu2')
+        self.registry._clients[self.remote.id] = self.remote_engine
+        self.user = CustomUser.objects.create_user(
+            username='alice', password='secure', mem_limit=4096, cpu_limit=2
+        )
+
+    def test_collect_subtracts_limits_of_running_containers(self):
+        DockerContainer.objects.create(
+            user=self.user, host=self.remote, container_id='a', status='running',
+            resource_limits={'cpu': 2, 'ram': 4096}
+        )
+        self.registry.collect()
+
+        self.remote.refresh_from_db()
+        self.assertEqual((self.remote.cpu_total, self.remote.mem_total_mb), (16, 65536))
+        self.assertEqual((self.remote.free_cpu, self.remote.free_mem_mb), (14, 61440))
+        self.local.refresh_from_db()
+        self.assertEqual(self.local.free_mem_mb, 8192)
+
+    def test_unreachable_host_is_skipped_by_placement(self):
+        self.registry.collect()
+        self.remote_engine.info.side_effect = ConnectionError('down')
+        self.registry.collect()
+
+        self.assertEqual(self.registry.place(self.user), self.local)
+
+    def test_place_reserves_capacity(self):
+        self.registry.collect()
+        self.assertEqual(self.registry.place(self.user), self.local)  # binpack: tighter host
+        self.local.refresh_from_db()
+        self.assertEqual((self.local.free_cpu, self.local.free_mem_mb), (2, 4096))
+
+    def test_rows_without_host_belong_to_the_local_engine(self):
+        legacy = DockerContainer.objects.create(user=self.user, container_id='old')
+        self.assertEqual(list(rows_on(None)), [legacy])
+        self.assertEqual(list(rows_on(self.remote)), [])
+
+    def test_reconcile_uses_the_hosts_engine(self):
+        DockerContainer.objects.create(user=self.user, host=self.remote, container_id='a', status='running')
+        gone = MagicMock(id='a', status='exited', attrs={'Names': ['/jupyter_1_alice']})
+        self.remote_engine.containers.list.return_value = [gone]
+
+        with patch('core.reconcile.docker_manager.hosts', self.registry):
+            reconcile(host=self.remote)
+
+        self.assertEqual(DockerContainer.objects.get(container_id='a').status, 'exited')
+        self.local_engine.containers.list.assert_not_called()
+
+
+@override_settings(DOCKER_HOSTS=[
+    {'name': 'gpu2', 'base_url': 'tcp://10.0.0.2:2376', 'public_address': '10.0.0.2'},
+])
+class RemoteLifecycleTestCase(TestCase):
+    def setUp(self):
+        self.local_engine = fake_engine(4, 8)
+        self.remote_engine = fake_engine(16, 64)
+        with patch('core.docker_utils.docker.from_env', return_value=self.local_engine):
+            self.manager = DockerManager()
+        self.manager.hosts.sync_configured_hosts()
+        self.remote = DockerHost.objects.get(name='gpu2')
+        self.manager.hosts._clients[self.remote.id] = self.remote_engine
+        self.manager.hosts.collect()
+        self.user = CustomUser.objects.create_user(username='alice', password='secure')
+
+    @patch('core.docker_utils.readiness_prober')
+    @patch('core.docker_utils.port_allocator')
+    def test_container_runs_on_the_placed_host(self, ports, prober):
+        ports.allocate.return_value = 40001
+        self.remote_engine.containers.run.return_value = MagicMock(id='remote_id')
+
+        url, token = self.manager.create_container(self.user, 'my-tf', 'jupyter')
+
+        self.remote_engine.containers.run.assert_called_once()
+        self.local_engine.containers.run.assert_not_called()
+        self.assertEqual(url, f'http://10.0.0.2:40001/?token={token}')
+        self.assertEqual(DockerContainer.objects.get(user=self.user).host, self.remote)
+        self.assertEqual(prober.watch.call_args.kwargs['host'], '10.0.0.2')
+
+        self.assertTrue(self.manager.manage_container(self.user, 'stop', 'jupyter'))
+        self.remote_engine.containers.get.assert_called_with(f'jupyter_{self.user.id}_alice')
+        self.local_engine.containers.get.assert_not_called()
+
+
+@override_settings(DOCKER_HOSTS=[
+    {'name': 'gpu2', 'base_url': 'tcp://10.0.0.2:2376', 'public_address': '10.0.0.2'},
+])
+class MultiHostRoutingTestCase(TestCase):
+    def setUp(self):
+        self.local_engine = FakeEngine(FakeContainer('local_id', 'jupyter_9_bob'), FakeContainer('old_id', 'old', 'exited'))
+        self.remote_engine = FakeEngine(FakeContainer('remote_id', 'jupyter_1_alice'), FakeContainer('pool_id', 'warm_gpu2'))
+        with patch('core.docker_utils.docker.from_env', return_value=self.local_engine):
+            self.manager = DockerManager()
+        self.manager.hosts.sync_configured_hosts()
+        self.remote = DockerHost.objects.get(name='gpu2')
+        self.manager.hosts._clients[self.remote.id] = self.remote_engine
+        for name in ('docker_utils', 'monitoring', 'consumers'):
+            patcher = patch(f'core.{name}.docker_manager', self.manager)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.alice = CustomUser.objects.create_user(username='alice', password='secure')
+        DockerContainer.objects.create(user=self.alice, host=self.remote, container_id='remote_id', status='running')
+
+    @patch('core.docker_utils.subprocess.run')
+    def test_stats_come_from_the_containers_engine(self, nvidia_smi):
+        self.assertEqual(self.manager.get_container_stats('remote_id')['cpu'], 20.0)
+        self.assertEqual(monitoring.get_user_container_stats('remote_id')['memory_usage'], 256 * 1024 ** 2)
+
+        consumer = ContainerConsumer()
+        consumer.container_id = 'remote_id'
+        stats = async_to_sync(consumer.get_container_stats)()
+        self.assertEqual((stats['cpu'], stats['gpu_usage']), (40.0, 0))
+
+        nvidia_smi.assert_not_called()  # it would only see this machine's GPUs
+
+    def test_container_count_covers_every_engine(self):
+        self.assertEqual(count_containers(), 3)
+        self.remote_engine.down = True
+        self.assertEqual(count_containers(), 1)
+
+    def test_build_runs_on_the_users_engine(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            image_id, logs = self.manager.build_from_dockerfile(self.alice, f'{media}/Dockerfile')
+
+        tag = f'user_{self.alice.id}_alice:latest'
+        self.assertEqual((image_id, logs), (f'sha256:{tag}', 'Successfully built'))
+        self.assertEqual(self.remote_engine.built, [tag])
+        self.assertEqual(self.local_engine.built, [])
+
+    def test_reclaim_keeps_leases_held_on_any_engine(self):
+        for port, holder in ((40001, 'warm_gpu2'), (40002, 'old'), (40003, 'gone')):
+            PortLease.objects.create(port=port, holder=holder)
+        PortLease.objects.update(leased_at=timezone.now() - timedelta(hours=1))
+
+        self.remote_engine.down = True
+        reclaim_port_leases()
+        self.assertEqual(PortLease.objects.count(), 3)  # gpu2's names are unknown
+
+        self.remote_engine.down = False
+        reclaim_port_leases()
+        self.assertEqual(sorted(PortLease.objects.values_list('port', flat=True)), [40001, 40002])
@@ -0,0 +1,56 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.jobs import reset_access_and_restart, stop_all_except
+from core.models import DockerContainer
+
+
+class ExclusiveWindowTestCase(TestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(username='owner', password='secure', role='doctoral')
+        DockerContainer.objects.create(user=self.owner, container_id='owner_id', status='running')
+        self.engine = {}
+        for i in range(5):
+            user = CustomUser.objects.create_user(username=f'user{i}', password='secure')
+            DockerContainer.objects.create(user=user, container_id=f'c{i}', status='running')
+            container = MagicMock()
+            container.id = f'c{i}'
+            self.engine[container.id] = container
+
+        self.client = MagicMock()
+        self.client.containers.list.side_effect = lambda **kw: [
+            self.engine[cid] for cid in kw['filters']['id'] if cid in self.engine
+        ]
+        patcher = patch('core.bulk._client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_window_pauses_others_with_one_list_call(self):
+        scheduled_for = timezone.now() - timedelta(seconds=5)
+
+        metrics = stop_all_except(self.owner, scheduled_for)
+
+        self.client.containers.list.assert_called_once()
+        self.assertTrue(all(c.pause.called for c in self.engine.values()))
+        self.assertEqual((metrics['ok'], metrics['failed']), (5, 0))
+        self.assertGreaterEqual(metrics['start_delay'], 5)
+        self.assertGreaterEqual(metrics['lateness'], metrics['start_delay'])
+        self.assertEqual(DockerContainer.objects.filter(status='paused').count(), 5)
+        self.assertEqual(DockerContainer.objects.get(user=self.owner).status, 'running')
+        self.assertFalse(CustomUser.objects.get(username='user0').is_accessible)
+
+    def test_window_end_unpauses_and_restores_access(self):
+        stop_all_except(self.owner)
+        self.engine['c3'].unpause.side_effect = Exception('boom')
+
+        metrics = reset_access_and_restart()
+
+        self.assertEqual((metrics['ok'], metrics['failed']), (4, 1))
+        self.assertIsNone(metrics['lateness'])
+        self.assertEqual(DockerContainer.objects.get(container_id='c3').status, 'paused')
+        self.assertEqual(DockerContainer.objects.filter(status='running').count(), 5)
+        self.assertTrue(CustomUser.objects.get(username='user0').is_accessible)
@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock
+
+import docker
+from django.test import TestCase
+
+from users.models import CustomUser
+from core.limits import apply_live_limits
+from core.models import DockerContainer
+
+
+class LiveLimitsTestCase(TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.engine = []
+        for name in ('alice', 'bob'):
+            user = CustomUser.objects.create_user(
+                username=name, password='secure', role='bachelor',
+                mem_limit=4096, memswap_limit=6144, cpu_limit=2, gpu_access=True
+            )
+            DockerContainer.objects.create(
+                user=user, container_id=f'{name}_id',
+                resource_limits={'cpu': 3, 'ram': 8192, 'gpu': True}
+            )
+            container = MagicMock()
+            container.id = f'{name}_id'
+            self.engine.append(container)
+        self.client.containers.list.return_value = self.engine
+
+    def test_role_limits_are_applied_in_place(self):
+        results = apply_live_limits(CustomUser.objects.filter(role='bachelor'), client=self.client)
+
+        self.assertTrue(all(r['ok'] and r['cpu_applied'] for r in results))
+        self.engine[0].update.assert_called_once_with(
+            mem_limit='4096m', memswap_limit='6144m', cpu_period=100000, cpu_quota=200000
+        )
+        row = DockerContainer.objects.get(container_id='alice_id')
+        self.assertEqual(row.resource_limits, {'cpu': 2, 'ram': 4096, 'swap': 6144, 'gpu': True})
+
+    def test_legacy_nano_cpu_container_gets_memory_only(self):
+        self.engine[1].update.side_effect = [docker.errors.APIError('Conflicting options: Nano CPUs and CPU Period'), None]
+
+        results = {r['user']: r for r in apply_live_limits(CustomUser.objects.all(), client=self.client)}
+
+        self.assertTrue(results['bob']['ok'])
+        self.assertFalse(results['bob']['cpu_applied'])
+        self.engine[1].update.assert_called_with(mem_limit='4096m', memswap_limit='6144m')
+        self.assertEqual(DockerContainer.objects.get(container_id='bob_id').resource_limits['cpu'], 3)
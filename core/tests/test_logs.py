@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.logs import LogBuffer, LogService, parse_line
+
+
+class LogBufferTestCase(SimpleTestCase):
+    def test_parse_line_with_nanosecond_timestamp(self):
+        entry = parse_line(b'2025-06-01T10:00:01.500000000Z [I] Jupyter Server is running')
+        self.assertEqual(entry['line'], '[I] Jupyter Server is running')
+        self.assertAlmostEqual(entry['ts'] % 60, 1.5)
+
+    def test_buffer_drops_oldest_lines_over_byte_cap(self):
+        buffer = LogBuffer(max_bytes=10)
+        buffer.extend([{'ts': i, 'line': 'abcd'} for i in range(5)])
+        self.assertEqual([e['ts'] for e in buffer.tail()], [3, 4])
+
+    def test_tail_by_lines_and_since(self):
+        buffer = LogBuffer(max_bytes=1000)
+        buffer.extend([{'ts': float(i), 'line': str(i)} for i in range(10)])
+        self.assertEqual([e['line'] for e in buffer.tail(lines=2)], ['8', '9'])
+        self.assertEqual([e['line'] for e in buffer.tail(since=7)], ['7', '8', '9'])
+
+
+@patch('core.logs.LogFollower')
+class LogServiceTestCase(SimpleTestCase):
+    def test_one_follower_shared_by_all_viewers(self, follower_cls):
+        follower_cls.return_value.is_alive.return_value = True
+        service = LogService()
+
+        first = service.attach('abc')
+        second = service.attach('abc')
+        self.assertIs(first, second)
+        follower_cls.assert_called_once()
+
+        service.detach('abc')
+        follower_cls.return_value.stop.assert_not_called()
+        service.detach('abc')
+        follower_cls.return_value.stop.assert_called_once()
+
+    @override_settings(CONTAINER_LOGS={'BUFFER_BYTES': 1000, 'MAX_BUFFERS': 2, 'MAX_TAIL_LINES': 100})
+    def test_unfollowed_buffers_behind_a_followed_one_are_evicted(self, follower_cls):
+        follower_cls.return_value.is_alive.return_value = True
+        service = LogService()
+
+        service.attach('followed')  # oldest, and kept while followed
+        for container_id in ('a', 'b', 'c'):
+            service._buffer(container_id)
+
+        self.assertEqual(list(service._buffers), ['followed', 'c'])
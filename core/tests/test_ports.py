@@ -0,0 +1,63 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.models import DockerContainer, PortLease
+from core.ports import BUSY_HOLDER, PortAllocator
+
+
+@patch.object(PortAllocator, '_is_bindable', return_value=True)
+class PortAllocatorTestCase(TestCase):
+    def setUp(self):
+        self.allocator = PortAllocator(port_range=(41000, 41003))
+        self.user = CustomUser.objects.create_user(username='student', password='secure')
+        self.container = DockerContainer.objects.create(user=self.user, container_id='abc')
+
+    def test_allocates_unique_ports_until_range_is_full(self, _):
+        ports = [self.allocator.allocate() for _ in range(4)]
+        self.assertEqual(sorted(ports), [41000, 41001, 41002, 41003])
+        self.assertIsNone(self.allocator.allocate())
+
+        self.allocator.release(ports[0])
+        self.assertEqual(self.allocator.allocate(), ports[0])
+
+    def test_lease_is_dropped_with_container(self, _):
+        port = self.allocator.allocate('jupyter_1_student')
+        self.allocator.attach(port, self.container)
+        self.assertEqual(self.container.port_lease.port, port)
+
+        self.container.delete()
+        self.assertFalse(PortLease.objects.filter(port=port).exists())
+
+    def test_reclaim_drops_stale_unattached_leases(self, _):
+        PortLease.objects.create(port=41000)
+        PortLease.objects.create(port=41001, holder='pool_tensorflow_a')
+        PortLease.objects.create(port=41002, holder='gone')
+        PortLease.objects.update(leased_at=timezone.now() - timedelta(hours=1))
+
+        self.allocator.reclaim(live_names=['pool_tensorflow_a'])
+        self.assertEqual(list(PortLease.objects.values_list('port', flat=True)), [41001])
+
+    @patch('core.ports.random.randint', return_value=41000)
+    def test_busy_ports_are_not_held_by_the_requesting_container(self, _, bindable):
+        bindable.side_effect = lambda port: port != 41000
+        self.allocator.random_attempts = 1
+
+        port = self.allocator.allocate('jupyter_1_student')
+        self.assertNotEqual(port, 41000)
+        self.assertEqual(PortLease.objects.get(port=41000).holder, BUSY_HOLDER)
+
+        # The busy lease expires even while the container that hit it lives
+        PortLease.objects.update(leased_at=timezone.now() - timedelta(hours=1))
+        self.allocator.reclaim(live_names=['jupyter_1_student'])
+        self.assertEqual(list(PortLease.objects.values_list('port', flat=True)), [port])
+
+    def test_reclaim_backfills_legacy_container_ports(self, _):
+        self.container.jupyter_port = 41002
+        self.container.save()
+
+        self.allocator.reclaim()
+        self.assertEqual(PortLease.objects.get(port=41002).container, self.container)
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.models import DockerContainer, JupyterStartup
+from core.readiness import ReadinessProber, expire_startups, jupyter_answers, notification_group, still_probing
+
+READINESS = {'HOST': '127.0.0.1', 'TIMEOUT': 5, 'INITIAL_DELAY': 0.01, 'MAX_DELAY': 0.05}
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}  # no Redis needed
+
+
+async def fake_jupyter(fail_first=0):
+    """A server that refuses ``fail_first`` probes, then answers like Jupyter."""
+    calls = {'n': 0}
+
+    async def handle(reader, writer):
+        await reader.readline()
+        calls['n'] += 1
+        status = b'503 Service Unavailable' if calls['n'] <= fail_first else b'200 OK'
+        writer.write(b'HTTP/1.0 ' + status + b'\r\n\r\n{}')
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+@override_settings(JUPYTER_READINESS=READINESS)
+class ReadinessTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='student', password='secure')
+        self.container = DockerContainer.objects.create(user=self.user, container_id='abc', jupyter_port=1)
+
+    def test_startup_whose_probe_went_away_is_not_pending_forever(self):
+        fresh = JupyterStartup.objects.create(container=self.container)
+        abandoned = JupyterStartup.objects.create(container=self.container)
+        JupyterStartup.objects.filter(id=abandoned.id).update(requested_at=timezone.now() - timedelta(minutes=1))
+        abandoned.refresh_from_db()
+
+        self.assertTrue(still_probing(fresh))
+        self.assertFalse(still_probing(abandoned))
+
+        self.assertEqual(expire_startups(), 1)
+        abandoned.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertIs(abandoned.succeeded, False)
+        self.assertIsNone(fresh.succeeded)
+
+    def test_closed_port_is_not_ready(self):
+        async def run():
+            server, port = await fake_jupyter()
+            server.close()
+            await server.wait_closed()
+            return await jupyter_answers('127.0.0.1', port)
+
+        self.assertFalse(asyncio.run(run()))
+
+    def test_probe_records_time_to_ready_and_pushes_event(self):
+        startup = JupyterStartup.objects.create(container=self.container)
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(notification_group(self.user.id), channel)
+
+        async def run():
+            server, port = await fake_jupyter(fail_first=2)
+            async with server:
+                return await ReadinessProber().probe(startup.id, self.user.id, '127.0.0.1', port, 'http://x/?token=t')
+
+        self.assertTrue(asyncio.run(run()))
+
+        startup.refresh_from_db()
+        self.assertTrue(startup.succeeded)
+        self.assertEqual(startup.attempts, 3)
+        self.assertIsNotNone(startup.seconds_to_ready)
+
+        types = []
+        while True:
+            message = async_to_sync(channel_layer.receive)(channel)
+            types.append(message['payload']['type'])
+            if message['payload']['type'] == 'jupyter.ready':
+                break
+        self.assertEqual(types[0], 'jupyter.starting')
+        self.assertEqual(message['payload']['url'], 'http://x/?token=t')
@@ -0,0 +1,83 @@
+import time
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from users.models import CustomUser
+from core.models import DockerContainer
+from core.reconcile import reconcile
+
+
+def listed(container_id, state, name, labels=None, created=None):
+    container = MagicMock()
+    container.id = container_id
+    container.status = state
+    container.attrs = {
+        'Names': [f'/{name}'],
+        'Labels': labels or {'webui.managed': '1'},
+        'Created': created if created is not None else time.time() - 3600,
+    }
+    return container
+
+
+class ReconcileTestCase(TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.alice = CustomUser.objects.create_user(username='alice', password='secure')
+        self.bob = CustomUser.objects.create_user(username='bob', password='secure')
+        self.alice_row = DockerContainer.objects.create(user=self.alice, container_id='a1', status='running')
+        self.bob_row = DockerContainer.objects.create(user=self.bob, container_id='b1', status='running')
+
+    def test_status_missing_and_orphans_in_one_pass(self):
+        orphan = listed('zz', 'running', 'jupyter_9_ghost')
+        self.client.containers.list.side_effect = [
+            [listed('a1', 'exited', 'jupyter_1_alice'), orphan],
+            [],  # unlabelled fallback listing
+        ]
+
+        summary = reconcile(self.client)
+
+        self.assertEqual(summary, {'status': 1, 'missing': 1, 'orphans': 1})
+        self.alice_row.refresh_from_db()
+        self.assertEqual(self.alice_row.status, 'exited')
+        self.assertFalse(DockerContainer.objects.filter(id=self.bob_row.id).exists())
+        orphan.remove.assert_not_called()
+
+    def test_rows_changed_after_the_snapshot_are_left_alone(self):
+        def listing(**kwargs):
+            if 'label' not in kwargs.get('filters', {}):
+                return []
+            # while the daemon is listed, alice's container is recreated and
+            # bob's row is updated by a start
+            DockerContainer.objects.filter(id=self.alice_row.id).update(container_id='a2', status='created')
+            DockerContainer.objects.filter(id=self.bob_row.id).update(status='paused')
+            return [listed('b1', 'exited', 'jupyter_2_bob')]
+
+        self.client.containers.list.side_effect = listing
+
+        summary = reconcile(self.client)
+
+        self.assertEqual(summary, {'status': 0, 'missing': 0, 'orphans': 0})
+        self.alice_row.refresh_from_db()
+        self.bob_row.refresh_from_db()
+        self.assertEqual((self.alice_row.container_id, self.alice_row.status), ('a2', 'created'))
+        self.assertEqual(self.bob_row.status, 'paused')
+
+    def test_unlabelled_legacy_container_is_not_treated_as_missing(self):
+        self.client.containers.list.side_effect = [
+            [listed('a1', 'running', 'jupyter_1_alice')],
+            [listed('b1', 'paused', 'jupyter_2_bob', labels={})],
+        ]
+
+        summary = reconcile(self.client)
+
+        self.assertEqual(summary['missing'], 0)
+        self.bob_row.refresh_from_db()
+        self.assertEqual(self.bob_row.status, 'paused')
+
+    def test_recent_unknown_container_is_not_an_orphan(self):
+        self.client.containers.list.side_effect = [
+            [listed('a1', 'running', 'a'), listed('b1', 'running', 'b'),
+             listed('new', 'running', 'jupyter_3_carol', created=time.time())],
+        ]
+        self.assertEqual(reconcile(self.client)['orphans'], 0)
@@ -0,0 +1,187 @@
+from datetime import date, datetime, time, timedelta
+from unittest.mock import patch
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core import recurrence, scheduler as scheduler_module
+from core.bookings import BookingConflict, book, book_recurring, booking_index, calendar, free_slots
+from core.jobs import recurring_jobs
+from core.models import DockerContainer, RecurringSchedule
+from core.recurrence import next_occurrence, occurrences
+from core.scheduler import sync_recurring_jobs
+
+BOOKINGS = {'INDEX_TTL': 30, 'SLOT_ALIGN_MINUTES': 15, 'SEARCH_DAYS': 7, 'MAX_SLOTS': 50, 'MAX_CALENDAR_DAYS': 62}
+
+# Tuesday
+TERM_START = date(2025, 1, 7)
+
+
+def tuesday_lab(**kwargs):
+    fields = dict(frequency='weekly', weekdays=[1], start_time=time(13), duration=timedelta(hours=3),
+                  first_date=TERM_START, until=TERM_START + timedelta(weeks=15))
+    fields.update(kwargs)
+    return RecurringSchedule(**fields)
+
+
+class OccurrenceTestCase(SimpleTestCase):
+    def test_weekly_rule_with_exception_and_until(self):
+        rule = tuesday_lab(exceptions=['2025-01-14'], until=date(2025, 1, 28))
+
+        found = list(occurrences(rule, datetime(2025, 1, 1), datetime(2025, 3, 1)))
+
+        self.assertEqual([s for s, _ in found], [
+            datetime(2025, 1, 7, 13), datetime(2025, 1, 21, 13), datetime(2025, 1, 28, 13)
+        ])
+        self.assertEqual(found[0][1], datetime(2025, 1, 7, 16))
+
+    def test_expansion_stays_inside_the_window(self):
+        rule = tuesday_lab(until=None)
+        with patch('core.recurrence._matches', wraps=recurrence._matches) as matches:
+            found = list(occurrences(rule, datetime(2030, 6, 2), datetime(2030, 6, 9)))
+        self.assertEqual(found, [(datetime(2030, 6, 4, 13), datetime(2030, 6, 4, 16))])
+        self.assertLessEqual(matches.call_count, 9)
+
+    def test_every_other_week_on_two_days(self):
+        rule = tuesday_lab(weekdays=[1, 3], interval=2)
+        starts = [s.date() for s, _ in occurrences(rule, datetime(2025, 1, 6), datetime(2025, 1, 27))]
+        self.assertEqual(starts, [date(2025, 1, 7), date(2025, 1, 9), date(2025, 1, 21), date(2025, 1, 23)])
+
+    def test_next_occurrence_includes_one_in_progress(self):
+        rule = tuesday_lab()
+        self.assertEqual(next_occurrence(rule, datetime(2025, 1, 7, 14))[0], datetime(2025, 1, 7, 13))
+        self.assertEqual(next_occurrence(rule, datetime(2025, 1, 7, 16))[0], datetime(2025, 1, 14, 13))
+        self.assertIsNone(next_occurrence(rule, datetime(2025, 6, 1)))
+
+
+@override_settings(BOOKINGS=BOOKINGS)
+class RecurringBookingTestCase(TestCase):
+    def setUp(self):
+        booking_index.invalidate()
+        self.addCleanup(booking_index.invalidate)
+        self.teacher = CustomUser.objects.create_user(username='teacher', password='secure', role='teacher')
+        self.container = DockerContainer.objects.create(user=self.teacher, container_id='c1')
+        other = CustomUser.objects.create_user(username='doc', password='secure', role='doctoral')
+        self.other = DockerContainer.objects.create(user=other, container_id='c2')
+        # Next Tuesday, a week of lab sessions ahead
+        today = timezone.now().date()
+        self.tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+        self.rule = book_recurring(tuesday_lab(container=self.container, first_date=self.tuesday,
+                                               until=self.tuesday + timedelta(weeks=10)))
+
+    def at(self, day, hour):
+        return datetime.combine(day, time(hour))
+
+    def test_one_row_for_the_whole_term(self):
+        self.assertEqual(RecurringSchedule.objects.count(), 1)
+        self.assertEqual(self.container.schedules.count(), 0)
+
+    def test_occurrences_block_one_off_bookings(self):
+        week_three = self.tuesday + timedelta(weeks=3)
+        with self.assertRaises(BookingConflict) as ctx:
+            book(self.other, self.at(week_three, 14), self.at(week_three, 15))
+        self.assertEqual(ctx.exception.conflicts[0].recurring, self.rule)
+        book(self.other, self.at(week_three, 16), self.at(week_three, 17))
+
+    def test_exception_day_is_free(self):
+        self.rule.exceptions = [self.tuesday.isoformat()]
+        book_recurring(self.rule)
+        book(self.other, self.at(self.tuesday, 13), self.at(self.tuesday, 16))
+
+    def test_overlapping_rule_is_rejected(self):
+        thursday_and_tuesday = tuesday_lab(container=self.other, weekdays=[1, 3], start_time=time(15),
+                                           first_date=self.tuesday, until=None)
+        with self.assertRaises(BookingConflict):
+            book_recurring(thursday_and_tuesday)
+        self.assertEqual(RecurringSchedule.objects.count(), 1)
+
+    def test_open_ended_rules_meeting_after_the_search_window_are_rejected(self):
+        monday = self.tuesday + timedelta(days=6)
+        every_third = book_recurring(tuesday_lab(container=self.container, weekdays=[0], interval=3,
+                                                 start_time=time(9), first_date=monday, until=None))
+        # Both land on monday + 3 weeks, two weeks past SEARCH_DAYS from its start
+        every_other = tuesday_lab(container=self.other, weekdays=[0], interval=2, start_time=time(9, 30),
+                                  first_date=monday + timedelta(weeks=1), until=None)
+        with self.assertRaises(BookingConflict) as ctx:
+            book_recurring(every_other)
+        self.assertEqual(ctx.exception.conflicts[0].recurring, every_third)
+        self.assertEqual(ctx.exception.conflicts[0].start_datetime.date(), monday + timedelta(weeks=3))
+
+    def test_open_ended_rules_that_never_meet_are_accepted(self):
+        monday = self.tuesday + timedelta(days=6)
+        book_recurring(tuesday_lab(container=self.container, weekdays=[0], interval=2, start_time=time(9),
+                                   first_date=monday, until=None))
+        book_recurring(tuesday_lab(container=self.other, weekdays=[0], interval=2, start_time=time(9),
+                                   first_date=monday + timedelta(weeks=1), until=None))
+        self.assertEqual(RecurringSchedule.objects.count(), 3)
+
+    def test_open_ended_rule_is_checked_up_to_the_last_booking(self):
+        wednesday = self.tuesday + timedelta(weeks=5, days=1)
+        book(self.other, self.at(wednesday, 9), self.at(wednesday, 10))
+        with self.assertRaises(BookingConflict):
+            book_recurring(tuesday_lab(container=self.container, weekdays=[2], start_time=time(9, 30),
+                                       first_date=self.tuesday, until=None))
+
+    def test_free_slots_and_calendar_include_occurrences(self):
+        slots = free_slots(timedelta(hours=2), count=1, after=self.at(self.tuesday, 12))
+        self.assertEqual(slots, [(self.at(self.tuesday, 16), self.at(self.tuesday, 18))])
+
+        events = calendar(self.at(self.tuesday, 0), self.at(self.tuesday + timedelta(days=14), 0))
+        self.assertEqual([e['recurring'] for e in events], [self.rule.id, self.rule.id])
+
+    def test_admin_form_creates_rule(self):
+        admin = CustomUser.objects.create_superuser(username='admin', password='secure', email='a@x.io')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('create-recurring-schedule', args=[self.other.user_id]), {
+            'frequency': 'weekly', 'weekdays': ['3'], 'start_time': '09:00', 'end_time': '12:00',
+            'first_date': self.tuesday.isoformat(), 'exceptions': '', 'active': 'on',
+        })
+        self.assertRedirects(response, reverse('create_schedule', args=[self.other.user_id]),
+                             fetch_redirect_response=False)
+        rule = RecurringSchedule.objects.get(container=self.other)
+        self.assertEqual((rule.weekdays, rule.duration), ([3], timedelta(hours=3)))
+
+
+@override_settings(BOOKINGS=BOOKINGS)
+class RecurringJobsTestCase(TestCase):
+    def setUp(self):
+        self.scheduler = BackgroundScheduler(jobstores={'default': MemoryJobStore()})
+        self.scheduler.start(paused=True)
+        self.addCleanup(self.scheduler.shutdown, wait=False)
+        patcher = patch.object(scheduler_module, 'scheduler', self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        teacher = CustomUser.objects.create_user(username='teacher', password='secure', role='teacher')
+        container = DockerContainer.objects.create(user=teacher, container_id='c1')
+        today = timezone.now().date()
+        self.rule = RecurringSchedule.objects.create(
+            container=container, frequency='daily', start_time=time(13), duration=timedelta(hours=3),
+            first_date=today + timedelta(days=1), until=today + timedelta(days=120),
+        )
+
+    def test_only_next_occurrence_is_registered(self):
+        sync_recurring_jobs()
+        jobs = sorted(job.id for job in self.scheduler.get_jobs())
+        stamp = (timezone.now().date() + timedelta(days=1)).strftime('%Y%m%d') + '1300'
+        self.assertEqual(jobs, [f'recurring_{self.rule.pk}_end_{stamp}', f'recurring_{self.rule.pk}_start_{stamp}'])
+        self.assertEqual(sync_recurring_jobs(), {'added': 0, 'modified': 0, 'removed': 0})
+
+    def test_after_an_occurrence_the_next_one_is_registered(self):
+        first_end = datetime.combine(self.rule.first_date, time(16))
+        jobs = recurring_jobs(self.rule, now=first_end)
+        self.assertEqual(
+            [spec['trigger'].run_date.replace(tzinfo=None) for spec in jobs.values()],
+            [datetime.combine(self.rule.first_date + timedelta(days=1), time(h)) for h in (13, 16)]
+        )
+
+    def test_end_job_resyncs_its_rule(self):
+        from core.jobs import end_recurring_occurrence
+        with patch('core.jobs.reset_access_and_restart', return_value={}) as reset:
+            end_recurring_occurrence(self.rule.pk, timezone.now())
+        reset.assert_called_once()
+        self.assertEqual(len(self.scheduler.get_jobs()), 2)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import CustomUser
+from core import scheduler as scheduler_module
+from core.models import ContainerSchedule, DockerContainer
+from core.scheduler import job_signature, sync_schedule_jobs
+
+
+def paused_scheduler():
+    scheduler = BackgroundScheduler(jobstores={'default': MemoryJobStore()})
+    scheduler.start(paused=True)
+    return scheduler
+
+
+def signatures(scheduler):
+    return {job.id: job_signature(job.func_ref, job.trigger, job.args) for job in scheduler.get_jobs()}
+
+
+class ScheduleSyncTestCase(TestCase):
+    def setUp(self):
+        self.scheduler = paused_scheduler()
+        self.addCleanup(self.scheduler.shutdown, wait=False)
+        patcher = patch.object(scheduler_module, 'scheduler', self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        now = timezone.now()
+        self.schedules = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(username=f'doc{i}', password='secure', role='doctoral')
+            container = DockerContainer.objects.create(user=user, container_id=f'c{i}')
+            self.schedules.append(ContainerSchedule.objects.create(
+                container=container,
+                start_datetime=now + timedelta(hours=i + 1),
+                end_datetime=now + timedelta(hours=i + 2),
+            ))
+        sync_schedule_jobs()
+
+    def full_rebuild(self):
+        fresh = paused_scheduler()
+        self.addCleanup(fresh.shutdown, wait=False)
+        with patch.object(scheduler_module, 'scheduler', fresh):
+            sync_schedule_jobs()
+        return signatures(fresh)
+
+    def test_edit_touches_only_that_schedules_jobs(self):
+        untouched = self.scheduler.get_job(f'exclusive_start_{self.schedules[0].pk}')
+        edited = self.schedules[1]
+        edited.end_datetime += timedelta(minutes=30)
+
+        with patch.object(self.scheduler, 'add_job', wraps=self.scheduler.add_job) as add_job, \
+                self.captureOnCommitCallbacks(execute=True):
+            edited.save()
+
+        add_job.assert_called_once()
+        self.assertEqual(add_job.call_args.kwargs['id'], f'exclusive_end_{edited.pk}')
+        self.assertIs(self.scheduler.get_job(untouched.id).trigger.run_date, untouched.trigger.run_date)
+        self.assertEqual(signatures(self.scheduler), self.full_rebuild())
+
+    def test_delete_and_deactivate_remove_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedules[0].delete()
+            self.schedules[2].active = False
+            self.schedules[2].save()
+
+        self.assertEqual(
+            set(signatures(self.scheduler)),
+            {f'exclusive_start_{self.schedules[1].pk}', f'exclusive_end_{self.schedules[1].pk}'}
+        )
+        self.assertEqual(signatures(self.scheduler), self.full_rebuild())
+
+    def test_window_in_progress_keeps_its_end_job(self):
+        schedule = self.schedules[0]
+        schedule.start_datetime = timezone.now() - timedelta(minutes=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule.save()
+
+        self.assertIsNone(self.scheduler.get_job(f'exclusive_start_{schedule.pk}'))
+        self.assertIsNotNone(self.scheduler.get_job(f'exclusive_end_{schedule.pk}'))
+
+    def test_resync_without_changes_is_a_no_op(self):
+        self.assertEqual(sync_schedule_jobs(), {'added': 0, 'modified': 0, 'removed': 0})
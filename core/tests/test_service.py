@@ -0,0 +1,99 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import service
+from core.models import SchedulerLease
+from core.service import DatabaseLock, FileLock, SchedulerService, request_sync
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}  # no Redis needed
+
+
+class LockTestCase(TestCase):
+    def test_database_lease_has_one_holder_until_it_lapses(self):
+        first, second = DatabaseLock(ttl=30), DatabaseLock(ttl=30)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(first.renew())
+
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(second.acquire())
+        self.assertFalse(first.renew())
+
+        second.release()
+        self.assertTrue(first.acquire())
+
+    def test_file_lock_is_exclusive(self):
+        path = os.path.join(tempfile.mkdtemp(), 'scheduler.lock')
+        first, second = FileLock(path), FileLock(path)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+
+
+class ServiceElectionTestCase(TestCase):
+    def setUp(self):
+        self.scheduler = MagicMock()
+        for name, target in [('scheduler', self.scheduler), ('start_scheduler', MagicMock()),
+                             ('reload_schedules', MagicMock())]:
+            patcher = patch(f'core.scheduler.{name}', target)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.addCleanup(service._demoted.clear)
+
+    def test_only_the_leader_starts_the_scheduler(self):
+        leader, standby = SchedulerService(DatabaseLock()), SchedulerService(DatabaseLock())
+
+        self.assertTrue(leader.elect())
+        self.assertFalse(standby.elect())
+        self.start_scheduler.assert_called_once()
+
+    def test_standby_takes_over_and_old_leader_pauses(self):
+        leader, standby = SchedulerService(DatabaseLock()), SchedulerService(DatabaseLock())
+        leader.elect()
+        standby.elect()
+
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(standby.elect())
+        self.assertEqual(self.start_scheduler.call_count, 2)
+
+        self.assertFalse(leader.elect())
+        self.scheduler.pause.assert_called_once()
+
+        # Regaining the lead resumes the paused scheduler after a full sync
+        standby.lock.release()
+        self.assertTrue(leader.elect())
+        self.reload_schedules.assert_called_once()
+        self.scheduler.resume.assert_called_once()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class RequestSyncTestCase(TestCase):
+    def test_web_worker_signals_the_leader(self):
+        with patch('core.scheduler.scheduler', MagicMock(running=False)), \
+                patch('core.scheduler.sync_schedule_jobs') as sync:
+            request_sync('schedule', [4])
+        sync.assert_not_called()
+
+        message = async_to_sync(get_channel_layer().receive)('scheduler-control')
+        self.assertEqual(message, {'type': 'scheduler.sync', 'kind': 'schedule', 'ids': [4]})
+
+        with patch('core.scheduler.sync_schedule_jobs') as sync:
+            SchedulerService(MagicMock()).handle(message)
+        sync.assert_called_once_with([4])
+
+    def test_leader_syncs_in_process(self):
+        with patch('core.scheduler.scheduler', MagicMock(running=True)), \
+                patch('core.scheduler.sync_recurring_jobs') as sync:
+            request_sync('recurring', [2])
+        sync.assert_called_once_with([2])
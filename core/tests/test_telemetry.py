@@ -0,0 +1,115 @@
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.test import TransactionTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.models import JobRun
+from core.telemetry import JOB_EVENTS, job_kind, job_run_summary, job_telemetry, prune_job_runs, record_job_event
+
+JOB_TELEMETRY = {
+    'ALWAYS_RECORD': ('exclusive_', 'recurring_'),
+    'RETENTION_DAYS': 30,
+    'MAX_ROWS': 5,
+    'SUMMARY_DAYS': 7,
+    'PRUNE_HOURS': 6,
+}
+
+def window_transition(scheduled_for):
+    return {'transition': 'stop_all_except', 'ok': 3, 'failed': 1, 'duration': 0.5, 'start_delay': 2.0}
+
+
+def broken_service_job():
+    raise RuntimeError("docker went away")
+
+
+def quiet_service_job():
+    return None
+
+
+@override_settings(JOB_TELEMETRY=JOB_TELEMETRY)
+class ListenerTestCase(TransactionTestCase):
+    def test_executions_are_recorded_from_scheduler_events(self):
+        scheduler = BackgroundScheduler(jobstores={'default': MemoryJobStore()})
+        scheduler.add_listener(record_job_event, JOB_EVENTS)
+        scheduler.start()
+        now = datetime.now(scheduler.timezone)
+
+        scheduler.add_job(window_transition, 'date', run_date=now, args=[now], id='exclusive_start_7')
+        scheduler.add_job(quiet_service_job, 'date', run_date=now, id='reconcile_containers')
+        scheduler.add_job(broken_service_job, 'date', run_date=now, id='collect_host_stats')
+        deadline = time.monotonic() + 5
+        while JobRun.objects.count() < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        scheduler.shutdown(wait=True)
+
+        runs = {run.job_id: run for run in JobRun.objects.all()}
+        self.assertEqual(set(runs), {'exclusive_start_7', 'collect_host_stats'})
+        window = runs['exclusive_start_7']
+        self.assertEqual((window.kind, window.status, window.containers_ok, window.containers_failed),
+                         ('exclusive_start', 'partial', 3, 1))
+        self.assertAlmostEqual(window.lateness, 2.0)
+        self.assertEqual(runs['collect_host_stats'].status, 'failed')
+        self.assertIn('docker went away', runs['collect_host_stats'].error)
+
+
+@override_settings(JOB_TELEMETRY=JOB_TELEMETRY)
+class TelemetryTestCase(TestCase):
+    def run_at(self, minutes_ago, lateness, status='ok', kind='exclusive_start'):
+        planned = timezone.now() - timedelta(minutes=minutes_ago)
+        return JobRun.objects.create(
+            job_id=f'{kind}_1', kind=kind, status=status, scheduled_for=planned,
+            started_at=planned + timedelta(seconds=lateness) if status != 'missed' else None,
+        )
+
+    def test_job_kind_drops_ids_and_timestamps(self):
+        self.assertEqual(job_kind('exclusive_end_12'), 'exclusive_end')
+        self.assertEqual(job_kind('recurring_3_start_202501071300'), 'recurring_start')
+        self.assertEqual(job_kind('reconcile_containers'), 'reconcile_containers')
+
+    def test_summary_reports_p95_and_failure_rate(self):
+        for i in range(19):
+            self.run_at(i, lateness=1)
+        self.run_at(20, lateness=60)
+        self.run_at(21, lateness=0, status='missed', kind='exclusive_end')
+        self.run_at(60 * 24 * 10, lateness=999)  # outside the window
+
+        summary = job_run_summary()
+
+        self.assertEqual(summary['overall']['runs'], 21)
+        self.assertEqual(summary['overall']['lateness_p95'], 1)
+        self.assertEqual(summary['overall']['lateness_max'], 60)
+        self.assertEqual(summary['overall']['failure_rate'], round(1 / 21 * 100, 1))
+        self.assertEqual(summary['kinds']['exclusive_end']['missed'], 1)
+
+    def test_prune_applies_retention_and_row_cap(self):
+        self.run_at(60 * 24 * 31, lateness=0)
+        for i in range(7):
+            self.run_at(i, lateness=0)
+
+        with patch('django_apscheduler.models.DjangoJobExecution.objects.delete_old_job_executions') as old:
+            self.assertEqual(prune_job_runs(), 3)
+
+        old.assert_called_once_with(30 * 86400)
+        self.assertEqual(JobRun.objects.count(), 5)
+        self.assertFalse(JobRun.objects.filter(scheduled_for__lt=timezone.now() - timedelta(minutes=5)).exists())
+
+    def test_successful_service_jobs_are_not_recorded(self):
+        self.assertIsNone(job_telemetry.record('reconcile_containers', timezone.now(), started_at=timezone.now()))
+        self.assertIsNotNone(job_telemetry.record('reconcile_containers', timezone.now(), status='missed'))
+
+    def test_dashboard_shows_scheduler_health(self):
+        self.run_at(1, lateness=4, status='failed')
+        admin = CustomUser.objects.create_superuser(username='admin', password='secure', email='a@x.io')
+        self.client.force_login(admin)
+
+        with patch('core.views.get_user_container_stats', return_value={}):
+            response = self.client.get(reverse('superuser-dashboard'))
+
+        self.assertContains(response, 'Scheduler health')
+        self.assertEqual(response.context['job_summary']['overall']['failure_rate'], 100.0)
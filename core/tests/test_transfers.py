@@ -0,0 +1,198 @@
+import errno
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.file_index import BrowseError
+from core.models import FileTransfer, UserFile
+from core.transfers import cancel_transfer, queue_transfer, recover_transfers, run_transfer
+
+FILE_TRANSFERS = {'WORKERS': 1, 'MAX_ITEMS': 10, 'BLOCK_BYTES': 4096, 'PROGRESS_SECONDS': 0, 'STALE_MINUTES': 15}
+
+
+@override_settings(FILE_TRANSFERS=FILE_TRANSFERS)
+@patch('core.transfers._notify')
+class TransferTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = CustomUser.objects.create_user(username='doc', password='secure', role='doctoral', role_verified=True)
+        self.workspace = os.path.join(self.media, f'user_{self.user.id}_doc')
+        self.write('data/set/train.csv', b'a' * 10_000)
+        self.write('data/set/nested/test.csv', b'b' * 5_000)
+        self.write('data/notes.txt', b'notes')
+        os.symlink('/etc/passwd', self.path('data/set/passwd'))
+        os.makedirs(self.path('backup'))
+
+    def path(self, relative):
+        return os.path.join(self.workspace, relative)
+
+    def write(self, relative, data):
+        os.makedirs(os.path.dirname(self.path(relative)), exist_ok=True)
+        with open(self.path(relative), 'wb') as out:
+            out.write(data)
+
+    def read(self, relative):
+        with open(self.path(relative), 'rb') as source:
+            return source.read()
+
+    def transfer(self, action, paths, destination):
+        return run_transfer(queue_transfer(self.user, action, paths, destination).pk)
+
+    def test_copy_of_a_selection(self, notify):
+        job = self.transfer('copy', ['data/set', 'data/notes.txt'], 'backup')
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual((job.total_files, job.files_done), (4, 4))
+        self.assertEqual(job.bytes_done, 15_005)
+        self.assertEqual(self.read('backup/set/nested/test.csv'), b'b' * 5_000)
+        self.assertEqual(os.readlink(self.path('backup/set/passwd')), '/etc/passwd')
+        self.assertNotEqual(os.stat(self.path('backup/notes.txt')).st_ino, os.stat(self.path('data/notes.txt')).st_ino)
+        self.assertEqual(os.stat(self.path('backup/notes.txt')).st_mtime_ns, os.stat(self.path('data/notes.txt')).st_mtime_ns)
+        self.assertEqual(notify.call_args.args[0].status, 'complete')
+
+        again = self.transfer('copy', ['data/set', 'data/notes.txt'], 'backup')
+        self.assertEqual(again.created, ['backup/set_2', 'backup/notes_2.txt'])
+
+    def test_read_only_files_are_hardlinked_only_among_the_uploads(self, notify):
+        self.write('user_data/blob.bin', b'shared')
+        os.chmod(self.path('user_data/blob.bin'), 0o444)
+        os.makedirs(self.path('user_data/old'))
+
+        shared = self.transfer('copy', ['user_data/blob.bin'], 'user_data/old')
+        private = self.transfer('copy', ['user_data/blob.bin'], 'data')
+
+        self.assertEqual(shared.shared, 1)
+        self.assertTrue(os.path.samefile(self.path('user_data/blob.bin'), self.path('user_data/old/blob.bin')))
+        self.assertFalse(os.path.samefile(self.path('user_data/blob.bin'), self.path('data/blob.bin')))
+        self.assertTrue(os.stat(self.path('data/blob.bin')).st_mode & 0o200)
+        self.assertEqual(self.read('data/blob.bin'), b'shared')
+
+    @override_settings(BLOB_STORE={'ENABLED': True, 'DIR': 'blobs', 'MIN_SIZE': 0})
+    def test_moving_a_deduplicated_upload_into_a_mounted_folder_unshares_it(self, notify):
+        from core.blobs import adopt, blob_path
+
+        self.write('user_data/report.pdf', b'%PDF')
+        upload = UserFile.objects.create(user=self.user, file=f'user_{self.user.id}_doc/user_data/report.pdf')
+        upload.blob = adopt(self.path('user_data/report.pdf'))
+        upload.save()
+        blob = blob_path(upload.blob_id)
+
+        job = self.transfer('move', ['user_data'], 'data')
+
+        self.assertEqual(job.status, 'complete')
+        moved = self.path('data/user_data/report.pdf')
+        self.assertEqual(os.stat(moved).st_nlink, 1)
+        self.assertTrue(os.stat(moved).st_mode & 0o200)
+        self.assertFalse(os.path.exists(blob))  # no other reference: released
+        upload.refresh_from_db()
+        self.assertIsNone(upload.blob)
+        self.assertEqual(upload.file.name, f'user_{self.user.id}_doc/data/user_data/report.pdf')
+
+    def test_copy_falls_back_when_copy_file_range_is_refused(self, notify):
+        with patch('os.copy_file_range', side_effect=OSError(errno.EXDEV, 'cross-device')):
+            job = self.transfer('copy', ['data/set/train.csv'], 'backup')
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual(self.read('backup/train.csv'), b'a' * 10_000)
+
+    def test_copying_a_folder_into_itself_fails(self, notify):
+        job = self.transfer('copy', ['data/set'], 'data/set/nested')
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('into itself', job.error)
+        self.assertEqual(os.listdir(self.path('data/set/nested')), ['test.csv'])
+
+    def test_move_is_a_rename_and_keeps_uploads_registered(self, notify):
+        upload = UserFile.objects.create(user=self.user, file=f'user_{self.user.id}_doc/data/set/train.csv')
+        inode = os.stat(self.path('data/set/train.csv')).st_ino
+
+        job = self.transfer('move', ['data/set'], 'backup')
+
+        self.assertEqual((job.status, job.shared, job.bytes_done), ('complete', 1, 15_000))
+        self.assertFalse(os.path.exists(self.path('data/set')))
+        self.assertEqual(os.stat(self.path('backup/set/train.csv')).st_ino, inode)
+        upload.refresh_from_db()
+        self.assertEqual(upload.file.name, f'user_{self.user.id}_doc/backup/set/train.csv')
+
+    def test_move_across_filesystems_copies_then_deletes(self, notify):
+        real_rename = os.rename
+
+        def rename(source, target):
+            if source.endswith('notes.txt'):
+                raise OSError(errno.EXDEV, 'cross-device')
+            return real_rename(source, target)
+
+        with patch('core.transfers.os.rename', side_effect=rename):
+            job = self.transfer('move', ['data/notes.txt'], 'backup')
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual(self.read('backup/notes.txt'), b'notes')
+        self.assertFalse(os.path.exists(self.path('data/notes.txt')))
+
+    def test_cancelled_copy_removes_what_it_wrote(self, notify):
+        notify.side_effect = lambda job: job.bytes_done > 4096 and cancel_transfer(job)
+
+        job = self.transfer('copy', ['data/set'], 'backup')
+
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(os.listdir(self.path('backup')), [])
+
+    def test_paths_outside_the_workspace_are_refused(self, notify):
+        for paths, destination in ((['../'], 'backup'), (['data/notes.txt'], '../..'), ([''], 'backup'),
+                                   (['data/missing'], 'backup'), (['data/notes.txt'], 'data/notes.txt')):
+            with self.assertRaises(BrowseError):
+                queue_transfer(self.user, 'copy', paths, destination)
+
+    def test_recovery(self, notify):
+        interrupted = FileTransfer.objects.create(user=self.user, action='copy', sources=['data/notes.txt'],
+                                                  destination='backup', status='running', created=['backup/notes.txt'])
+        self.write('backup/notes.txt', b'half')
+        forgotten = queue_transfer(self.user, 'copy', ['data/notes.txt'], 'data')
+        old = timezone.now() - timedelta(hours=1)
+        FileTransfer.objects.update(updated_at=old, created_at=old)
+
+        self.assertEqual(recover_transfers(), 1)
+
+        interrupted.refresh_from_db()
+        forgotten.refresh_from_db()
+        self.assertEqual(interrupted.status, 'failed')
+        self.assertFalse(os.path.exists(self.path('backup/notes.txt')))
+        self.assertEqual(forgotten.status, 'complete')
+        self.assertEqual(self.read('data/notes_2.txt'), b'notes')
+
+    def test_clipboard_and_paste_views(self, notify):
+        self.client.force_login(self.user)
+        self.write('user_data/report.pdf', b'%PDF')
+        upload = UserFile.objects.create(user=self.user, file=f'user_{self.user.id}_doc/user_data/report.pdf')
+
+        copied = self.client.post(reverse('file-action'), {'action': 'copy', 'file_id': upload.id, 'path': 'data/notes.txt'})
+        self.assertEqual(copied.json(), {'success': True, 'count': 2})
+        self.assertEqual(self.client.get(reverse('clipboard')).json()['clipboard']['paths'],
+                         ['data/notes.txt', 'user_data/report.pdf'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            pasted = self.client.post(reverse('file-action'), {'action': 'paste', 'file_id': upload.id})
+        self.assertEqual(pasted.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        job = run_transfer(pasted.json()['job']['id'])
+
+        self.assertEqual(job.created, ['user_data/notes.txt', 'user_data/report_2.pdf'])
+        self.assertTrue(UserFile.objects.filter(file=f'user_{self.user.id}_doc/user_data/report_2.pdf').exists())
+        self.assertEqual(self.client.get(reverse('transfer-detail', args=[job.id])).json()['percent'], 100)
+
+        refused = self.client.post(reverse('file-action'), {'action': 'copy', 'path': '../../etc'})
+        self.assertFalse(refused.json()['success'])
+        renamed = self.client.post(reverse('file-action'), {'action': 'rename', 'file_id': upload.id, 'new_name': '../x.pdf'})
+        self.assertFalse(renamed.json()['success'])
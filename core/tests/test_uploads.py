@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.models import UploadSession, UserFile
+from core.uploads import hashers
+
+UPLOADS = {
+    'MAX_SIZE': 10 * 1024 * 1024,
+    'MAX_CHUNK_BYTES': 1024 * 1024,
+    'BLOCK_BYTES': 4096,
+    'EXPIRE_HOURS': 24,
+    'CLEANUP_MINUTES': 60,
+}
+
+
+class ResumableUploadTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, UPLOADS=UPLOADS)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user(
+            username='doc', password='secure', role='doctoral', role_verified=True, storage_limit=1
+        )
+        self.client.force_login(self.user)
+        self.data = os.urandom(300_000)
+
+    def create(self, size, name='data.bin', **extra):
+        metadata = f"filename {base64.b64encode(name.encode()).decode()}"
+        if 'sha256' in extra:
+            metadata += f",sha256 {base64.b64encode(extra['sha256'].encode()).decode()}"
+        return self.client.post(reverse('create-upload'), HTTP_UPLOAD_LENGTH=str(size), HTTP_UPLOAD_METADATA=metadata)
+
+    def patch(self, url, offset, chunk):
+        return self.client.patch(url, chunk, content_type='application/offset+octet-stream',
+                                 HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_resume_from_server_offset_and_register_file(self):
+        created = self.create(len(self.data), sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(created.status_code, 201)
+        url = created['Location']
+
+        self.assertEqual(self.patch(url, 0, self.data[:100_000])['Upload-Offset'], '100000')
+        # a retried chunk at a stale offset is refused with the real one
+        stale = self.patch(url, 0, self.data[:100_000])
+        self.assertEqual((stale.status_code, stale['Upload-Offset']), (409, '100000'))
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '100000')
+        self.assertFalse(UserFile.objects.exists())
+
+        hashers.drop(UploadSession.objects.get())  # as if the next chunk hit another worker
+        self.assertEqual(self.patch(url, 100_000, self.data[100_000:]).status_code, 204)
+
+        session = UploadSession.objects.get()
+        self.assertEqual(session.status, 'complete')
+        self.assertEqual(session.sha256, hashlib.sha256(self.data).hexdigest())
+        with open(session.user_file.file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertTrue(session.user_file.file.name.startswith(f'user_{self.user.id}_doc/user_data/'))
+
+    def test_quota_is_checked_before_any_bytes_are_written(self):
+        self.assertEqual(self.create(700_000).status_code, 201)
+
+        refused = self.create(400_000, name='second.bin')  # 1 MB quota, 700 KB reserved
+
+        self.assertEqual(refused.status_code, 413)
+        self.assertEqual(UploadSession.objects.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media, f'user_{self.user.id}_doc/user_data/second.bin')))
+
+    def test_checksum_mismatch_discards_upload(self):
+        url = self.create(len(self.data), sha256='0' * 64)['Location']
+
+        response = self.patch(url, 0, self.data)
+
+        self.assertEqual(response.status_code, 460)
+        session = UploadSession.objects.get()
+        self.assertEqual(session.status, 'aborted')
+        self.assertFalse(os.path.exists(os.path.join(self.media, session.path)))
+        self.assertFalse(UserFile.objects.exists())
+
+    def test_chunk_past_declared_length_is_rejected(self):
+        url = self.create(10)['Location']
+
+        self.assertEqual(self.patch(url, 0, b'x' * 11).status_code, 400)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '0')
+
+    def test_other_users_cannot_touch_an_upload(self):
+        url = self.create(10)['Location']
+        other = CustomUser.objects.create_user(username='other', password='secure', role='master', role_verified=True)
+        self.client.force_login(other)
+
+        self.assertEqual(self.client.head(url).status_code, 404)
+        self.assertEqual(self.patch(url, 0, b'x' * 10).status_code, 404)
+
+    def test_idle_uploads_expire(self):
+        from core.uploads import expire_uploads
+        url = self.create(10)['Location']
+        self.patch(url, 0, b'x' * 4)
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(expire_uploads(), 1)
+
+        session = UploadSession.objects.get()
+        self.assertEqual(session.status, 'aborted')
+        self.assertFalse(os.path.exists(os.path.join(self.media, session.path)))
@@ -0,0 +1,184 @@
+import os
+import tempfile
+import shutil
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import CustomUser
+from core.docker_utils import LABEL_MANAGED, LABEL_POOL, LABEL_USER, DockerManager
+from core.models import DockerContainer, SchedulerLease
+from core.warm_pool import REFILL_LOCK_NAME, WarmPool
+
+
+POOL = {
+    'ENABLED': True,
+    'SIZES': {'tensorflow': 2, 'pytorch': 2},
+    'MEM_LIMIT_MB': 1024,
+    'CPU_LIMIT': 0.5,
+    'MAX_MEM_MB': 3072,
+    'MAX_CPUS': 2,
+    'GPU': True,
+}
+
+
+def fake_container(name, port=40000, token='pooltoken'):
+    container = MagicMock()
+    container.name = name
+    container.id = f"{name}_id"
+    container.attrs = {
+        'HostConfig': {'PortBindings': {'8888/tcp': [{'HostPort': str(port)}]}},
+        'Config': {'Env': [f'JUPYTER_TOKEN={token}', 'GRANT_SUDO=yes']},
+    }
+    return container
+
+
+class WarmPoolTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, WARM_POOL=POOL)
+        self.override.enable()
+
+        self.manager = MagicMock()
+        self.manager._limits.return_value = {}
+        self.manager._user_limits.return_value = {'mem_limit': '8192m'}
+        self.manager._volume_binds.return_value = {}
+        self.pool = WarmPool(self.manager)
+        self.pool.refill_async = MagicMock()
+
+        self.user = CustomUser.objects.create_user(username='student', password='secure', gpu_access=True)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _make_slot(self, name):
+        for key in ('jupyter', 'models', 'data'):
+            os.makedirs(os.path.join(self.media_root, 'warm_pool', name, key))
+
+    def _make_user_dirs(self):
+        dirs = {}
+        for key in ('jupyter', 'models', 'data'):
+            dirs[key] = os.path.join(self.media_root, 'user_1_student', key)
+            os.makedirs(dirs[key])
+        with open(os.path.join(dirs['data'], 'train.csv'), 'w') as f:
+            f.write('x')
+        return dirs
+
+    def test_claim_binds_pool_container_to_user(self):
+        self._make_slot('pool_tensorflow_a')
+        slot_inode = os.stat(os.path.join(self.media_root, 'warm_pool', 'pool_tensorflow_a', 'data')).st_ino
+        container = fake_container('pool_tensorflow_a', port=41000, token='abc')
+        self.manager.client.containers.list.return_value = [container]
+        dirs = self._make_user_dirs()
+
+        result = self.pool.claim(self.user, 'my-tf', dirs, 'jupyter_1_student')
+
+        self.assertEqual(result, (container, 41000, 'abc'))
+        container.rename.assert_called_once_with('jupyter_1_student')
+        container.update.assert_called_once_with(mem_limit='8192m')
+        # The pool container's mounted directory now is the user's data dir,
+        # with the user's existing files moved into it.
+        self.assertEqual(os.stat(dirs['data']).st_ino, slot_inode)
+        self.assertTrue(os.path.exists(os.path.join(dirs['data'], 'train.csv')))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'warm_pool', 'pool_tensorflow_a')))
+
+    def test_claim_skips_slot_taken_by_other_worker(self):
+        # No slot directory: the container was already claimed elsewhere.
+        self.manager.client.containers.list.return_value = [fake_container('pool_tensorflow_b')]
+        self.assertIsNone(self.pool.claim(self.user, 'my-tf', self._make_user_dirs(), 'jupyter_1_student'))
+
+    def test_claim_ignores_unknown_image(self):
+        self.assertIsNone(self.pool.claim(self.user, 'custom-image', {}, 'jupyter_1_student'))
+
+    def test_refill_stays_within_budget(self):
+        self.manager.client.containers.list.return_value = []
+        self.pool.refill()
+        # 4 containers wanted, but the memory budget only allows 3.
+        self.assertEqual(self.manager.client.containers.run.call_count, 3)
+
+    def test_failed_swap_puts_the_users_directory_back(self):
+        self._make_slot('pool_tensorflow_c')
+        self.manager.client.containers.list.return_value = [fake_container('pool_tensorflow_c')]
+        dirs = self._make_user_dirs()
+        rename = os.rename
+
+        def failing_rename(src, dst):
+            if dst == dirs['data'] and 'warm_pool' in src:
+                raise OSError('cross-device link')
+            rename(src, dst)
+
+        with patch('core.warm_pool.os.rename', side_effect=failing_rename):
+            self.assertIsNone(self.pool.claim(self.user, 'my-tf', dirs, 'jupyter_1_student'))
+
+        self.assertTrue(os.path.exists(os.path.join(dirs['data'], 'train.csv')))
+        self.assertFalse(os.path.exists(f"{dirs['data']}.pool-old"))
+
+    def test_refill_waits_for_another_process(self):
+        self.manager.client.containers.list.return_value = []
+        SchedulerLease.objects.create(name=REFILL_LOCK_NAME, holder='web-2', expires_at=timezone.now() + timedelta(minutes=5))
+
+        self.pool.refill()
+        self.manager.client.containers.run.assert_not_called()
+
+        SchedulerLease.objects.filter(name=REFILL_LOCK_NAME).update(expires_at=timezone.now())
+        self.pool.refill()
+        self.assertEqual(self.manager.client.containers.run.call_count, 3)
+        self.assertEqual(SchedulerLease.objects.get(name=REFILL_LOCK_NAME).holder, '')
+
+
+@override_settings(WARM_POOL=POOL)
+class ClaimedContainerRestartTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.engine = MagicMock()
+        with patch('core.docker_utils.docker.from_env', return_value=self.engine):
+            self.manager = DockerManager()
+        self.pool = WarmPool(self.manager)
+        self.pool.refill_async = MagicMock()
+        self.user = CustomUser.objects.create_user(username='student', password='secure', gpu_access=True)
+
+        self.slot = os.path.join(self.media_root, 'warm_pool', 'pool_tensorflow_a')
+        for key in ('jupyter', 'models', 'data'):
+            os.makedirs(os.path.join(self.slot, key))
+        self.container = fake_container('pool_tensorflow_a', port=41000, token='abc')
+        self.container.status = 'running'
+        self.container.attrs['Config']['Labels'] = {LABEL_MANAGED: '1', LABEL_POOL: 'tensorflow'}
+        self.container.attrs['HostConfig']['Runtime'] = 'nvidia'
+        self.engine.containers.list.return_value = [self.container]
+        self.engine.containers.get.return_value = self.container
+
+    @patch('core.docker_utils.readiness_prober')
+    def test_restarted_claimed_container_mounts_the_users_dirs(self, prober):
+        dirs = self.manager._prepare_user_directories(self.user)
+        slot_inode = os.stat(os.path.join(self.slot, 'data')).st_ino
+        container, port, token = self.pool.claim(self.user, 'my-tf', dirs, 'jupyter_1_student')
+        # The running process keeps its mounts, which are now the user's dirs
+        self.assertEqual(os.stat(dirs['data']).st_ino, slot_inode)
+        row = DockerContainer.objects.create(
+            user=self.user, container_id=container.id, image_name='my-tf:latest',
+            jupyter_port=port, jupyter_token=token, status='stopped'
+        )
+
+        self.container.status = 'exited'
+        recreated = MagicMock(id='recreated_id', status='created')
+        self.engine.containers.create.return_value = recreated
+        self.assertTrue(self.manager.manage_container(self.user, 'start', 'jupyter'))
+
+        self.container.remove.assert_called_once_with(force=True)
+        kwargs = self.engine.containers.create.call_args.kwargs
+        self.assertEqual(set(kwargs['volumes']), {dirs['jupyter'], dirs['models'], dirs['data']})
+        self.assertEqual(kwargs['labels'], {LABEL_MANAGED: '1', LABEL_USER: str(self.user.id)})
+        self.assertEqual((kwargs['ports'], kwargs['environment']['JUPYTER_TOKEN']), ({'8888/tcp': 41000}, 'abc'))
+        self.assertEqual(kwargs['runtime'], 'nvidia')
+        recreated.start.assert_called_once()
+        row.refresh_from_db()
+        self.assertEqual(row.container_id, 'recreated_id')
+        self.assertFalse(os.path.exists(self.slot))
@@ -0,0 +1,411 @@
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .blobs import release
+from .file_index import BrowseError, resolve
+from .file_utils import ensure_workspace_exists
+from .models import CustomUser, FileTransfer, UserFile
+from .readiness import notify_user
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # linux/fs.h: share the extents of another file (btrfs, xfs, ...)
+# Upload folders, never mounted into a container: the only places a blob's
+# inode may be shared. Everywhere else a container could write through it.
+SHARED_DIRS = ('user_data', 'user_model')
+
+
+class TransferError(Exception):
+    pass
+
+
+class TransferCancelled(TransferError):
+    pass
+
+
+def _measure(path: str) -> Tuple[int, int]:
+    """Files and bytes under ``path``; links count as one empty file."""
+    if os.path.islink(path) or not os.path.isdir(path):
+        return 1, 0 if os.path.islink(path) else os.path.getsize(path)
+    files = size = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    files += 1
+                    if entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def _free_name(path: str) -> str:
+    """``path``, or ``name_2.ext``, ``name_3.ext``... when it is taken."""
+    if not os.path.lexists(path):
+        return path
+    base, ext = os.path.splitext(path)
+    if os.path.isdir(path):
+        base, ext = path, ''
+    n = 2
+    while os.path.lexists(f"{base}_{n}{ext}"):
+        n += 1
+    return f"{base}_{n}{ext}"
+
+
+def _reflink(source_fd: int, target_fd: int) -> bool:
+    try:
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+        return True
+    except OSError:
+        return False
+
+
+class _Transfer:
+    """Runs one job. Copies try, in order: a hardlink for read-only files
+    (deduplicated uploads) staying among the uploads, a reflink, then
+    ``copy_file_range`` in blocks so the data never passes through Python.
+    Moves are renames; only a move across filesystems copies and deletes.
+    Linked files moved out of the upload folders get a private copy first."""
+
+    def __init__(self, job: FileTransfer, workspace: str):
+        self.job = job
+        self.workspace = workspace
+        self.media_root = os.path.realpath(settings.MEDIA_ROOT)
+        self.block = settings.FILE_TRANSFERS['BLOCK_BYTES']
+        self._next_tick = 0.0
+
+    def _refresh(self):
+        job = self.job
+        FileTransfer.objects.filter(pk=job.pk).update(
+            files_done=job.files_done, bytes_done=job.bytes_done, shared=job.shared, created=job.created,
+            updated_at=timezone.now(),
+        )
+        if FileTransfer.objects.filter(pk=job.pk, status='cancelled').exists():
+            raise TransferCancelled("Cancelled")
+        _notify(job)
+        self._next_tick = time.monotonic() + settings.FILE_TRANSFERS['PROGRESS_SECONDS']
+
+    def _advance(self, files: int = 0, size: int = 0):
+        self.job.files_done += files
+        self.job.bytes_done += size
+        if time.monotonic() >= self._next_tick:
+            self._refresh()
+
+    def _shareable(self, target: str) -> bool:
+        top = os.path.relpath(target, self.workspace).split(os.sep)[0]
+        return top in SHARED_DIRS
+
+    def _copy_data(self, source: str, target: str, st: os.stat_result, progress: bool = True):
+        advance = self._advance if progress else lambda size: None
+        with open(source, 'rb') as src, open(target, 'xb') as dst:
+            if _reflink(src.fileno(), dst.fileno()):
+                if progress:
+                    self.job.shared += 1
+                advance(size=st.st_size)
+            else:
+                self._copy_blocks(src.fileno(), dst.fileno(), st.st_size, advance)
+        os.chmod(target, stat.S_IMODE(st.st_mode) | stat.S_IWUSR)  # copies are meant to be edited
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    def _copy_blocks(self, src: int, dst: int, size: int, advance):
+        done = 0
+        in_kernel = True
+        while done < size:
+            try:
+                if in_kernel:
+                    copied = os.copy_file_range(src, dst, self.block)
+                else:
+                    copied = os.sendfile(dst, src, None, self.block)
+            except OSError as e:
+                if not in_kernel or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+                in_kernel = False  # e.g. older kernels across filesystems
+                continue
+            if not copied:
+                break  # the file shrank while copying
+            done += copied
+            advance(size=copied)
+
+    def _copy_file(self, source: str, target: str):
+        st = os.lstat(source)
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(source), target)  # as a link: never copy what it points to
+        elif not st.st_mode & 0o222 and self._shareable(target):
+            # read-only content (e.g. a deduplicated upload) can share the inode
+            try:
+                os.link(source, target)
+                self.job.shared += 1
+                self._advance(size=st.st_size)
+            except OSError:
+                self._copy_data(source, target, st)
+        else:
+            self._copy_data(source, target, st)
+        self._advance(files=1)
+
+    def _copy_tree(self, source: str, target: str):
+        if os.path.islink(source) or not os.path.isdir(source):
+            self._copy_file(source, target)
+            return
+        os.mkdir(target)
+        with os.scandir(source) as scan:
+            names = sorted(entry.name for entry in scan)
+        for name in names:
+            self._copy_tree(os.path.join(source, name), os.path.join(target, name))
+        shutil.copystat(source, target, follow_symlinks=False)
+
+    def _storage_name(self, path: str) -> str:
+        return os.path.relpath(path, self.media_root)
+
+    def _register_copy(self, source: str, target: str):
+        """A copy of an uploaded file placed among the uploads is an upload too."""
+        if os.path.dirname(target) != os.path.join(self.workspace, 'user_data'):
+            return
+        original = UserFile.objects.filter(user=self.job.user, file=self._storage_name(source)).first()
+        if original is not None:
+            shared = os.path.samefile(source, target)
+            UserFile.objects.create(user=self.job.user, file=self._storage_name(target),
+                                    blob=original.blob if shared else None)
+
+    def _unshare(self, path: str):
+        """Replace files under ``path`` that have other links (blob store
+        entries) with private writable copies, before they leave the uploads."""
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            st = os.lstat(current)
+            if stat.S_ISDIR(st.st_mode):
+                with os.scandir(current) as scan:
+                    stack.extend(entry.path for entry in scan)
+            elif stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+                private = f"{current}.unshare"
+                self._copy_data(current, private, st, progress=False)
+                os.replace(private, current)
+
+    def _moved(self, source: str, target: str):
+        """Point registered files at their new place."""
+        old, new = self._storage_name(source), self._storage_name(target)
+        registered = UserFile.objects.filter(Q(file=old) | Q(file__startswith=f"{old}/"), user=self.job.user)
+        unshared = set()
+        for user_file in registered:
+            user_file.file.name = new + user_file.file.name[len(old):]
+            if user_file.blob_id and not self._shareable(target):
+                unshared.add(user_file.blob_id)
+                user_file.blob = None
+            user_file.save(update_fields=['file', 'blob'])
+        for digest in unshared:
+            release(digest)
+
+    def _move(self, source: str, target: str, files: int, size: int):
+        if not self._shareable(target):
+            self._unshare(source)
+        try:
+            os.rename(source, target)
+            self.job.shared += 1
+            self._advance(files, size)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            self._copy_tree(source, target)
+            if os.path.isdir(source) and not os.path.islink(source):
+                shutil.rmtree(source)
+            else:
+                os.remove(source)
+        self._moved(source, target)
+
+    def run(self):
+        job = self.job
+        destination = resolve(job.user, job.destination)
+        if not os.path.isdir(destination):
+            raise TransferError(f"{job.destination or '/'} is not a folder")
+        plan = []
+        for relative in job.sources:
+            source = os.path.join(self.workspace, relative)
+            if not os.path.lexists(source):
+                raise TransferError(f"{relative} no longer exists")
+            if os.path.isdir(source) and not os.path.islink(source) and \
+                    os.path.commonpath([source, destination]) == source:
+                raise TransferError(f"Cannot {job.action} {relative} into itself")
+            plan.append((source, *_measure(source)))
+        job.total_files = sum(files for _, files, _ in plan)
+        job.total_bytes = sum(size for _, _, size in plan)
+        job.save(update_fields=['total_files', 'total_bytes', 'updated_at'])
+        self._refresh()
+
+        for source, files, size in plan:
+            if job.action == 'move' and os.path.dirname(source) == destination:
+                self._advance(files, size)  # already there
+                continue
+            target = _free_name(os.path.join(destination, os.path.basename(source)))
+            job.created.append(os.path.relpath(target, self.workspace))
+            if job.action == 'move':
+                self._move(source, target, files, size)
+            else:
+                self._copy_tree(source, target)
+                self._register_copy(source, target)
+            self._refresh()
+
+
+def describe(job: FileTransfer) -> Dict:
+    return {
+        'id': str(job.id),
+        'action': job.action,
+        'items': len(job.sources),
+        'label': os.path.basename(job.sources[0]) if len(job.sources) == 1 else f"{len(job.sources)} items",
+        'destination': job.destination,
+        'status': job.status,
+        'files': job.files_done,
+        'total_files': job.total_files,
+        'bytes': job.bytes_done,
+        'total_bytes': job.total_bytes,
+        'percent': 100 if job.status == 'complete' else (
+            min(int(job.bytes_done * 100 / job.total_bytes), 99) if job.total_bytes else None),
+        'shared': job.shared,
+        'error': job.error,
+    }
+
+
+def _notify(job: FileTransfer):
+    async_to_sync(notify_user)(job.user_id, {'type': f'transfer.{job.status}', **describe(job)})
+
+
+def _remove_created(job: FileTransfer, workspace: str):
+    for relative in job.created:
+        path = os.path.join(workspace, relative)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+        UserFile.objects.filter(user=job.user, file=os.path.relpath(path, os.path.realpath(settings.MEDIA_ROOT))).delete()
+
+
+def run_transfer(job_id) -> Optional[FileTransfer]:
+    """Run a queued job; returns None when another worker claimed it."""
+    if not FileTransfer.objects.filter(pk=job_id, status='queued').update(status='running', updated_at=timezone.now()):
+        return None
+    job = FileTransfer.objects.select_related('user').get(pk=job_id)
+    workspace = os.path.realpath(ensure_workspace_exists(job.user))
+    started = time.monotonic()
+    try:
+        _Transfer(job, workspace).run()
+    except Exception as e:
+        if job.action == 'copy':
+            _remove_created(job, workspace)
+        # a move stops between items: what was moved stays moved
+        job.status = 'cancelled' if isinstance(e, TransferCancelled) else 'failed'
+        if job.status == 'failed':
+            job.error = str(e)
+            logger.error(f"[Transfers] {job.pk} ({job.action} {len(job.sources)} items) failed: {e}")
+    else:
+        job.status = 'complete'
+        logger.info(f"[Transfers] {job.user.username} {job.action} {len(job.sources)} items to /{job.destination}: "
+                    f"{job.files_done} files, {job.bytes_done} bytes, {job.shared} shared in {time.monotonic() - started:.1f}s")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'total_files', 'total_bytes', 'files_done', 'bytes_done', 'shared',
+                            'created', 'finished_at', 'updated_at'])
+    _notify(job)
+    return job
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.FILE_TRANSFERS['WORKERS'], thread_name_prefix='transfer')
+        return _pool
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_transfer(job_id)
+    except Exception as e:
+        logger.error(f"[Transfers] Worker failed on {job_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def workspace_paths(user: CustomUser, paths: List[str]) -> List[str]:
+    """``paths`` as clean workspace-relative paths; raises for anything outside
+    the workspace or the workspace itself."""
+    root = os.path.realpath(ensure_workspace_exists(user))
+    cleaned = []
+    for path in paths:
+        # resolve the folder only, so a link is moved / copied as a link
+        parent = resolve(user, os.path.dirname(path.strip('/')))
+        name = os.path.basename(path.strip('/'))
+        if name in ('', '.', '..'):
+            raise BrowseError(f"Cannot transfer {path or '/'}")
+        full = os.path.join(parent, name)
+        if not os.path.lexists(full):
+            raise BrowseError(f"{path} does not exist")
+        cleaned.append(os.path.relpath(full, root))
+    return list(dict.fromkeys(cleaned))
+
+
+def queue_transfer(user: CustomUser, action: str, paths: List[str], destination: str) -> FileTransfer:
+    """Queue a copy or move of workspace ``paths`` into the folder ``destination``."""
+    if action not in ('copy', 'move'):
+        raise TransferError(f"Invalid action: {action}")
+    sources = workspace_paths(user, paths)
+    if not sources:
+        raise TransferError("Nothing selected")
+    if len(sources) > settings.FILE_TRANSFERS['MAX_ITEMS']:
+        raise TransferError(f"At most {settings.FILE_TRANSFERS['MAX_ITEMS']} items per job")
+    folder = resolve(user, destination)
+    if not os.path.isdir(folder):
+        raise BrowseError(f"{destination or '/'} is not a folder")
+    relative = os.path.relpath(folder, os.path.realpath(ensure_workspace_exists(user)))
+    job = FileTransfer.objects.create(
+        user=user, action=action, sources=sources, destination='' if relative == '.' else relative,
+    )
+    transaction.on_commit(lambda: _executor().submit(_run_in_worker, job.pk))
+    logger.info(f"[Transfers] Queued {action} of {len(sources)} items to /{job.destination} as {job.pk}")
+    return job
+
+
+def cancel_transfer(job: FileTransfer) -> bool:
+    """Stop a queued or running job at its next progress check."""
+    return bool(FileTransfer.objects.filter(pk=job.pk, status__in=['queued', 'running']).update(
+        status='cancelled', finished_at=timezone.now(), updated_at=timezone.now(),
+    ))
+
+
+def recover_transfers() -> int:
+    """Fail jobs whose worker went away and run queued ones no worker picked up."""
+    cutoff = timezone.now() - timedelta(minutes=settings.FILE_TRANSFERS['STALE_MINUTES'])
+    stale = list(FileTransfer.objects.filter(status='running', updated_at__lt=cutoff).select_related('user'))
+    for job in stale:
+        if job.action == 'copy':
+            _remove_created(job, os.path.realpath(ensure_workspace_exists(job.user)))
+        job.status = 'failed'
+        job.error = "Interrupted"
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        _notify(job)
+    for job_id in list(FileTransfer.objects.filter(status='queued', created_at__lt=cutoff).values_list('pk', flat=True)):
+        run_transfer(job_id)
+    if stale:
+        logger.warning(f"[Transfers] Failed {len(stale)} interrupted transfers")
+    return len(stale)
@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import BinaryIO, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import adopt
+from .file_utils import get_user_workspace
+from .models import CustomUser, ExtractionJob, UploadSession, UserFile, user_file_path
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class QuotaExceeded(UploadError):
+    status = 413
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class ChecksumMismatch(UploadError):
+    status = 460  # as in the tus checksum extension
+
+
+def bytes_used(user: CustomUser) -> int:
+    """Size of the user's registered files and extracted archives whose
+    folder is still there; missing files count as empty."""
+    total = 0
+    for name in UserFile.objects.filter(user=user).values_list('file', flat=True):
+        try:
+            total += os.stat(default_storage.path(name)).st_size
+        except OSError:
+            pass
+    workspace = get_user_workspace(user)
+    extracted = ExtractionJob.objects.filter(user=user, status='complete').values_list('destination', 'bytes_written')
+    for destination, written in extracted:
+        if os.path.isdir(os.path.join(workspace, destination)):
+            total += written
+    return total
+
+
+def bytes_reserved(user: CustomUser, exclude: Optional[UploadSession] = None) -> int:
+    """Space promised to the user's unfinished uploads, plus what running
+    extractions have written so far."""
+    sessions = UploadSession.objects.filter(user=user, status='uploading')
+    if exclude is not None:
+        sessions = sessions.exclude(pk=exclude.pk)
+    extracting = ExtractionJob.objects.filter(user=user, status='running').values_list('bytes_written', flat=True)
+    return sum(sessions.values_list('size', flat=True)) + sum(extracting)
+
+
+def bytes_available(user: CustomUser) -> int:
+    return user.storage_limit * 1024 * 1024 - bytes_used(user) - bytes_reserved(user)
+
+
+class _HasherCache:
+    """SHA-256 state of uploads in progress, by upload id.
+
+    hashlib objects cannot be stored, so the state lives in this process.
+    When a chunk lands on a process that does not hold it (restart, another
+    worker) the bytes already on disk are hashed again once.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    def take(self, session: UploadSession):
+        with self._lock:
+            entry = self._entries.pop(str(session.pk), None)
+        if entry is not None and entry[0] == session.offset:
+            return entry[1]
+
+        hasher = hashlib.sha256()
+        if session.offset:
+            logger.info(f"[Uploads] Rehashing {session.offset} bytes of {session.pk}")
+            remaining = session.offset
+            block = settings.UPLOADS['BLOCK_BYTES']
+            with open(default_storage.path(session.path), 'rb') as existing:
+                while remaining:
+                    data = existing.read(min(block, remaining))
+                    if not data:
+                        raise UploadError("Upload data on disk is shorter than its offset")
+                    hasher.update(data)
+                    remaining -= len(data)
+        return hasher
+
+    def put(self, session: UploadSession, hasher):
+        with self._lock:
+            self._entries[str(session.pk)] = (session.offset, hasher)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def drop(self, session: UploadSession):
+        with self._lock:
+            self._entries.pop(str(session.pk), None)
+
+
+hashers = _HasherCache()
+
+
+def _reserve_path(user: CustomUser, filename: str) -> str:
+    """Create an empty file under the user's upload directory and return its storage name."""
+    wanted = user_file_path(UserFile(user=user), filename)
+    while True:
+        name = default_storage.get_available_name(wanted)
+        full = default_storage.path(name)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        try:
+            with open(full, 'xb'):
+                return name
+        except FileExistsError:
+            continue  # taken between the name check and the create
+
+
+def create_upload(user: CustomUser, filename: str, size: int, sha256: str = '', extract: bool = False) -> UploadSession:
+    """Start an upload of ``size`` bytes once the user's quota can hold it.
+
+    With ``extract`` an archive is unpacked into the workspace (and the
+    archive dropped) once complete.
+    """
+    filename = os.path.basename((filename or '').replace('\\', '/')).strip()
+    if not filename or filename in ('.', '..'):
+        raise UploadError("A file name is required")
+    if size < 0 or size > settings.UPLOADS['MAX_SIZE']:
+        raise UploadError(f"Upload-Length must be between 0 and {settings.UPLOADS['MAX_SIZE']} bytes")
+    sha256 = (sha256 or '').lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        raise UploadError("sha256 must be a hex digest")
+
+    with transaction.atomic():
+        # one quota check at a time per user
+        user = CustomUser.objects.select_for_update().get(pk=user.pk)
+        available = bytes_available(user)
+        if size > available:
+            raise QuotaExceeded(f"Not enough storage: {size} bytes requested, {max(available, 0)} available")
+        session = UploadSession.objects.create(
+            user=user, filename=filename, path=_reserve_path(user, filename),
+            size=size, expected_sha256=sha256, extract=extract,
+        )
+    logger.info(f"[Uploads] {user.username} started {filename} ({size} bytes) as {session.pk}")
+    if size == 0:
+        return _finish(session, hashlib.sha256())
+    return session
+
+
+def write_chunk(session: UploadSession, offset: int, stream: BinaryIO, length: int) -> UploadSession:
+    """Append ``length`` bytes read from ``stream`` at ``offset``.
+
+    The offset must match what the server has; bytes of a chunk cut off
+    midway are kept, and the client resumes from the offset it reads back.
+    """
+    if length > settings.UPLOADS['MAX_CHUNK_BYTES']:
+        raise UploadError(f"Chunks are limited to {settings.UPLOADS['MAX_CHUNK_BYTES']} bytes")
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'uploading':
+            raise UploadError(f"Upload is {session.status}")
+        if offset != session.offset:
+            raise OffsetMismatch(f"Upload-Offset is {session.offset}, not {offset}")
+        if offset + length > session.size:
+            raise UploadError("Chunk runs past Upload-Length")
+
+        hasher = hashers.take(session)
+        block = settings.UPLOADS['BLOCK_BYTES']
+        written = 0
+        with open(default_storage.path(session.path), 'r+b') as out:
+            out.seek(offset)
+            out.truncate()  # drop anything past the acknowledged offset
+            try:
+                while written < length:
+                    data = stream.read(min(block, length - written))
+                    if not data:
+                        break
+                    out.write(data)
+                    hasher.update(data)
+                    written += len(data)
+            except OSError as e:
+                logger.warning(f"[Uploads] Chunk of {session.pk} cut off after {written} bytes: {e}")
+
+        session.offset += written
+        session.save(update_fields=['offset', 'updated_at'])
+    hashers.put(session, hasher)
+
+    if session.offset == session.size:
+        return _finish(session, hasher)
+    return session
+
+
+def _finish(session: UploadSession, hasher) -> UploadSession:
+    hashers.drop(session)
+    digest = hasher.hexdigest()
+    if session.expected_sha256 and digest != session.expected_sha256:
+        abort_upload(session)
+        raise ChecksumMismatch(f"sha256 is {digest}, expected {session.expected_sha256}")
+
+    with transaction.atomic():
+        blob = adopt(default_storage.path(session.path), digest)
+        user_file = UserFile(user=session.user, blob=blob)
+        user_file.file.name = session.path
+        user_file.save()
+        session.sha256 = digest
+        session.status = 'complete'
+        session.user_file = user_file
+        session.save(update_fields=['sha256', 'status', 'user_file', 'updated_at'])
+    logger.info(f"[Uploads] {session.filename} complete ({session.size} bytes, sha256 {digest})")
+    if session.extract:
+        from .extraction import is_archive, queue_extraction
+        if is_archive(session.filename):
+            queue_extraction(user_file, delete_archive=True)
+    return session
+
+
+def abort_upload(session: UploadSession):
+    """Delete the partial file and release the reserved space."""
+    hashers.drop(session)
+    if session.status == 'uploading':
+        try:
+            os.remove(default_storage.path(session.path))
+        except FileNotFoundError:
+            pass
+    session.status = 'aborted'
+    session.save(update_fields=['status', 'updated_at'])
+
+
+def expire_uploads() -> int:
+    """Abort uploads idle for ``EXPIRE_HOURS`` and forget old finished ones."""
+    cutoff = timezone.now() - timedelta(hours=settings.UPLOADS['EXPIRE_HOURS'])
+    stale = list(UploadSession.objects.filter(status='uploading', updated_at__lt=cutoff))
+    for session in stale:
+        abort_upload(session)
+    UploadSession.objects.exclude(status='uploading').filter(updated_at__lt=cutoff).delete()
+    if stale:
+        logger.info(f"[Uploads] Expired {len(stale)} idle uploads")
+    return len(stale)
@@ -10,17 +10,36 @@ urlpatterns = [
     path('docker/delete/', views.delete_container_view, name='delete-container'),
     path('files/download/<int:file_id>/', views.download_file, name='download-file'),
     path('files/delete/<int:file_id>/', views.delete_file, name='delete-file'),
+    path('files/browse/', views.browse_workspace, name='browse-workspace'),
+    path('files/workspace/download/', views.download_workspace_file, name='download-workspace-file'),
+    path('files/archive/', views.download_archive, name='download-archive'),
+    path('files/uploads/', views.create_upload, name='create-upload'),
+    path('files/uploads/<uuid:upload_id>/', views.upload_detail, name='upload-detail'),
+    path('files/extract/<int:file_id>/', views.extract_file, name='extract-file'),
+    path('files/extractions/<uuid:job_id>/', views.extraction_detail, name='extraction-detail'),
     path('monitoring/', views.public_dashboard, name='public-monitoring'),
     path('monitoring/private/', views.private_dashboard, name='private-monitoring'),
     path('ai/', views.ai_dashboard, name='ai-dashboard'),
     path('ai/delete/<int:model_id>/', views.delete_model, name='delete-model'),
+    path('ai/gpu-time/', views.request_gpu_time, name='request-gpu-time'),
+    path('ai/gpu-time/<int:request_id>/cancel/', views.cancel_gpu_time, name='cancel-gpu-time'),
+    path('docker/logs/<int:container_id>/', views.container_logs, name='container-logs'),
     path('file-action/', views.file_action, name='file-action'),
+    path('files/clipboard/', views.clipboard_detail, name='clipboard'),
+    path('files/transfers/<uuid:job_id>/', views.transfer_detail, name='transfer-detail'),
     path('super/', views.superuser_dashboard, name='superuser-dashboard'),
     path('api/usage-data/', views.api_usage_data, name='api_usage_data'),
     path('approve-users/', views.approve_users, name='approve_users'),
     path('request-role/', views.request_role_verification, name='request_role_verification'),
     path('allocate/<int:user_id>/', views.allocate_resources, name='allocate-resources'),
+    path('allocate/role/<str:role>/', views.allocate_role_resources, name='allocate-role-resources'),
     path('manage/docker/start/<int:container_id>/', views.admin_start_container_view, name='admin-start-container'),
     path('manage/docker/stop/<int:container_id>/', views.admin_stop_container_view, name='admin-stop-container'),
+    path('manage/docker/bulk/', views.admin_bulk_container_action, name='admin-bulk-container-action'),
     path('schedule/<int:user_id>/', views.create_schedule, name='create_schedule'),
+    path('schedule/delete/<int:schedule_id>/', views.delete_schedule, name='delete-schedule'),
+    path('schedule/<int:user_id>/recurring/', views.create_recurring_schedule, name='create-recurring-schedule'),
+    path('schedule/recurring/delete/<int:rule_id>/', views.delete_recurring_schedule, name='delete-recurring-schedule'),
+    path('schedule/calendar/', views.schedule_calendar, name='schedule-calendar'),
+    path('schedule/free-slots/', views.schedule_free_slots, name='schedule-free-slots'),
 ]
\ No newline at end of file
@@ -1,11 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import FileResponse, Http404, HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from .docker_utils import docker_manager, manage_container
+from .archives import FORMATS as ARCHIVE_FORMATS, ArchiveStream, walk as archive_members
+from .blobs import dedup_report, store as store_blob
+from .bookings import BookingConflict, book, book_recurring, calendar as booking_calendar, free_slots
+from .bulk import ACTIONS as BULK_ACTIONS, arun_bulk_action, run_bulk_action
+from .logs import log_service
+from .limits import apply_live_limits
+from .downloads import serve_file
+from .extraction import ExtractionError, cancel_extraction, describe as describe_extraction, is_archive, queue_extraction
+from .file_index import BrowseError, browse, resolve as resolve_workspace_path
 from .file_utils import ensure_workspace_exists
-from .models import DockerContainer, UserFile, AIModel, CustomUser, ContainerSchedule
+from .models import DockerContainer, UserFile, AIModel, CustomUser, ContainerSchedule, GpuTimeRequest, RecurringSchedule, JobRun, UploadSession, ExtractionJob, FileTransfer, DiskUsage
 from .forms import DockerfileUploadForm, FileUploadForm, AIModelForm, DockerImageForm
 from .monitoring import get_system_stats, get_user_container_stats
+from .readiness import still_probing
+from .telemetry import job_run_summary
+from .transfers import TransferError, cancel_transfer, describe as describe_transfer, queue_transfer, workspace_paths as transfer_paths
+from .uploads import UploadError, abort_upload, create_upload as start_upload, write_chunk
 from django.contrib import messages
 from django.conf import settings
 from collections import defaultdict
@@ -13,13 +28,15 @@ from django.http import JsonResponse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from .decorators import role_verified_required
+import base64
 import os
+import json
 import docker
 from django.utils.dateparse import parse_datetime
+from django.utils.http import content_disposition_header
 from datetime import datetime
-from .scheduler import reload_schedules
 from datetime import timedelta
 from django.db.models import Q
 
@@ -110,19 +127,106 @@ def file_manager(request):
 
     if request.method == 'POST':
         uploaded_files = request.FILES.getlist('files')
+        extract = request.POST.get('extract') == '1'
 
         for uploaded_file in uploaded_files:
-            user_file = UserFile(user=request.user)
-            user_file.file.save(uploaded_file.name, uploaded_file)
-            user_file.save()
+            user_file = store_blob(UserFile(user=request.user), 'file', uploaded_file)
+            if extract and is_archive(uploaded_file.name):
+                queue_extraction(user_file, delete_archive=True)
 
         messages.success(request, "Files uploaded successfully")
         return redirect('file-manager')
 
     return render(request, 'core/file_manager.html', {
         'files': files,
+        'archive_ids': {f.id for f in files if is_archive(f.file.name)},
+        'extractions': ExtractionJob.objects.filter(user=request.user).order_by('-created_at')[:5],
+        'transfers': FileTransfer.objects.filter(user=request.user).order_by('-created_at')[:5],
     })
 
+
+TUS_VERSION = '1.0.0'
+
+
+def _parse_upload_metadata(header):
+    """``Upload-Metadata``: comma-separated ``key base64(value)`` pairs."""
+    metadata = {}
+    for pair in filter(None, (p.strip() for p in header.split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ''
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {key}")
+    return metadata
+
+
+def _tus_response(session=None, status=204, body=None):
+    response = JsonResponse(body, status=status) if body else HttpResponse(status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    if session is not None:
+        response['Upload-Offset'] = str(session.offset)
+        response['Upload-Length'] = str(session.size)
+    return response
+
+
+@role_verified_required
+@login_required
+@require_POST
+def create_upload(request):
+    """Start a resumable upload: ``Upload-Length`` and ``Upload-Metadata``
+    (``filename``, optional ``sha256``) in, ``Location`` of the upload out."""
+    try:
+        size = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return _tus_response(status=400, body={'error': 'Upload-Length is required'})
+    try:
+        metadata = _parse_upload_metadata(request.headers.get('Upload-Metadata', ''))
+        session = start_upload(request.user, metadata.get('filename', ''), size, metadata.get('sha256', ''),
+                               extract=metadata.get('extract') == '1')
+    except UploadError as e:
+        return _tus_response(status=e.status, body={'error': str(e)})
+
+    response = _tus_response(session, status=201, body={
+        'id': str(session.id), 'offset': session.offset, 'complete': session.status == 'complete',
+    })
+    response['Location'] = reverse('upload-detail', args=[session.id])
+    return response
+
+
+@login_required
+@require_http_methods(['HEAD', 'GET', 'PATCH', 'DELETE'])
+def upload_detail(request, upload_id):
+    """HEAD/GET reports the offset to resume from, PATCH appends a chunk
+    (``application/offset+octet-stream`` at ``Upload-Offset``), DELETE aborts."""
+    session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+
+    if request.method in ('HEAD', 'GET'):
+        return _tus_response(session, status=200, body={
+            'id': str(session.id), 'offset': session.offset, 'size': session.size, 'status': session.status,
+        })
+
+    if request.method == 'DELETE':
+        if session.status == 'uploading':
+            abort_upload(session)
+        return _tus_response()
+
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(status=415, body={'error': 'Content-Type must be application/offset+octet-stream'})
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or '')
+    except ValueError:
+        return _tus_response(status=400, body={'error': 'Upload-Offset and Content-Length are required'})
+    try:
+        session = write_chunk(session, offset, request, length)
+    except UploadError as e:
+        response = _tus_response(status=e.status, body={'error': str(e)})
+        session.refresh_from_db()
+        response['Upload-Offset'] = str(session.offset)
+        return response
+    return _tus_response(session)
+
 @role_verified_required
 @login_required
 def start_container_view(request):
@@ -167,14 +271,106 @@ def download_file(request, file_id):
     try:
         file_obj = UserFile.objects.get(id=file_id, user=request.user)
         if os.path.exists(file_obj.file.path):
-            response = FileResponse(file_obj.file)
-            response['Content-Disposition'] = f'attachment; filename="{file_obj.filename()}"'
-            return response
+            return serve_file(request, file_obj.file.path, file_obj.filename())
         raise UserFile.DoesNotExist
     except UserFile.DoesNotExist:
         messages.error(request, "File not found")
         return redirect('file-manager')
 
+@login_required
+def browse_workspace(request):
+    """A page of a workspace directory as JSON, including files created inside Jupyter."""
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        page = browse(
+            request.user,
+            request.GET.get('path', ''),
+            sort=request.GET.get('sort', 'name'),
+            descending=request.GET.get('order') == 'desc',
+            query=request.GET.get('q', ''),
+            kind=request.GET.get('type', ''),
+            ext=request.GET.get('ext', ''),
+            limit=limit,
+            cursor=request.GET.get('cursor') or None,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(page)
+
+
+@login_required
+def download_workspace_file(request):
+    try:
+        path = resolve_workspace_path(request.user, request.GET.get('path', ''))
+    except BrowseError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not os.path.isfile(path):
+        raise Http404("File not found")
+    return serve_file(request, path)
+
+
+@login_required
+def download_archive(request):
+    """Stream workspace paths (``path``) and uploaded files (``file_id``) as one zip or tar.gz."""
+    fmt = request.GET.get('format', 'zip')
+    if fmt not in ARCHIVE_FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(ARCHIVE_FORMATS)}"}, status=400)
+    try:
+        roots = [resolve_workspace_path(request.user, p) for p in request.GET.getlist('path')]
+    except BrowseError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    file_ids = [i for i in request.GET.getlist('file_id') if i.isdigit()]
+    roots += [f.file.path for f in UserFile.objects.filter(user=request.user, id__in=file_ids)]
+    roots = [root for root in roots if os.path.exists(root)]
+    if not roots:
+        raise Http404("Nothing to download")
+
+    workspace = os.path.realpath(ensure_workspace_exists(request.user))
+    if len(roots) == 1:
+        name = os.path.basename(roots[0]) if roots[0] != workspace else request.user.username
+    else:
+        name = 'files'
+
+    def members():
+        for root in roots:
+            arcname = os.path.basename(root) if root != workspace else request.user.username
+            yield from archive_members(root, arcname)
+
+    content_type, extension = ARCHIVE_FORMATS[fmt]
+    stream = ArchiveStream(members(), fmt, label=f"{request.user.username} {name}{extension}")
+    chunks = stream.__aiter__() if isinstance(request, ASGIRequest) else iter(stream)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, f"{name}{extension}")
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@role_verified_required
+@login_required
+@require_POST
+def extract_file(request, file_id):
+    """Unpack an uploaded archive into the workspace in the background."""
+    user_file = get_object_or_404(UserFile, id=file_id, user=request.user)
+    try:
+        job = queue_extraction(user_file, delete_archive=request.POST.get('delete_archive') == '1')
+    except ExtractionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = JsonResponse(describe_extraction(job), status=202)
+    response['Location'] = reverse('extraction-detail', args=[job.id])
+    return response
+
+
+@login_required
+@require_http_methods(['GET', 'DELETE'])
+def extraction_detail(request, job_id):
+    """Progress of an extraction; DELETE cancels it and removes what it wrote."""
+    job = get_object_or_404(ExtractionJob, id=job_id, user=request.user)
+    if request.method == 'DELETE':
+        cancel_extraction(job)
+        job.refresh_from_db()
+    return JsonResponse(describe_extraction(job))
+
+
 @role_verified_required
 @login_required
 def delete_file(request, file_id):
@@ -259,32 +455,22 @@ def ai_dashboard(request):
     models = AIModel.objects.filter(user=request.user)
     form = AIModelForm()
 
-    user_container = DockerContainer.objects.filter(user=request.user).first()
+    user_container = DockerContainer.objects.select_related('host').filter(user=request.user).first()
     jupyter_token = None
     jupyter_url = None
     container_status = None
 
+    # Status is kept in sync with the daemon by core.reconcile, so no
+    # per-request lookup is needed here.
+    jupyter_pending = False
     if user_container:
-        try:
-            container_name = f"jupyter_{request.user.id}_{request.user.username}"
-            container = docker_manager.client.containers.get(container_name)
-            real_status = container.status 
+        container_status = user_container.status
 
-            if user_container.status != real_status:
-                user_container.status = real_status
-                user_container.save()
-
-            container_status = real_status 
-
-            if real_status == 'running':
-                jupyter_url = f"http://{settings.SERVER_IP}:{user_container.jupyter_port}/?token={user_container.jupyter_token}"
-                jupyter_token = user_container.jupyter_token
-
-        except docker.errors.NotFound:
-            container_status = 'not_found' 
-            if user_container:
-                user_container.delete()
-            user_container = None  
+        if container_status == 'running':
+            jupyter_url = docker_manager.jupyter_url(user_container)
+            jupyter_token = user_container.jupyter_token
+            latest_startup = user_container.startups.first()
+            jupyter_pending = latest_startup is not None and still_probing(latest_startup)
 
     else:
         container_status = 'not_found' 
@@ -303,10 +489,7 @@ def ai_dashboard(request):
                 else:
                     framework = 'tensorflow'
 
-            image_map = {
-                'tensorflow': 'my-tf',
-                'pytorch': 'my-torch',
-            }
+            image_map = settings.JUPYTER_IMAGES
 
             if framework not in image_map:
                 messages.error(request, f"Unsupported framework: {framework}")
@@ -374,8 +557,7 @@ def ai_dashboard(request):
                         name=name,
                         framework=framework,
                     )
-                    model.model_file.save(model_file.name, model_file)
-                    model.save()
+                    store_blob(model, 'model_file', model_file)
 
                     messages.success(request, "Model uploaded successfully")
                     return redirect('ai-dashboard')
@@ -434,9 +616,71 @@ def ai_dashboard(request):
         'jupyter_url': jupyter_url,
         'container_status': container_status,
         'container': user_container,
+        'jupyter_pending': jupyter_pending,
         'upcoming_schedules': schedule_with_remaining,
+        'can_request_gpu_time': _can_request_gpu_time(request.user),
+        'gpu_requests': GpuTimeRequest.objects.filter(user=request.user).select_related('schedule')[:10],
+        'max_gpu_request_hours': settings.FAIR_SHARE['MAX_REQUEST_HOURS'],
     })
 
+
+def _can_request_gpu_time(user):
+    return settings.FAIR_SHARE.get('ENABLED') and user.role in settings.FAIR_SHARE['ROLE_WEIGHTS']
+
+
+@role_verified_required
+@login_required
+@require_POST
+def request_gpu_time(request):
+    """Queue a request for an exclusive GPU window; ``core.fairshare`` grants it."""
+    if not _can_request_gpu_time(request.user):
+        return HttpResponseForbidden("GPU-time requests are not available for your account")
+    container = DockerContainer.objects.filter(user=request.user).first()
+    if container is None:
+        messages.error(request, "Start a Jupyter container before requesting GPU time")
+        return redirect('ai-dashboard')
+
+    try:
+        hours = float(request.POST.get('hours', ''))
+        earliest = _parse_range_param(request.POST.get('earliest_start'), timezone.now())
+    except ValueError:
+        messages.error(request, "Invalid GPU-time request")
+        return redirect('ai-dashboard')
+    if not 0 < hours <= settings.FAIR_SHARE['MAX_REQUEST_HOURS']:
+        messages.error(request, f"Requests must be between 0 and {settings.FAIR_SHARE['MAX_REQUEST_HOURS']} hours")
+        return redirect('ai-dashboard')
+    if GpuTimeRequest.objects.filter(user=request.user, status='queued').exists():
+        messages.error(request, "You already have a GPU-time request in the queue")
+        return redirect('ai-dashboard')
+
+    GpuTimeRequest.objects.create(
+        user=request.user, container=container,
+        duration=timedelta(hours=hours), earliest_start=max(earliest, timezone.now())
+    )
+    messages.success(request, "GPU-time request queued")
+    return redirect('ai-dashboard')
+
+
+@login_required
+@require_POST
+def cancel_gpu_time(request, request_id):
+    gpu_request = get_object_or_404(
+        GpuTimeRequest.objects.select_related('schedule'), id=request_id, user=request.user
+    )
+    if gpu_request.status == 'queued':
+        gpu_request.status = 'cancelled'
+        gpu_request.save(update_fields=['status'])
+    elif gpu_request.status == 'granted' and gpu_request.schedule and gpu_request.schedule.start_datetime > timezone.now():
+        gpu_request.schedule.delete()
+        gpu_request.status = 'cancelled'
+        gpu_request.save(update_fields=['status'])
+    else:
+        messages.error(request, "This request can no longer be cancelled")
+        return redirect('ai-dashboard')
+    messages.success(request, "GPU-time request cancelled")
+    return redirect('ai-dashboard')
+
+
 @role_verified_required
 @login_required
 def delete_model(request, model_id):
@@ -491,74 +735,107 @@ def build_container(request):
     return render(request, 'core/build_container.html', {'form': form})
 
 from django.http import JsonResponse
-import shutil
 
 def get_clipboard(request):
     return request.session.get('clipboard', {})
 
-def set_clipboard(request, action, src_path):
-    request.session['clipboard'] = {'action': action, 'src': src_path}
+def set_clipboard(request, action, paths):
+    request.session['clipboard'] = {'action': action, 'paths': paths}
 
 def clear_clipboard(request):
     if 'clipboard' in request.session:
         del request.session['clipboard']
 
 
-@login_required
-def file_action(request):
-    if request.method == 'POST':
-        action = request.POST.get('action')
-        file_id = request.POST.get('file_id')
-
-        try:
-            file_obj = UserFile.objects.get(id=file_id, user=request.user)
-            file_path = file_obj.file.path
+def _selected_paths(request):
+    """Workspace-relative paths of the selection: ``path`` values plus uploaded ``file_id`` values."""
+    paths = request.POST.getlist('path')
+    file_ids = [i for i in request.POST.getlist('file_id') if i.isdigit()]
+    workspace = os.path.realpath(ensure_workspace_exists(request.user))
+    for user_file in UserFile.objects.filter(user=request.user, id__in=file_ids):
+        paths.append(os.path.relpath(os.path.realpath(user_file.file.path), workspace))
+    return paths
 
-            if action in ['cut', 'copy']:
-                set_clipboard(request, action, file_path)
-                return JsonResponse({'success': True})
 
-            elif action == 'paste':
-                clipboard = get_clipboard(request)
-                if not clipboard:
-                    return JsonResponse({'success': False, 'error': 'Clipboard empty'})
-                
-                dest_dir = os.path.dirname(file_path)
-                filename = os.path.basename(clipboard['src'])
-                dest_path = os.path.join(dest_dir, filename)
+@login_required
+def file_action(request):
+    """Clipboard and rename for the file manager. ``copy`` / ``cut`` take a
+    selection (``path`` and ``file_id``, repeated); ``paste`` queues a
+    background job into ``destination`` (or next to ``file_id``)."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request'})
+    action = request.POST.get('action')
 
-                if clipboard['action'] == 'copy':
-                    if os.path.isdir(clipboard['src']):
-                        shutil.copytree(clipboard['src'], dest_path)
-                    else:
-                        shutil.copy2(clipboard['src'], dest_path)
+    try:
+        if action in ['cut', 'copy']:
+            paths = transfer_paths(request.user, _selected_paths(request))
+            if not paths:
+                return JsonResponse({'success': False, 'error': 'Nothing selected'})
+            set_clipboard(request, action, paths)
+            return JsonResponse({'success': True, 'count': len(paths)})
+
+        elif action == 'paste':
+            clipboard = get_clipboard(request)
+            if not clipboard.get('paths'):
+                return JsonResponse({'success': False, 'error': 'Clipboard empty'})
+            destination = request.POST.get('destination')
+            if destination is None:
+                file_obj = UserFile.objects.get(id=request.POST.get('file_id'), user=request.user)
+                workspace = os.path.realpath(ensure_workspace_exists(request.user))
+                destination = os.path.relpath(os.path.dirname(os.path.realpath(file_obj.file.path)), workspace)
+            job = queue_transfer(request.user, 'move' if clipboard['action'] == 'cut' else 'copy',
+                                 clipboard['paths'], destination)
+            if clipboard['action'] == 'cut':
+                clear_clipboard(request)
+            return JsonResponse({'success': True, 'job': describe_transfer(job)}, status=202)
+
+        file_obj = UserFile.objects.get(id=request.POST.get('file_id'), user=request.user)
+        file_path = file_obj.file.path
 
-                elif clipboard['action'] == 'cut':
-                    shutil.move(clipboard['src'], dest_path)
-                    clear_clipboard(request)
+        if action == 'rename':
+            new_name = request.POST.get('new_name', '')
+            if not new_name or os.path.basename(new_name) != new_name or new_name in ('.', '..'):
+                return JsonResponse({'success': False, 'error': 'Invalid name'})
+            new_path = os.path.join(os.path.dirname(file_path), new_name)
+            if os.path.exists(new_path):
+                return JsonResponse({'success': False, 'error': f'{new_name} already exists'})
+            os.rename(file_path, new_path)
+            file_obj.file.name = os.path.relpath(new_path, settings.MEDIA_ROOT)
+            file_obj.save()
+            return JsonResponse({'success': True})
+
+        elif action == 'move':
+            # a single rename inside the workspace; folders go through cut / paste
+            new_path = resolve_workspace_path(request.user, request.POST.get('new_path', ''))
+            if os.path.exists(new_path):
+                return JsonResponse({'success': False, 'error': 'Destination already exists'})
+            os.rename(file_path, new_path)
+            file_obj.file.name = os.path.relpath(new_path, settings.MEDIA_ROOT)
+            file_obj.save()
+            return JsonResponse({'success': True})
 
-                return JsonResponse({'success': True})
+    except UserFile.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'File not found'})
+    except (BrowseError, TransferError) as e:
+        return JsonResponse({'success': False, 'error': str(e)})
 
-            elif action == 'rename':
-                new_name = request.POST.get('new_name')
-                new_path = os.path.join(os.path.dirname(file_path), new_name)
-                os.rename(file_path, new_path)
-                file_obj.file.name = os.path.relpath(new_path, settings.MEDIA_ROOT)
-                file_obj.save()
-                return JsonResponse({'success': True})
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
 
-            elif action == 'move':
-                new_path = request.POST.get('new_path')
-                shutil.move(file_path, new_path)
-                file_obj.file.name = os.path.relpath(new_path, settings.MEDIA_ROOT)
-                file_obj.save()
-                return JsonResponse({'success': True})
 
-        except UserFile.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'File not found'})
+@login_required
+def clipboard_detail(request):
+    return JsonResponse({'clipboard': get_clipboard(request)})
 
-    return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+@require_http_methods(['GET', 'DELETE'])
+def transfer_detail(request, job_id):
+    """Progress of a copy / move; DELETE cancels it (a cancelled copy removes what it wrote)."""
+    job = get_object_or_404(FileTransfer, id=job_id, user=request.user)
+    if request.method == 'DELETE':
+        cancel_transfer(job)
+        job.refresh_from_db()
+    return JsonResponse(describe_transfer(job))
 
 
 @login_required
@@ -569,6 +846,7 @@ def superuser_dashboard(request):
     User = get_user_model()
     users = User.objects.all()
     usages = []
+    disk = {row.user_id: row for row in DiskUsage.objects.all()}  # refreshed by the disk_usage_scan job
 
     MAX_GPU_MEMORY_MB = 81559 
 
@@ -598,12 +876,16 @@ def superuser_dashboard(request):
         mem_limit_mb = user.mem_limit  # already in MB
         used_ram_mb = round(memory_usage / (1024 * 1024), 2)
         ram_usage_percent = round((used_ram_mb / mem_limit_mb) * 100, 1) if mem_limit_mb > 0 else 0
+        disk_usage = disk.get(user.id)
 
         usage = {
             'user': user,
             'docker_status': docker_status,
             'jupyter_status': jupyter_status,
-            'disk_usage': 10,
+            'disk_usage': disk_usage.percent_of(user.storage_limit) if disk_usage else 0,
+            'disk_used_mb': round(disk_usage.bytes / (1024 * 1024), 1) if disk_usage else 0,
+            'disk_limit_mb': user.storage_limit,
+            'disk_scanned_at': disk_usage.scanned_at if disk_usage else None,
             'cpu_usage': cpu_usage,
             'gpu_memory_mb': gpu_memory_mb,
             'gpu_memory_percent': gpu_memory_percent,
@@ -619,6 +901,7 @@ def superuser_dashboard(request):
     total_jupyter_running = sum(1 for u in usages if u['jupyter_status'] == 'running')
     total_ram_usage_mb = sum(u['used_ram_mb'] for u in usages)
     total_gpu_memory_mb = sum(u['gpu_memory_mb'] for u in usages)
+    total_disk_mb = round(sum(u['disk_used_mb'] for u in usages), 1)
 
     cpu_list = [u['cpu_usage'] for u in usages if u['docker_status'] == 'running']
     average_cpu_percent = round(sum(cpu_list) / len(cpu_list), 2) if cpu_list else 0
@@ -631,9 +914,14 @@ def superuser_dashboard(request):
         'total_jupyter_running': total_jupyter_running,
         'total_ram_usage_mb': round(total_ram_usage_mb, 2),
         'total_gpu_memory_mb': total_gpu_memory_mb,
+        'total_disk_mb': total_disk_mb,
         'average_cpu_percent': average_cpu_percent,
         'num_verified_users': num_verified_users,
         'num_users_with_container': num_users_with_container,
+        'role_choices': [c for c in CustomUser.ROLE_CHOICES if c[0] != 'None'],
+        'job_summary': job_run_summary(),
+        'recent_job_problems': JobRun.objects.exclude(status='ok')[:10],
+        'dedup': dedup_report(),
     })
 
 def api_usage_data(request):
@@ -643,6 +931,7 @@ def api_usage_data(request):
     User = get_user_model()
     users = User.objects.all()
     usage_list = []
+    disk = {row.user_id: row for row in DiskUsage.objects.all()}
 
     for user in users:
         if not isinstance(user, CustomUser):
@@ -662,12 +951,15 @@ def api_usage_data(request):
             jupyter_status = 'stopped'
             cpu_usage = 0
             gpu_usage = 0
+        disk_usage = disk.get(user.id)
 
         usage_list.append({
             'username': user.username,
             'docker_status': docker_status,
             'jupyter_status': jupyter_status,
-            'disk_usage': 10,
+            'disk_usage': disk_usage.percent_of(user.storage_limit) if disk_usage else 0,
+            'disk_bytes': disk_usage.bytes if disk_usage else 0,
+            'disk_scanned_at': disk_usage.scanned_at.strftime('%Y-%m-%d %H:%M:%S') if disk_usage and disk_usage.scanned_at else None,
             'cpu_usage': cpu_usage,
             'gpu_usage': gpu_usage,
             'updated_at': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -719,6 +1011,46 @@ def request_role_verification(request):
         messages.success(request, "ส่งคำขอยืนยันตัวตนสำเร็จ")
     return redirect('home')
 
+MAX_RAM_MB = 256 * 1024
+MAX_CPU_CORES = 64
+
+def _parse_resource_limits(data):
+    """Returns (limits, error) from an allocate-resources form."""
+    try:
+        mem_limit_int = int(data.get('mem_limit'))
+        memswap_limit_int = int(data.get('memswap_limit'))
+        cpu_limit_int = int(data.get('cpu_limit'))
+    except (TypeError, ValueError):
+        return None, 'Invalid input. Please enter numbers only.'
+
+    if memswap_limit_int < mem_limit_int:
+        return None, 'RAM Swap Limit ต้องไม่น้อยกว่า RAM Limit'
+
+    if mem_limit_int > MAX_RAM_MB:
+        return None, 'RAM Limit ต้องไม่เกิน 256 GB'
+
+    if cpu_limit_int > MAX_CPU_CORES:
+        return None, 'CPU Limit ต้องไม่เกิน 64 cores'
+
+    return {
+        'mem_limit': mem_limit_int,
+        'memswap_limit': memswap_limit_int,
+        'cpu_limit': cpu_limit_int,
+        'gpu_access': data.get('gpu_access') == 'on',
+    }, None
+
+def _report_live_limits(request, results):
+    failed = [r for r in results if not r['ok']]
+    restart = [r for r in results if r['ok'] and (not r['cpu_applied'] or r['gpu_pending'])]
+    applied = len(results) - len(failed)
+    if applied:
+        messages.success(request, f"Applied new limits live to {applied} running container(s).")
+    if restart:
+        names = ', '.join(r['user'] for r in restart)
+        messages.warning(request, f"CPU or GPU changes for {names} take effect when the container is recreated.")
+    for r in failed:
+        messages.error(request, f"Could not update {r['user']}'s container: {r['error']}")
+
 @login_required
 def allocate_resources(request, user_id):
     if not request.user.is_superuser:
@@ -726,53 +1058,51 @@ def allocate_resources(request, user_id):
 
     user = get_object_or_404(CustomUser, id=user_id)
 
-    MAX_RAM_MB = 256 * 1024
-    MAX_CPU_CORES = 64
-
     if request.method == 'POST':
-        mem_limit = request.POST.get('mem_limit')
-        memswap_limit = request.POST.get('memswap_limit')
-        cpu_limit = request.POST.get('cpu_limit')
-        gpu_access = request.POST.get('gpu_access') == 'on'
-
-        try:
-            mem_limit_int = int(mem_limit)
-            memswap_limit_int = int(memswap_limit)
-            cpu_limit_int = int(cpu_limit)
-
-            if memswap_limit_int < mem_limit_int:
-                return render(request, 'core/allocate_resources.html', {
-                    'user_obj': user,
-                    'error': 'RAM Swap Limit ต้องไม่น้อยกว่า RAM Limit'
-                })
-
-            if mem_limit_int > MAX_RAM_MB:
-                return render(request, 'core/allocate_resources.html', {
-                    'user_obj': user,
-                    'error': 'RAM Limit ต้องไม่เกิน 256 GB'
-                })
-
-            if cpu_limit_int > MAX_CPU_CORES:
-                return render(request, 'core/allocate_resources.html', {
-                    'user_obj': user,
-                    'error': 'CPU Limit ต้องไม่เกิน 64 cores'
-                })
-
-            user.mem_limit = mem_limit_int
-            user.memswap_limit = memswap_limit_int
-            user.cpu_limit = cpu_limit_int
-            user.gpu_access = gpu_access
-            user.save()
-            return redirect('superuser-dashboard')
-
-        except ValueError as e:
+        limits, error = _parse_resource_limits(request.POST)
+        if error:
             return render(request, 'core/allocate_resources.html', {
                 'user_obj': user,
-                'error': 'Invalid input. Please enter numbers only.'
+                'error': error
             })
 
+        for field, value in limits.items():
+            setattr(user, field, value)
+        user.save()
+        _report_live_limits(request, apply_live_limits([user]))
+        return redirect('superuser-dashboard')
+
     return render(request, 'core/allocate_resources.html', {'user_obj': user})
 
+@login_required
+def allocate_role_resources(request, role):
+    """Set limits for every user of ``role`` and apply them to running containers."""
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("You are not authorized to access this page.")
+
+    roles = dict(CustomUser.ROLE_CHOICES)
+    if role not in roles:
+        raise Http404("Unknown role")
+
+    users = CustomUser.objects.filter(role=role)
+    context = {
+        'user_obj': users.first() or CustomUser(),
+        'role': role,
+        'role_label': roles[role],
+        'role_user_count': users.count(),
+    }
+
+    if request.method == 'POST':
+        limits, error = _parse_resource_limits(request.POST)
+        if error:
+            return render(request, 'core/allocate_resources.html', {**context, 'error': error})
+
+        users.update(**limits)
+        _report_live_limits(request, apply_live_limits(users))
+        return redirect('superuser-dashboard')
+
+    return render(request, 'core/allocate_resources.html', context)
+
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
 @require_POST
@@ -804,6 +1134,58 @@ def admin_stop_container_view(request, container_id):
         messages.error(request, "Failed to stop container.")
     return redirect('superuser-dashboard')
 
+@login_required
+def container_logs(request, container_id):
+    """Last ``lines`` log lines of a container, optionally only those after ``since`` (epoch seconds)."""
+    container = get_object_or_404(DockerContainer, id=container_id)
+    if container.user != request.user and not request.user.is_superuser:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    try:
+        lines = int(request.GET['lines']) if 'lines' in request.GET else None
+        since = float(request.GET['since']) if 'since' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'lines and since must be numbers'}, status=400)
+
+    try:
+        entries = log_service.tail(container.container_id, lines=lines, since=since)
+    except docker.errors.NotFound:
+        return JsonResponse({'error': 'Container not found'}, status=404)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=502)
+
+    return JsonResponse({'container': container.id, 'lines': entries})
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@require_POST
+def admin_bulk_container_action(request):
+    """Start/stop/pause/unpause many containers; streams one JSON line per container."""
+    action = request.POST.get('action')
+    if action not in BULK_ACTIONS:
+        return JsonResponse({'error': f'Invalid action: {action}'}, status=400)
+
+    container_ids = request.POST.getlist('container_ids')
+    user_ids = request.POST.getlist('user_ids')
+    if not container_ids and not user_ids:
+        return JsonResponse({'error': 'No containers selected'}, status=400)
+
+    rows = DockerContainer.objects.filter(
+        Q(id__in=container_ids) | Q(user_id__in=user_ids)
+    ).select_related('user')
+
+    if isinstance(request, ASGIRequest):
+        # under daphne a sync iterator would be drained before the first line is sent
+        return StreamingHttpResponse(_ndjson_async(arun_bulk_action(rows, action, by_admin=True)),
+                                     content_type='application/x-ndjson')
+    events = (json.dumps(event) + '\n' for event in run_bulk_action(rows, action, by_admin=True))
+    return StreamingHttpResponse(events, content_type='application/x-ndjson')
+
+
+async def _ndjson_async(events):
+    async for event in events:
+        yield json.dumps(event) + '\n'
+
 def format_timedelta(td):
     total_seconds = int(td.total_seconds())
     hours, remainder = divmod(total_seconds, 3600)
@@ -855,6 +1237,21 @@ def create_schedule(request, user_id):
             'upcoming_schedules': get_upcoming_schedules(),
         })
 
+    # A container can hold many bookings; ?schedule=<id> edits one of them
+    schedule_id = request.POST.get('schedule_id') or request.GET.get('schedule')
+    schedule = get_object_or_404(ContainerSchedule, id=schedule_id, container=container) if schedule_id else None
+
+    def form(error=None):
+        return render(request, 'core/schedule_form.html', {
+            'user': user,
+            'container': container,
+            'schedule': schedule,
+            'container_schedules': container.schedules.filter(end_datetime__gte=timezone.now()).order_by('start_datetime'),
+            'recurring_rules': container.recurring_schedules.order_by('first_date'),
+            'upcoming_schedules': get_upcoming_schedules(),
+            'error': error,
+        })
+
     if request.method == 'POST':
         start_date = request.POST['start_date']
         start_time = request.POST['start_time']
@@ -865,55 +1262,129 @@ def create_schedule(request, user_id):
         start_dt = datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
         end_dt = datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
 
-        overlapping = ContainerSchedule.objects.filter(
-            active=True,
-            start_datetime__lt=end_dt,
-            end_datetime__gt=start_dt
-        )
+        if schedule and schedule.active and schedule.is_now_in_schedule():
+            return form('คุณไม่สามารถเปลี่ยนเวลาจองได้ระหว่างการใช้งาน')
 
-        now = timezone.now()
-        self_active_booking = ContainerSchedule.objects.filter(
-            container=container,
-            active=True,
-            start_datetime__lte=now,
-            end_datetime__gte=now
-        )
+        try:
+            book(container, start_dt, end_dt, active, schedule)
+        except BookingConflict:
+            return form('ช่วงเวลานี้มีผู้ใช้คนอื่นจองอยู่แล้ว กรุณาเลือกช่วงเวลาอื่น')
+        except ValueError as e:
+            return form(str(e))
 
-        if self_active_booking.exists():
-            return render(request, 'core/schedule_form.html', {
-                'user': user,
-                'container': container,
-                'schedule': container.schedules.first(),
-                'upcoming_schedules': get_upcoming_schedules(),
-                'error': 'คุณไม่สามารถเปลี่ยนเวลาจองได้ระหว่างการใช้งาน',
-            })
+        # The schedule's jobs are re-synced by core.signals on save
+        return redirect('superuser-dashboard')
 
-        if overlapping.exists():
-            return render(request, 'core/schedule_form.html', {
-                'user': user,
-                'container': container,
-                'schedule': container.schedules.first(),
-                'upcoming_schedules': get_upcoming_schedules(),
-                'error': 'ช่วงเวลานี้มีผู้ใช้คนอื่นจองอยู่แล้ว กรุณาเลือกช่วงเวลาอื่น',
-            })
+    # GET method
+    return form()
 
-        # ถ้าไม่ซ้ำให้บันทึกได้
-        ContainerSchedule.objects.update_or_create(
-            container=container,
-            defaults={
-                'start_datetime': start_dt,
-                'end_datetime': end_dt,
-                'active': active,
-            }
-        )
 
-        reload_schedules()
-        return redirect('superuser-dashboard')
+@staff_member_required
+@require_POST
+def delete_schedule(request, schedule_id):
+    schedule = get_object_or_404(ContainerSchedule.objects.select_related('container'), id=schedule_id)
+    user_id = schedule.container.user_id
+    schedule.delete()
+    return redirect('create_schedule', user_id=user_id)
+
+
+def _parse_recurring_form(post, container) -> RecurringSchedule:
+    start_time = datetime.strptime(post['start_time'], "%H:%M").time()
+    end_time = datetime.strptime(post['end_time'], "%H:%M").time()
+    duration = datetime.combine(datetime.min, end_time) - datetime.combine(datetime.min, start_time)
+    if duration <= timedelta(0):
+        duration += timedelta(days=1)  # window runs past midnight
+    exceptions = [d.strip() for d in post.get('exceptions', '').split(',') if d.strip()]
+    for day in exceptions:
+        datetime.strptime(day, "%Y-%m-%d")
+    return RecurringSchedule(
+        container=container,
+        frequency=post.get('frequency', 'weekly'),
+        interval=max(1, int(post.get('interval') or 1)),
+        weekdays=sorted(int(d) for d in post.getlist('weekdays')),
+        start_time=start_time,
+        duration=duration,
+        first_date=datetime.strptime(post['first_date'], "%Y-%m-%d").date(),
+        until=datetime.strptime(post['until'], "%Y-%m-%d").date() if post.get('until') else None,
+        exceptions=exceptions,
+        active='active' in post,
+    )
 
-    # GET method
-    return render(request, 'core/schedule_form.html', {
-        'user': user,
-        'container': container,
-        'schedule': container.schedules.first(),
-        'upcoming_schedules': get_upcoming_schedules(),
-    })
\ No newline at end of file
+
+@staff_member_required
+@require_POST
+def create_recurring_schedule(request, user_id):
+    """Store a repeating window once; occurrences are expanded when needed."""
+    user = get_object_or_404(CustomUser, id=user_id)
+    container = get_object_or_404(DockerContainer, user=user)
+    try:
+        rule = _parse_recurring_form(request.POST, container)
+        if rule.frequency not in dict(RecurringSchedule.FREQUENCY_CHOICES):
+            raise ValueError(f"Unknown frequency: {rule.frequency}")
+        book_recurring(rule)
+    except BookingConflict as e:
+        first = e.conflicts[0]
+        messages.error(request, f"ช่วงเวลาซ้ำชนกับการจองของ {first.container.user.username} "
+                                f"({first.start_datetime:%Y-%m-%d %H:%M})")
+    except (KeyError, ValueError) as e:
+        messages.error(request, f"Invalid recurring schedule: {e}")
+    else:
+        messages.success(request, "Recurring schedule saved")
+    return redirect('create_schedule', user_id=user_id)
+
+
+@staff_member_required
+@require_POST
+def delete_recurring_schedule(request, rule_id):
+    rule = get_object_or_404(RecurringSchedule.objects.select_related('container'), id=rule_id)
+    user_id = rule.container.user_id
+    rule.delete()
+    return redirect('create_schedule', user_id=user_id)
+
+
+def _parse_range_param(value, default):
+    if not value:
+        return default
+    try:
+        parsed = parse_datetime(value) or datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid datetime: {value}")
+    if timezone.is_aware(parsed) and not settings.USE_TZ:
+        parsed = timezone.make_naive(parsed)
+    return parsed
+
+
+@login_required
+def schedule_calendar(request):
+    """Bookings in ``[start, end)`` as JSON for a week or month view."""
+    now = timezone.now()
+    try:
+        start = _parse_range_param(request.GET.get('start'), now - timedelta(days=now.weekday()))
+        end = _parse_range_param(request.GET.get('end'), start + timedelta(days=7))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if end <= start or end - start > timedelta(days=settings.BOOKINGS['MAX_CALENDAR_DAYS']):
+        return JsonResponse({'error': 'Invalid range'}, status=400)
+
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        # other users' names are for admins only
+        'events': booking_calendar(start, end, show_users=request.user.is_staff),
+    })
+
+
+@login_required
+def schedule_free_slots(request):
+    """The next ``count`` free slots of ``length`` minutes, as JSON."""
+    try:
+        length = int(request.GET.get('length', 60))
+        count = min(int(request.GET.get('count', 5)), settings.BOOKINGS['MAX_SLOTS'])
+        after = _parse_range_param(request.GET.get('after'), None)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if length <= 0 or count <= 0:
+        return JsonResponse({'error': 'length and count must be positive'}, status=400)
+
+    slots = free_slots(timedelta(minutes=length), count, after)
+    return JsonResponse({'slots': [{'start': a.isoformat(), 'end': b.isoformat()} for a, b in slots]})
\ No newline at end of file
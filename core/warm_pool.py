@@ -0,0 +1,216 @@
+import logging
+import os
+import secrets
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .docker_utils import LABEL_MANAGED, LABEL_POOL
+from .models import CustomUser
+from .ports import port_allocator
+from .service import DatabaseLock
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_DIRS = ('jupyter', 'models', 'data')
+# Held while a refill runs; renewed after each container it starts
+REFILL_LOCK_NAME = 'warm_pool_refill'
+REFILL_LOCK_SECONDS = 600
+
+
+class WarmPool:
+    """Idle, already-running Jupyter containers per framework.
+
+    Each pool container mounts its own slot directory under
+    ``MEDIA_ROOT/warm_pool/<name>``. Claiming renames the slot (atomic, so
+    only one worker process can win it), swaps the slot's directories into
+    the user's workspace paths - bind mounts follow the inode, so the
+    running container now sees the user's files - then renames the
+    container and raises its limits to the user's. Its bind sources are
+    gone after the swap, so once stopped it is recreated with the user's
+    mounts before it starts again (``DockerManager.adopt_pool_container``).
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._refill_lock = threading.Lock()
+        # Web workers and the scheduler all refill, so the budget needs a
+        # lock that holds across processes, not just this one's threads.
+        self._refill_lease = DatabaseLock(REFILL_LOCK_NAME, ttl=REFILL_LOCK_SECONDS)
+
+    @property
+    def config(self) -> Dict:
+        return settings.WARM_POOL
+
+    @property
+    def root(self) -> str:
+        return os.path.join(settings.MEDIA_ROOT, 'warm_pool')
+
+    def enabled(self) -> bool:
+        return bool(self.config.get('ENABLED')) and self.manager.client is not None
+
+    def _slot_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _framework_for(self, image_name: str) -> Optional[str]:
+        for framework, image in settings.JUPYTER_IMAGES.items():
+            if image == image_name:
+                return framework
+        return None
+
+    def _idle(self, framework: str) -> List:
+        """Running pool containers of ``framework`` whose slot is unclaimed."""
+        containers = self.manager.client.containers.list(
+            filters={'label': f"{LABEL_POOL}={framework}", 'status': 'running'}
+        )
+        return [c for c in containers if os.path.isdir(self._slot_path(c.name))]
+
+    def _fits(self, count: int) -> bool:
+        cfg = self.config
+        return (count * cfg['MEM_LIMIT_MB'] <= cfg['MAX_MEM_MB']
+                and count * cfg['CPU_LIMIT'] <= cfg['MAX_CPUS'])
+
+    def _jupyter_endpoint(self, container) -> Tuple[int, str]:
+        attrs = container.attrs
+        port = int(attrs['HostConfig']['PortBindings']['8888/tcp'][0]['HostPort'])
+        env = dict(e.split('=', 1) for e in attrs['Config'].get('Env') or [] if '=' in e)
+        return port, env.get('JUPYTER_TOKEN', '')
+
+    def _swap_into(self, user_dir: str, slot_dir: str):
+        """Put ``slot_dir`` at ``user_dir`` keeping the user's existing files."""
+        old_dir = f"{user_dir}.pool-old"
+        os.rename(user_dir, old_dir)
+        swapped, moved = False, []
+        try:
+            os.rename(slot_dir, user_dir)
+            swapped = True
+            for entry in os.listdir(old_dir):
+                os.rename(os.path.join(old_dir, entry), os.path.join(user_dir, entry))
+                moved.append(entry)
+            os.rmdir(old_dir)
+        except OSError:
+            # Leave the user's directory where and as it was
+            for entry in moved:
+                os.rename(os.path.join(user_dir, entry), os.path.join(old_dir, entry))
+            if swapped:
+                os.rename(user_dir, slot_dir)
+            os.rename(old_dir, user_dir)
+            raise
+
+    def claim(self, user: CustomUser, image_name: str, dirs: Dict[str, str], container_name: str):
+        """Bind an idle pool container to ``user``.
+
+        Returns ``(container, port, token)`` or ``None`` when nothing suitable
+        is idle, in which case the caller creates a container as usual.
+        """
+        if not self.enabled():
+            return None
+        framework = self._framework_for(image_name)
+        if framework is None or bool(user.gpu_access) != bool(self.config.get('GPU')):
+            return None
+
+        for container in self._idle(framework):
+            slot = self._slot_path(container.name)
+            claimed_slot = f"{slot}.claimed"
+            try:
+                os.rename(slot, claimed_slot)
+            except OSError:
+                continue  # taken by another worker
+
+            try:
+                for key in WORKSPACE_DIRS:
+                    self._swap_into(dirs[key], os.path.join(claimed_slot, key))
+                os.rmdir(claimed_slot)
+                container.rename(container_name)
+                container.update(**self.manager._user_limits(user))
+                port, token = self._jupyter_endpoint(container)
+            except Exception as e:
+                logger.error(f"[WarmPool] Failed to claim {container.name} for {user.username}: {e}")
+                try:
+                    port_allocator.release(self._jupyter_endpoint(container)[0])
+                    container.remove(force=True)
+                except Exception:
+                    pass
+                shutil.rmtree(claimed_slot, ignore_errors=True)
+                return None
+
+            logger.info(f"[WarmPool] {user.username} claimed {framework} container {container.id[:12]}")
+            self.refill_async()
+            return container, port, token
+
+        return None
+
+    def _create(self, framework: str):
+        cfg = self.config
+        name = f"pool_{framework}_{secrets.token_hex(4)}"
+        slot = self._slot_path(name)
+        slot_dirs = {key: os.path.join(slot, key) for key in WORKSPACE_DIRS}
+        for d in slot_dirs.values():
+            os.makedirs(d, exist_ok=True)
+
+        port = self.manager._get_available_port(name)
+        if port is None:
+            shutil.rmtree(slot, ignore_errors=True)
+            return
+        token = self.manager._generate_jupyter_token()
+        try:
+            self.manager.client.containers.run(
+                image=f"{settings.JUPYTER_IMAGES[framework]}:latest",
+                name=name,
+                volumes=self.manager._volume_binds(slot_dirs),
+                ports={'8888/tcp': port},
+                environment={
+                    'JUPYTER_TOKEN': token,
+                    'GRANT_SUDO': 'yes'
+                },
+                labels={LABEL_MANAGED: '1', LABEL_POOL: framework},
+                detach=True,
+                runtime='nvidia' if cfg.get('GPU') else None,
+                **self.manager._limits(cfg['MEM_LIMIT_MB'], cfg['MEM_LIMIT_MB'], cfg['CPU_LIMIT'])
+            )
+            logger.info(f"[WarmPool] Started idle {framework} container {name}")
+        except Exception as e:
+            logger.error(f"[WarmPool] Failed to start {framework} pool container: {e}")
+            port_allocator.release(port)
+            shutil.rmtree(slot, ignore_errors=True)
+
+    def refill(self):
+        """Top each framework back up to its configured size, within budget."""
+        if not self.enabled():
+            return
+        if not self._refill_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._refill_lease.acquire():
+                return  # another process is refilling
+            try:
+                self._top_up()
+            finally:
+                self._refill_lease.release()
+        finally:
+            self._refill_lock.release()
+
+    def _top_up(self):
+        sizes = self.config.get('SIZES', {})
+        idle = {fw: len(self._idle(fw)) for fw in sizes if fw in settings.JUPYTER_IMAGES}
+        total = sum(idle.values())
+        for framework, count in idle.items():
+            while count < sizes[framework]:
+                if not self._fits(total + 1):
+                    logger.warning("[WarmPool] Resource budget reached; not adding more containers")
+                    return
+                self._create(framework)
+                self._refill_lease.renew()
+                count += 1
+                total += 1
+
+    def refill_async(self):
+        threading.Thread(target=self.refill, daemon=True).start()
+
+
+def refill_warm_pool():
+    """Scheduler entry point."""
+    from .docker_utils import docker_manager
+    docker_manager.warm_pool.refill()
@@ -12,8 +12,11 @@ def main():
         import django
         django.setup()
 
-        from core.scheduler import start_scheduler
-        start_scheduler()
+        # Joins the leader election, so a running run_scheduler keeps the lead
+        from django.conf import settings
+        if settings.SCHEDULER_SERVICE.get('EMBEDDED_IN_RUNSERVER'):
+            from core.service import start_embedded_service
+            start_embedded_service()
 
     try:
         from django.core.management import execute_from_command_line